@@ -0,0 +1,295 @@
+"""
+Backstage Batch Converter
+=========================
+Konverterer mange Word-dokumenter til HTML parallelt med QC pr. fil.
+
+Kør med: python -m batch_convert <mappe eller glob> [--workers N]
+
+Eksempler:
+    python -m batch_convert rapporter/
+    python -m batch_convert "rapporter/**/*.docx" --workers 8 --caption ANALYSE
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from conversion_cache import DEFAULT_CACHE_PATH
+from image_optimizer import DEFAULT_DPI
+
+DEFAULT_OUTPUT_DIR = "HTML Exports"
+SUMMARY_FILENAME = "batch-summary.json"
+
+
+def _file_mode() -> int:
+    """Almindelige filrettigheder (0o666 minus umask) - mkstemp giver kun 0o600."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def find_documents(patterns: list) -> list:
+    """Find .docx filer ud fra mapper, glob-mønstre og filstier.
+
+    Word's lock-filer (~$navn.docx) springes over.
+    """
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '*.docx'))
+        elif glob.has_magic(pattern):
+            matches = glob.glob(pattern, recursive=True)
+        else:
+            matches = [pattern]
+
+        for match in sorted(matches):
+            if os.path.basename(match).startswith('~$'):
+                continue
+            if match not in found:
+                found.append(match)
+    return found
+
+
+def document_title(parsed, path: str) -> str:
+    """Titel til forsiden: første H1 i dokumentet, ellers filnavnet."""
+    for block in parsed.blocks:
+        if block.style_type == 'h1' and block.text:
+            return block.text
+    return Path(path).stem.replace('_', ' ').replace('-', ' ')
+
+
+def write_atomic(path: Path, data: bytes):
+    """Skriv en fil atomisk: midlertidig fil i samme mappe + os.replace().
+
+    En afbrudt batch efterlader derfor aldrig halve HTML-filer.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, _file_mode())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def convert_file(path: str, output_dir: str, caption: str = "RAPPORT", date: str = None,
+                 options: dict = None, cache_path: str = None) -> dict:
+    """Konvertér én .docx fil og kør QC. Kører i en worker-proces.
+
+    Fejl fanges og returneres i resultatet, så én korrupt fil ikke
+    stopper resten af batchen. options gives videre til ConversionContext
+    (f.eks. optimize_images, image_dpi). Med cache_path genbruges HTML og
+    QC fra conversion_cache, når filen og indstillingerne er uændrede.
+    """
+    from html_converter import (ConversionContext, parse_document, convert_to_html, quality_check,
+                                write_runtime)
+    from conversion_cache import ConversionCache, cache_key, context_options, read_source
+
+    result = {
+        "file": path,
+        "output": None,
+        "ok": False,
+        "seconds": 0.0,
+        "bytes": 0,
+        "cached": False,
+        "images": None,
+        "qc_issues": [],
+        "qc_warnings": [],
+        "error": None,
+    }
+    start = time.perf_counter()
+
+    try:
+        context = ConversionContext(**(options or {}))
+
+        cache = key = cached = docx_bytes = None
+        if cache_path:
+            # Nøglen kræver hele filen - uden cache læser parse_document() kun de parts der bruges
+            docx_bytes = read_source(path)
+            # Titlen udledes af dokumentet (eller filnavnet), så filnavnet indgår i nøglen
+            cache = ConversionCache(cache_path)
+            key = cache_key(docx_bytes, f"batch:{Path(path).stem}", [], caption, None, date,
+                            context_options(context))
+            cached = cache.get(key, context.asset_dir)
+
+        if cached is not None:
+            html, report = cached
+            result["cached"] = True
+            if context.runtime_dir:
+                write_runtime(context.runtime_dir, context.runtime_url)
+        else:
+            source = io.BytesIO(docx_bytes) if docx_bytes is not None else path
+            with parse_document(source) as parsed:
+                html = convert_to_html(parsed, title=document_title(parsed, path),
+                                       cover_caption=caption, cover_date=date, context=context)
+                result["images"] = context.images.stats()
+
+                # QC fejler ikke konverteringen
+                try:
+                    report = quality_check(parsed, counts=context.output_counts)
+                except Exception as e:
+                    report = None
+                    result["qc_warnings"] = [f"QC kunne ikke køres: {type(e).__name__}: {e}"]
+
+            if cache is not None:
+                cache.put(key, html, report, context.images.asset_files)
+
+        data = html.encode('utf-8')
+        output_path = Path(output_dir) / (Path(path).stem + '.html')
+        write_atomic(output_path, data)
+
+        result["output"] = str(output_path)
+        result["bytes"] = len(data)
+        result["ok"] = True
+        if report is not None:
+            result["qc_issues"] = report["issues"]
+            result["qc_warnings"] = report["warnings"]
+
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(paths: list, output_dir: str, workers: int = None, caption: str = "RAPPORT",
+              date: str = None, options: dict = None, cache_path: str = None) -> list:
+    """Konvertér alle filer over en process pool og returnér resultaterne i input-rækkefølge."""
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(convert_file, path, output_dir, caption, date, options, cache_path): path for path in paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                # Worker-processen døde (f.eks. BrokenProcessPool)
+                results[path] = {
+                    "file": path, "output": None, "ok": False, "seconds": 0.0, "bytes": 0,
+                    "cached": False, "images": None, "qc_issues": [], "qc_warnings": [], "error": f"{type(e).__name__}: {e}",
+                }
+
+    return [results[path] for path in paths]
+
+
+def print_summary(results: list, elapsed: float):
+    """Print oversigtstabel over batchen til konsol."""
+    name_width = max([len(os.path.basename(r["file"])) for r in results] + [3])
+    name_width = min(name_width, 50)
+
+    print()
+    print(f"{'Fil':<{name_width}}  {'Tid':>7}  {'Størrelse':>10}  {'QC':>3}  Status")
+    print("-" * (name_width + 36))
+    for r in results:
+        name = os.path.basename(r["file"])[:name_width]
+        size = f"{r['bytes'] / 1024:.0f} KB" if r["ok"] else "-"
+        if r["error"]:
+            status = f"FEJL: {r['error']}"
+        elif r["qc_issues"]:
+            status = "QC issues"
+        else:
+            status = "OK"
+        if r["cached"]:
+            status += " (cache)"
+        print(f"{name:<{name_width}}  {r['seconds']:>6.2f}s  {size:>10}  {len(r['qc_issues']):>3}  {status}")
+
+    converted = sum(1 for r in results if r["ok"])
+    print("-" * (name_width + 36))
+    print(f"{converted}/{len(results)} konverteret på {elapsed:.1f}s")
+
+    optimized = [r["images"] for r in results if r["images"] and r["images"]["optimized"]]
+    if optimized:
+        before = sum(stats["bytes_original"] for stats in optimized)
+        after = sum(stats["bytes_optimized"] for stats in optimized)
+        saved = 100 * (before - after) / before if before else 0
+        print(f"Billeder optimeret: {before / 1024:.0f} KB → {after / 1024:.0f} KB ({saved:.0f}% sparet)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m batch_convert",
+        description="Konvertér mange .docx filer til Backstage HTML parallelt")
+    parser.add_argument('inputs', nargs='+', help="Mapper, glob-mønstre eller .docx filer")
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="Antal worker-processer (default: antal CPU'er)")
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT_DIR,
+                        help=f"Output-mappe (default: '{DEFAULT_OUTPUT_DIR}')")
+    parser.add_argument('--caption', default="RAPPORT", help="Dokumenttype til forsiden")
+    parser.add_argument('--date', default=None, help="Dato til forsiden (f.eks. 'Februar 2026')")
+    parser.add_argument('--optimize-images', action='store_true',
+                        help="Nedskalér billeder til printopløsning og re-encode (PNG/JPEG/WebP)")
+    parser.add_argument('--image-dpi', type=int, default=DEFAULT_DPI,
+                        help=f"Mål-DPI for optimerede billeder (default: {DEFAULT_DPI})")
+    parser.add_argument('--external-assets', action='store_true',
+                        help="Skriv billeder som filer i <output>/assets/ i stedet for at indlejre dem")
+    parser.add_argument('--external-runtime', action='store_true',
+                        help="Link til delt CSS/JS i Runtime/ ved siden af output-mappen i stedet for at indlejre dem")
+    parser.add_argument('--subset-fonts', action='store_true',
+                        help="Subset fontene til hver rapports tegn og indlejr dem som WOFF2 (kræver fontTools)")
+    parser.add_argument('--paginate', action='store_true',
+                        help="Del siderne op på serveren med fontmetrik i stedet for i browseren")
+    parser.add_argument('--cache', dest='cache_path', nargs='?', const=DEFAULT_CACHE_PATH, default=None,
+                        help=f"Genbrug uændrede konverteringer fra en disk-cache (default-sti: {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--json', dest='json_path', default=None,
+                        help=f"Sti til JSON-opsummering ('-' for stdout, default: <output>/{SUMMARY_FILENAME})")
+    args = parser.parse_args(argv)
+
+    paths = find_documents(args.inputs)
+    if not paths:
+        print("Ingen .docx filer fundet", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    options = {"optimize_images": args.optimize_images, "image_dpi": args.image_dpi,
+               "paginate": args.paginate, "subset_fonts": args.subset_fonts}
+    if args.external_assets:
+        # Filnavne er indholds-hashes, så alle rapporter i output-mappen deler billedfilerne
+        options["asset_dir"] = os.path.join(args.output, "assets")
+    if args.external_runtime:
+        # Runtime/ ligger ved siden af output-mappen ligesom Fonts/ (../Fonts/ i CSS'en)
+        options["runtime_dir"] = os.path.join(os.path.dirname(os.path.abspath(args.output)), "Runtime")
+    results = run_batch(paths, args.output, args.workers, args.caption, args.date, options,
+                        args.cache_path)
+    elapsed = time.perf_counter() - start
+
+    summary = {
+        "files": len(results),
+        "converted": sum(1 for r in results if r["ok"]),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "seconds": round(elapsed, 3),
+        "bytes": sum(r["bytes"] for r in results),
+        "cache_hits": sum(1 for r in results if r["cached"]),
+        "image_bytes_saved": sum(r["images"]["bytes_saved"] for r in results if r["images"]),
+        "image_bytes_optimized_away": sum(r["images"]["bytes_original"] - r["images"]["bytes_optimized"]
+                                          for r in results if r["images"]),
+        "results": results,
+    }
+
+    if args.json_path == '-':
+        json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_summary(results, elapsed)
+        json_path = Path(args.json_path or os.path.join(args.output, SUMMARY_FILENAME))
+        write_atomic(json_path, json.dumps(summary, ensure_ascii=False, indent=2).encode('utf-8'))
+        print(f"JSON-opsummering: {json_path}")
+
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,289 @@
+"""
+Backstage Conversion Cache
+==========================
+Persistent cache af færdige konverteringer (HTML + QC-rapport) på disk.
+
+Samme .docx konverteres ofte mange gange, mens call-out listen gennemgås og
+forsidetekst justeres. Cachen gemmer resultatet under en nøgle af dokumentets
+bytes, alle konverteringsargumenter og ENGINE_VERSION, så en gentaget
+konvertering returneres med det samme.
+
+Cachen er en SQLite-database i WAL-mode: flere processer (f.eks. batch
+workers) kan læse og skrive samtidig. Når den samlede størrelse overstiger
+max_bytes, slettes de mindst brugte entries (LRU).
+
+Brug:
+    from conversion_cache import ConversionCache, convert_cached
+
+    cache = ConversionCache(".backstage-cache.sqlite")
+    html, report = convert_cached("rapport.docx", cache, title="Rapport")
+    print(cache.stats())
+"""
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+from html_converter import (ENGINE_VERSION, ConversionContext, parse_document,
+                            convert_to_html, quality_check, write_runtime)
+
+DEFAULT_CACHE_PATH = ".backstage-cache.sqlite"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    html BLOB NOT NULL,
+    report TEXT,
+    assets TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def read_source(source) -> bytes:
+    """Læs .docx bytes fra en sti, bytes eller et file-like objekt."""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read()
+    if hasattr(source, 'read'):
+        return source.read()
+    raise TypeError(f"Cachen skal bruge dokumentets bytes - fik {type(source).__name__}")
+
+
+def context_options(context: ConversionContext) -> dict:
+    """De context-indstillinger der påvirker output og derfor indgår i nøglen."""
+    optimizer = context.image_optimizer
+    return {
+        "optimize_images": optimizer is not None,
+        "image_dpi": optimizer.dpi if optimizer else None,
+        "image_quality": optimizer.quality if optimizer else None,
+        "image_max_width_mm": optimizer.max_width_mm if optimizer else None,
+        "asset_dir": os.path.abspath(context.asset_dir) if context.asset_dir else None,
+        "asset_url": context.asset_url,
+        "paginate": context.paginate,
+        "runtime_dir": os.path.abspath(context.runtime_dir) if context.runtime_dir else None,
+        "runtime_url": context.runtime_url,
+        "subset_fonts": context.font_subsetter is not None,
+    }
+
+
+def cache_key(docx_bytes: bytes, title: str, callout_paragraphs: list, cover_caption: str,
+              cover_description: str, cover_date: str, options: dict = None) -> str:
+    """SHA-256 nøgle over dokumentets bytes, alle argumenter og ENGINE_VERSION."""
+    arguments = json.dumps({
+        "engine": ENGINE_VERSION,
+        "title": title,
+        "callout_paragraphs": list(callout_paragraphs or []),
+        "cover_caption": cover_caption,
+        "cover_description": cover_description,
+        "cover_date": cover_date,
+        "options": options or {},
+    }, ensure_ascii=False, sort_keys=True)
+
+    digest = hashlib.sha256(docx_bytes)
+    digest.update(b'\0')
+    digest.update(arguments.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """SQLite-baseret LRU-cache af konverteringer.
+
+    Args:
+        path: Sti til cache-databasen
+        max_bytes: Største samlede størrelse af gemt (komprimeret) HTML
+
+    hits/misses tæller opslag i denne instans; stats() viser også de
+    samlede tællere for alle processer der har brugt databasen.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = os.fspath(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pid = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # En forbindelse må ikke deles på tværs af fork - åbn en ny i hver proces
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        """Luk databaseforbindelsen (åbnes igen ved næste opslag)."""
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def _count(self, connection, name: str):
+        """Tæl et hit eller miss i instansen og i databasen."""
+        if name == 'hits':
+            self.hits += 1
+        else:
+            self.misses += 1
+        connection.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def get(self, key: str, asset_dir: str = None):
+        """Slå en konvertering op.
+
+        Returns:
+            (html, report) eller None. En entry med eksterne billeder tæller
+            som miss, hvis en af billedfilerne er slettet fra asset_dir.
+        """
+        connection = self._connect()
+        row = connection.execute(
+            "SELECT html, report, assets FROM entries WHERE key = ?", (key,)).fetchone()
+
+        if row is not None and asset_dir is not None:
+            if not all(os.path.exists(os.path.join(asset_dir, name)) for name in json.loads(row[2])):
+                row = None
+
+        if row is None:
+            self._count(connection, 'misses')
+            return None
+
+        connection.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._count(connection, 'hits')
+        report = json.loads(row[1]) if row[1] is not None else None
+        return zlib.decompress(row[0]).decode('utf-8'), report
+
+    def put(self, key: str, html: str, report: dict = None, assets: list = None):
+        """Gem en konvertering og fjern de mindst brugte entries over max_bytes."""
+        data = zlib.compress(html.encode('utf-8'), 6)
+        if len(data) > self.max_bytes:
+            return
+        now = time.time()
+        report_json = json.dumps(report, ensure_ascii=False) if report is not None else None
+
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, html, report, assets, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, data, report_json, json.dumps(assets or []), len(data), now, now))
+            self._evict(connection)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def assets(self, key: str) -> list:
+        """Billedfiler en gemt entry refererer (tom liste hvis ingen)."""
+        row = self._connect().execute("SELECT assets FROM entries WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def _evict(self, connection):
+        """Slet mindst brugte entries til den samlede størrelse er under max_bytes."""
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in connection.execute(
+                "SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        """Tøm cachen (tællerne nulstilles også)."""
+        connection = self._connect()
+        connection.execute("DELETE FROM entries")
+        connection.execute("DELETE FROM counters")
+
+    def stats(self) -> dict:
+        """Hit/miss tællere og størrelse."""
+        connection = self._connect()
+        entries, size = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        totals = dict(connection.execute("SELECT name, value FROM counters").fetchall())
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "total_hits": totals.get('hits', 0),
+            "total_misses": totals.get('misses', 0),
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def convert_cached(source, cache: ConversionCache, title: str = "Dokument",
+                   callout_paragraphs: list = None, cover_caption: str = "RAPPORT",
+                   cover_description: str = None, cover_date: str = None,
+                   context: ConversionContext = None, run_qc: bool = True):
+    """convert_to_html + quality_check gennem cachen.
+
+    Args:
+        source: Sti til .docx, bytes eller file-like objekt
+        cache: ConversionCache
+        run_qc: Kør quality_check ved miss og gem rapporten sammen med HTML'en
+        Øvrige argumenter som convert_to_html().
+
+    Returns:
+        (html, report). report har samme JSON-form ved hit og miss (lister i
+        stedet for tuples). Ved hit bygges ingen context.images.
+    """
+    docx_bytes = read_source(source)
+    if context is None:
+        context = ConversionContext(callout_paragraphs)
+    elif callout_paragraphs is not None:
+        context.semantic_callouts = list(callout_paragraphs)
+
+    key = cache_key(docx_bytes, title, context.semantic_callouts, cover_caption,
+                    cover_description, cover_date, context_options(context))
+    cached = cache.get(key, context.asset_dir)
+    if cached is not None:
+        html, report = cached
+        if context.runtime_dir:
+            # Runtime-filerne kan være slettet siden - de genskabes fra koden
+            write_runtime(context.runtime_dir, context.runtime_url)
+        if report is None and run_qc:
+            # Gemt uden QC - kør kun QC'en og opdatér entry
+            with parse_document(io.BytesIO(docx_bytes)) as parsed:
+                report = _stored_report(quality_check(parsed, html))
+            cache.put(key, html, report, cache.assets(key))
+        return html, report
+
+    with parse_document(io.BytesIO(docx_bytes)) as parsed:
+        html = convert_to_html(parsed, title, cover_caption=cover_caption,
+                               cover_description=cover_description, cover_date=cover_date,
+                               context=context)
+        report = _stored_report(quality_check(parsed, counts=context.output_counts)) if run_qc else None
+    cache.put(key, html, report, context.images.asset_files)
+    return html, report
+
+
+def _stored_report(report: dict) -> dict:
+    """QC-rapporten som den ser ud efter en tur gennem cachen (JSON).
+
+    Rapporten gemmes som JSON, så tuples (f.eks. overskrifterne) kommer
+    tilbage som lister. Et miss returnerer samme form, så hit og miss giver
+    ens rapporter.
+    """
+    return json.loads(json.dumps(report, ensure_ascii=False))
@@ -10,6 +10,7 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.style import WD_STYLE_TYPE
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
+from docx.text.paragraph import Paragraph
 import copy
 import re
 
@@ -267,30 +268,22 @@ def set_font_fallback(run, font_name: str):
 
 
 def format_tables(doc: Document):
-    """Formaterer alle tabeller i dokumentet."""
+    """Formaterer alle tabeller i dokumentet.
+
+    Rækker og celler læses direkte fra w:tr/w:tc - row.cells genberegner
+    hele tabellens grid pr. række og gentager flettede celler.
+    """
     for table in doc.tables:
-        # Formater header-række
-        if table.rows:
-            header_row = table.rows[0]
-            for cell in header_row.cells:
-                for paragraph in cell.paragraphs:
-                    for run in paragraph.runs:
-                        run.font.name = Fonts.BODY
-                        run.font.size = Typography.TABLE_HEADER_SIZE
-                        run.font.color.rgb = Colors.PRIMARY_BLUE
-                        run.font.bold = True
-
-        # Formater data-rækker
-        for row_idx, row in enumerate(table.rows):
-            if row_idx == 0:
-                continue  # Skip header
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    for run in paragraph.runs:
+        for row_idx, tr in enumerate(table._tbl.tr_lst):
+            # Første række er header
+            is_header = row_idx == 0
+            for tc in tr.tc_lst:
+                for p in tc.p_lst:
+                    for run in Paragraph(p, table).runs:
                         run.font.name = Fonts.BODY
-                        run.font.size = Typography.TABLE_CELL_SIZE
+                        run.font.size = Typography.TABLE_HEADER_SIZE if is_header else Typography.TABLE_CELL_SIZE
                         run.font.color.rgb = Colors.PRIMARY_BLUE
-                        run.font.bold = False
+                        run.font.bold = is_header
 
         # Tilføj tabel-borders
         set_table_borders(table)
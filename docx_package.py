@@ -0,0 +1,235 @@
+"""
+Backstage Docx-pakke
+====================
+Læser en .docx-fil uden at lægge hele pakken i hukommelsen.
+
+python-docx' Document() læser alle parts ind når filen åbnes - også hvert
+billede i word/media/. En rapport med indscannede bilag kan derfor fylde
+flere hundrede MB, før konverteringen overhovedet er begyndt, selv for
+extract_paragraphs_for_analysis() og collect_headings_for_toc(), der aldrig
+ser billederne.
+
+DocxPackage åbner zip-filen én gang og parser kun document.xml, styles.xml,
+numbering.xml og relationerne med det samme. Alle andre parts (billeder,
+headers, indlejrede filer) læses fra zip-filen først når de bruges, og
+holdes ikke i hukommelsen bagefter. Pakken har de dele af python-docx'
+Document-API som html_converter bruger (element.body, part.rels,
+part.styles), så python-docx' Paragraph/Table kan pakke elementerne ind
+som før, og XML'en parses med python-docx' egen parser.
+
+Med streaming=True parses document.xml heller ikke: iter_body() læser
+body'en med lxml's iterparse direkte fra zip-filen ved hvert gennemløb og
+rydder hvert element når det er brugt, så hukommelsen er den samme for 100
+og 100.000 paragraffer. element er da None.
+"""
+
+import os
+import posixpath
+import zipfile
+
+from lxml import etree
+
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.constants import RELATIONSHIP_TARGET_MODE as RTM
+from docx.opc.exceptions import PackageNotFoundError
+from docx.oxml.ns import qn
+from docx.oxml.parser import element_class_lookup, parse_xml
+from docx.parts.styles import StylesPart
+from docx.styles.styles import Styles
+
+# Tags i [Content_Types].xml og .rels (Open Packaging Conventions)
+OPC_TYPES = 'http://schemas.openxmlformats.org/package/2006/content-types'
+OPC_RELATIONSHIPS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+TAG_DEFAULT = f'{{{OPC_TYPES}}}Default'
+TAG_OVERRIDE = f'{{{OPC_TYPES}}}Override'
+TAG_RELATIONSHIP = f'{{{OPC_RELATIONSHIPS}}}Relationship'
+TAG_BODY = qn('w:body')
+
+
+class DocxPackage:
+    """En .docx-fil med dovne parts.
+
+    Args:
+        source: Sti til .docx-filen eller et binært file-like objekt (skal
+                forblive åbent så længe pakken bruges)
+        streaming: Læs body'en med iterparse ved hvert gennemløb (iter_body)
+                   i stedet for at holde document.xml i hukommelsen
+
+    Raises:
+        PackageNotFoundError: Stien findes ikke
+        ValueError: Filen er ikke et Word-dokument
+    """
+
+    def __init__(self, source, streaming: bool = False):
+        if isinstance(source, (str, os.PathLike)) and not os.path.isfile(source):
+            raise PackageNotFoundError(f"Package not found at '{os.fspath(source)}'")
+        self._zip = zipfile.ZipFile(source)
+        self._names = {info.filename.lower(): info.filename for info in self._zip.infolist()}
+        self._parts = {}  # partname → PackagePart (kun metadata - aldrig indhold)
+
+        types = parse_xml(self._read('/[Content_Types].xml'))
+        self._defaults = {e.get('Extension').lower(): e.get('ContentType') for e in types.iter(TAG_DEFAULT)}
+        self._overrides = {e.get('PartName').lower(): e.get('ContentType') for e in types.iter(TAG_OVERRIDE)}
+
+        main = next((rel for rel in _relationships(self, '/').values()
+                     if rel.reltype == RT.OFFICE_DOCUMENT), None)
+        content_type = self.content_type(main.partname) if main is not None else None
+        if content_type != CT.WML_DOCUMENT_MAIN:
+            raise ValueError(f"file '{source}' is not a Word file, content type is '{content_type}'")
+
+        self.streaming = streaming
+        self.part = DocumentPart(self, main.partname, streaming)
+        self.element = self.part.element
+
+    def iter_body(self):
+        """Body'ens børn (w:p, w:tbl, w:sdt, w:sectPr, ...) i dokumentrækkefølge.
+
+        Med streaming=True er hvert element kun gyldigt indtil det næste hentes.
+        """
+        if self.element is not None:
+            return self.element.body.iterchildren()
+        return _stream_body(self, self.part.partname)
+
+    def content_type(self, partname: str) -> str:
+        override = self._overrides.get(partname.lower())
+        if override is not None:
+            return override
+        return self._defaults.get(posixpath.splitext(partname)[1][1:].lower())
+
+    def get_part(self, partname: str) -> "PackagePart":
+        part = self._parts.get(partname)
+        if part is None:
+            part = self._parts[partname] = PackagePart(self, partname)
+        return part
+
+    def exists(self, partname: str) -> bool:
+        return partname[1:].lower() in self._names
+
+    def open_part(self, partname: str):
+        """Binær strøm med partens indhold direkte fra zip-filen."""
+        try:
+            return self._zip.open(self._names[partname[1:].lower()])
+        except KeyError:
+            raise KeyError(f"Part {partname} findes ikke i pakken") from None
+
+    def _read(self, partname: str) -> bytes:
+        with self.open_part(partname) as f:
+            return f.read()
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PackagePart:
+    """En part der først læses fra zip-filen når indholdet bruges."""
+
+    def __init__(self, package: DocxPackage, partname: str):
+        self.package = package
+        self.partname = partname
+        self._rels = None
+
+    @property
+    def content_type(self) -> str:
+        return self.package.content_type(self.partname)
+
+    @property
+    def blob(self) -> bytes:
+        """Partens indhold - læses fra zip-filen ved hvert opslag og gemmes ikke."""
+        return self.package._read(self.partname)
+
+    def open(self):
+        """Strøm partens indhold fra zip-filen (til store billeder)."""
+        return self.package.open_part(self.partname)
+
+    @property
+    def rels(self) -> dict:
+        if self._rels is None:
+            self._rels = _relationships(self.package, self.partname)
+        return self._rels
+
+
+class DocumentPart(PackagePart):
+    """word/document.xml med styles og nummerering parset med det samme
+    (selve document.xml dog ikke ved streaming)."""
+
+    def __init__(self, package: DocxPackage, partname: str, streaming: bool = False):
+        super().__init__(package, partname)
+        self.element = None if streaming else parse_xml(package._read(partname))
+        self._rels = _relationships(package, partname)
+
+        styles = self._related_part(RT.STYLES)
+        # Som python-docx: uden styles.xml bruges standard-stylene
+        self.styles = Styles(parse_xml(styles.blob if styles is not None
+                                       else StylesPart._default_styles_xml()))
+        numbering = self._related_part(RT.NUMBERING)
+        self.numbering = parse_xml(numbering.blob) if numbering is not None else None
+
+    def _related_part(self, reltype: str) -> PackagePart:
+        for rel in self._rels.values():
+            if rel.reltype == reltype and not rel.is_external and self.package.exists(rel.partname):
+                return rel.target_part
+        return None
+
+
+class Relationship:
+    """Én relation fra en part (samme felter som python-docx' _Relationship)."""
+
+    __slots__ = ('rId', 'reltype', 'target_ref', 'is_external', 'partname', '_package')
+
+    def __init__(self, package: DocxPackage, rId: str, reltype: str, target_ref: str,
+                 is_external: bool, partname: str):
+        self._package = package
+        self.rId = rId
+        self.reltype = reltype
+        self.target_ref = target_ref
+        self.is_external = is_external
+        self.partname = partname
+
+    @property
+    def target_part(self) -> PackagePart:
+        if self.is_external:
+            raise ValueError("target_part property on _Relationship is undefined when target mode is External")
+        return self._package.get_part(self.partname)
+
+
+def _stream_body(package: DocxPackage, partname: str):
+    """Body'ens børn fra iterparse - hvert barn fjernes fra træet når det er brugt."""
+    with package.open_part(partname) as stream:
+        # Samme parser-indstillinger og element-klasser som parse_xml
+        events = etree.iterparse(stream, events=('end',), remove_blank_text=True,
+                                 resolve_entities=False)
+        events.set_element_class_lookup(element_class_lookup)
+        for _, element in events:
+            body = element.getparent()
+            if body is None or body.tag != TAG_BODY:
+                continue
+            yield element
+            # Kun w:body selv bliver tilbage i træet
+            element.clear()
+            body.remove(element)
+
+
+def _relationships(package: DocxPackage, partname: str) -> dict:
+    """rId → Relationship for en part (tom hvis parten ingen .rels har)."""
+    directory, filename = posixpath.split(partname)
+    rels_name = posixpath.join(directory, '_rels', f'{filename}.rels')
+    if not package.exists(rels_name):
+        return {}
+    rels = {}
+    for element in parse_xml(package._read(rels_name)).iter(TAG_RELATIONSHIP):
+        target = element.get('Target')
+        is_external = element.get('TargetMode') == RTM.EXTERNAL
+        target_partname = None
+        if not is_external:
+            # Relative mål er i forhold til partens mappe (som python-docx' PackURI)
+            target_partname = posixpath.normpath(posixpath.join(directory, target))
+        rels[element.get('Id')] = Relationship(package, element.get('Id'), element.get('Type'),
+                                               target, is_external, target_partname)
+    return rels
@@ -0,0 +1,118 @@
+"""
+Backstage Font-subsetting
+=========================
+Skærer fontene i Fonts/ ned til de tegn et dokument bruger og gemmer dem som WOFF2.
+
+Bruges af html_converter når en konvertering har subset_fonts slået til:
+hver font i @font-face reglerne subsettes med fontTools til dokumentets tegn,
+så rapporten kun bærer de glyffer den kan vise - typisk 10-30 KB pr. font i
+stedet for 40-640 KB. Subsets gemmes i en disk-cache nøglet på fontfilens
+indhold og tegnsættet, så rapporter med de samme tegn genbruger dem.
+"""
+
+import hashlib
+import io
+import os
+import uuid
+
+try:
+    from fontTools import subset as font_tools_subset
+    from fontTools import version as FONTTOOLS_VERSION
+    from fontTools.ttLib import TTFont
+    from fontTools.ttLib.woff2 import haveBrotli
+except ImportError:  # fontTools er kun nødvendig med subset_fonts
+    font_tools_subset = None
+
+DEFAULT_CACHE_DIR = ".backstage-font-cache"
+
+
+class FontSubsetter:
+    """Subsetter fontfiler til WOFF2 med en disk-cache.
+
+    Args:
+        cache_dir: Mappe til subsettede fonte (None = ingen disk-cache)
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        if font_tools_subset is None or not haveBrotli:
+            raise ImportError("Font-subsetting kræver fontTools med WOFF2: pip install 'fonttools[woff]'")
+        self.cache_dir = cache_dir
+        self._digests = {}  # fontfil → hash af indholdet
+
+        self.subsets_created = 0
+        self.cache_hits = 0
+        self.bytes_original = 0
+        self.bytes_subset = 0
+
+    def subset(self, path: str, characters) -> bytes:
+        """WOFF2-subset af fontfilen med glyfferne til characters.
+
+        Tegn som fonten ikke har, ignoreres - browseren falder tilbage til
+        næste font i font-family for dem, som med den fulde font.
+        """
+        text = ''.join(sorted(set(characters)))
+        key = hashlib.sha256(
+            f'{self._digest(path)}\0{FONTTOOLS_VERSION}\0{text}'.encode('utf-8')).hexdigest()[:24]
+        cache_path = os.path.join(self.cache_dir, f'{key}.woff2') if self.cache_dir else None
+
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                blob = f.read()
+            self.cache_hits += 1
+        else:
+            blob = self._subset(path, text)
+            self.subsets_created += 1
+            if cache_path:
+                _write_cache(cache_path, blob)
+
+        self.bytes_original += os.path.getsize(path)
+        self.bytes_subset += len(blob)
+        return blob
+
+    def _digest(self, path: str) -> str:
+        if path not in self._digests:
+            with open(path, 'rb') as f:
+                self._digests[path] = hashlib.sha256(f.read()).hexdigest()
+        return self._digests[path]
+
+    @staticmethod
+    def _subset(path: str, text: str) -> bytes:
+        options = font_tools_subset.Options()
+        options.flavor = 'woff2'
+        options.layout_features = ['*']  # behold kerning og ligaturer som i den fulde font
+        options.notdef_outline = True
+        # FontForge-tidsstempel og AAT-tabeller bruges ikke af browsere og kan ikke subsettes
+        options.drop_tables += ['FFTM', 'feat', 'morx']
+        # Uden nyt tidsstempel i head.modified er samme subset byte for byte ens
+        font = TTFont(path, recalcTimestamp=False)
+        try:
+            subsetter = font_tools_subset.Subsetter(options)
+            subsetter.populate(text=text)
+            subsetter.subset(font)
+            buffer = io.BytesIO()
+            font_tools_subset.save_font(font, buffer, options)
+        finally:
+            font.close()
+        return buffer.getvalue()
+
+    def stats(self) -> dict:
+        """Statistik over subsets i denne konvertering."""
+        return {
+            "subsets_created": self.subsets_created,
+            "cache_hits": self.cache_hits,
+            "bytes_original": self.bytes_original,
+            "bytes_subset": self.bytes_subset,
+        }
+
+
+def _write_cache(path: str, blob: bytes):
+    """Skriv et subset atomisk, så samtidige konverteringer aldrig læser en halv fil."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
@@ -11,8 +11,27 @@ from docx.oxml.ns import qn
 from docx.opc.constants import RELATIONSHIP_TYPE as RT
 import re
 import html as html_lib
+import unicodedata
 import base64
+import hashlib
 import io
+import os
+import uuid
+import weakref
+from bisect import bisect_right
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from collections.abc import Mapping
+
+from image_optimizer import ImageOptimizer, DEFAULT_DPI, DEFAULT_QUALITY, image_size
+from pagination import Paginator, FONTS_DIR
+from font_subset import FontSubsetter, DEFAULT_CACHE_DIR as DEFAULT_FONT_CACHE_DIR
+from text_diff import compare_tokens
+from docx_package import DocxPackage
+
+# Version af den genererede HTML. Skal bumpes når en ændring giver andet output,
+# så gemte konverteringer i conversion_cache ikke genbruges på tværs af versioner.
+ENGINE_VERSION = "2.12"
 
 # Backstage farver
 PRIMARY_BLUE = "#001270"
@@ -40,6 +59,41 @@ HIGHLIGHT_KEYWORDS = [
     "I praksis betyder", "Dette betyder at",
 ]
 
+
+
+def _prefix_pattern(words) -> str:
+    """Regex der matcher ordene i words som et faktoriseret prefix-træ.
+
+    ["Vigtig:", "Vigtigt:"] bliver til "Vigtig(?::|t:)", så en tekst
+    matches i ét gennemløb uanset hvor mange ord der er.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in node.items() if char]
+        if '' in node:
+            return '(?:' + '|'.join(branches) + ')?' if branches else ''
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+
+    return build(trie)
+
+
+def compile_prefix_matcher(words, ignore_case: bool = False):
+    """Kompilér en liste af prefixes til én regex - brug .match(text)."""
+    return re.compile(_prefix_pattern(words), re.IGNORECASE if ignore_case else 0)
+
+
+# Kompileret én gang ved import (se is_highlight_box). Tilføjes der keywords
+# til HIGHLIGHT_KEYWORDS under kørsel, skal matcheren kompileres igen.
+HIGHLIGHT_MATCHER = compile_prefix_matcher(HIGHLIGHT_KEYWORDS)
+
 # H1 titler der IKKE skal have label/caption (lowercase for matching)
 NO_LABEL_HEADINGS = [
     "bilag", "ordliste", "appendix", "appendiks", "glossar", "glossary",
@@ -49,13 +103,638 @@ NO_LABEL_HEADINGS = [
 # Logo - bruger PNG fil for bedre print-kvalitet (17px for skarp PDF)
 LOGO_HTML = '''<img src="../Backstage Logo/Backstage Logo - Dark On White.png" alt="Backstage" style="height: 17px; width: auto; display: block;">'''
 
-# Global variabel til semantisk identificerede call-outs
-# Sættes af convert_to_html() når callout_paragraphs parameter bruges
-_semantic_callouts = []
 
-# Global variabel til at forhindre konsekutive call-outs
-# REGEL: Ingen to call-outs må stå lige efter hinanden
-_last_was_callout = False
+# Eksterne billeder ligger i assets/ ved siden af HTML-filen (se ConversionContext.asset_dir)
+ASSET_URL = "assets/"
+
+# Delt CSS/JS ligger i Runtime/ ved siden af Fonts/ (se ConversionContext.runtime_dir)
+RUNTIME_URL = "../Runtime/"
+
+
+class ConversionContext:
+    """Al tilstand for én konvertering.
+
+    Sendes eksplicit gennem render-funktionerne i stedet for modul-globale
+    variabler, så flere dokumenter kan konverteres samtidig i samme proces
+    (f.eks. i en ThreadPoolExecutor) uden at påvirke hinanden.
+
+    Et context-objekt hører til én konvertering og skal ikke genbruges.
+
+    Args:
+        callout_paragraphs: Semantisk identificerede call-out snippets
+        optimize_images: Nedskalér og re-encode billeder (se image_optimizer)
+        image_dpi: Mål-DPI for billedernes viste størrelse
+        image_quality: JPEG/WebP kvalitet ved optimering
+        asset_dir: Mappe billeder skrives til som separate filer i stedet for
+                   base64 data-URI'er (None = alt indlejret i én HTML-fil)
+        asset_url: Relativ URL til asset_dir set fra HTML-filen
+        paginate: Del indholdet op i sider på serveren (se pagination) i
+                  stedet for med browser-scriptet
+        runtime_dir: Mappe CSS og JS skrives til som delte, versionerede filer
+                     i stedet for at blive indlejret (se write_runtime)
+        runtime_url: Relativ URL til runtime_dir set fra HTML-filen
+        subset_fonts: Subset fontene til dokumentets tegn og indlejr dem som
+                      WOFF2 (eller skriv dem til asset_dir) i stedet for at
+                      linke til ../Fonts/ (kræver fontTools, se font_subset)
+        font_cache_dir: Disk-cache til font-subsets (None = ingen cache)
+    """
+
+    def __init__(self, callout_paragraphs: list = None, optimize_images: bool = False,
+                 image_dpi: int = DEFAULT_DPI, image_quality: int = DEFAULT_QUALITY,
+                 asset_dir: str = None, asset_url: str = ASSET_URL, paginate: bool = False,
+                 runtime_dir: str = None, runtime_url: str = RUNTIME_URL,
+                 subset_fonts: bool = False, font_cache_dir: str = DEFAULT_FONT_CACHE_DIR):
+        # Semantisk identificerede call-outs (se is_highlight_box).
+        # Indekseres første gang de bruges - se callout_index.
+        self.semantic_callouts = callout_paragraphs
+
+        # Billedoptimering er slået fra som default - output er så byte for byte originalen
+        self.image_optimizer = ImageOptimizer(image_dpi, image_quality) if optimize_images else None
+
+        # Eksterne billedfiler (f.eks. "HTML Exports/assets") - default er én selvstændig HTML-fil
+        self.asset_dir = asset_dir
+        self.asset_url = asset_url
+
+        # Server-side sider med endelige sidetal - default er browser-pagineringen
+        self.paginate = paginate
+
+        # Delt runtime (f.eks. "Runtime") - default er CSS og JS indlejret i hver rapport
+        self.runtime_dir = runtime_dir
+        self.runtime_url = runtime_url
+
+        # Font-subsetting er slået fra som default - rapporten linker så til ../Fonts/
+        self.font_subsetter = FontSubsetter(font_cache_dir) if subset_fonts else None
+
+        # Forhindrer konsekutive call-outs
+        # REGEL: Ingen to call-outs må stå lige efter hinanden
+        self.last_was_callout = False
+
+        # Dokumentets billeder (ImageStore) - sættes når konverteringen starter.
+        # Efter konverteringen giver context.images.stats() antal og sparede bytes.
+        self.images = None
+
+        # HTML-outputtets elementer og ord (OutputCounts) - tælles mens fragmenterne
+        # genereres, så quality_check(doc, counts=context.output_counts) ikke skal parse HTML'en.
+        # Forbliver None for et streamet dokument (parse_document(..., streaming=True)).
+        self.output_counts = None
+
+    @property
+    def semantic_callouts(self) -> list:
+        return self._semantic_callouts
+
+    @semantic_callouts.setter
+    def semantic_callouts(self, callout_paragraphs):
+        self._semantic_callouts = list(callout_paragraphs or [])
+        self._callout_index = None
+
+    @property
+    def callout_index(self) -> "CalloutIndex":
+        """CalloutIndex over semantic_callouts (bygges én gang pr. konvertering)."""
+        if self._callout_index is None:
+            self._callout_index = CalloutIndex(self._semantic_callouts)
+        return self._callout_index
+
+    def unmatched_callouts(self) -> list:
+        """Call-out snippets der ikke har matchet nogen paragraf i konverteringen."""
+        return self.callout_index.unmatched()
+
+
+# Block-typer i den mellemliggende repræsentation (se parse_document)
+BLOCK_PARAGRAPH = 'paragraph'
+BLOCK_TABLE = 'table'
+
+
+class Block:
+    """Én block-level record fra dokumentets body (paragraf eller tabel).
+
+    Bygges én gang af parse_document() direkte fra body-XML'en, så de
+    forskellige entry points ikke hver især skal gå dokumentet igennem igen.
+
+    Felter:
+        kind: BLOCK_PARAGRAPH eller BLOCK_TABLE
+        para_index: Index i doc.paragraphs (kun paragraffer, ellers None)
+        style_name: Opslået style-navn (f.eks. "Heading 1")
+        style_type: Resultat af get_style_type() (f.eks. 'h1', 'list', 'p')
+        text: Paragraffens rene tekst (strippet)
+        runs: Liste af (tekst, fed, kursiv, href) spans
+        image_ids: Relationship-ID'er for billeder i paragraffen
+        links: Hyperlink-mål i paragraffen
+        rows: Tabelrækker som lister af TableCell (flettede celler kun én gang)
+        header_rows: Antal rækker i tabellens hoved (<thead>)
+        anchor: Stabilt HTML-id for H1-H3 overskrifter (se _assign_heading_id)
+    """
+    __slots__ = ('kind', 'para_index', 'style_name', 'style_type', 'text',
+                 'runs', 'image_ids', 'links', 'rows', 'header_rows', 'anchor')
+
+    def __init__(self, kind, para_index=None, style_name='', style_type='',
+                 text='', runs=(), image_ids=(), links=(), rows=(), header_rows=0,
+                 anchor=None):
+        self.kind = kind
+        self.para_index = para_index
+        self.style_name = style_name
+        self.style_type = style_type
+        self.text = text
+        self.runs = runs
+        self.image_ids = image_ids
+        self.links = links
+        self.rows = rows
+        self.header_rows = header_rows
+        self.anchor = anchor
+
+    def __repr__(self):
+        preview = self.text[:40] if self.kind == BLOCK_PARAGRAPH else f'{len(self.rows)} rækker'
+        return f'<Block {self.kind} {self.style_type or ""} {preview!r}>'
+
+
+class TableCell:
+    """Én celle i en tabel-Block.
+
+    Felter:
+        paragraphs: Tuple af cellens paragraf-tekster
+        colspan: Antal grid-kolonner cellen dækker (w:gridSpan)
+        rowspan: Antal rækker cellen dækker (w:vMerge)
+    """
+    __slots__ = ('paragraphs', 'colspan', 'rowspan')
+
+    def __init__(self, paragraphs: tuple, colspan: int = 1, rowspan: int = 1):
+        self.paragraphs = paragraphs
+        self.colspan = colspan
+        self.rowspan = rowspan
+
+    def __repr__(self):
+        return f'<TableCell {" ".join(self.paragraphs)[:30]!r} {self.colspan}x{self.rowspan}>'
+
+
+class ParsedDocument:
+    """Et Word-dokument parset én gang til en liste af Block records.
+
+    Returneres af parse_document() og kan gives direkte til convert_to_html,
+    collect_headings_for_toc, extract_paragraphs_for_analysis, extract_images
+    og quality_check i stedet for et Document. blocks er en liste, eller en
+    BlockStream ved streaming.
+
+    Har parse_document() selv åbnet en DocxPackage (sti eller file-like
+    objekt), lukker close() - eller en with-blok - zip-filen igen. Et
+    Document eller en DocxPackage som kalderen har givet, lukkes ikke.
+    """
+
+    def __init__(self, doc, blocks, styles: "StyleTable" = None, owns_package: bool = False):
+        self.doc = doc
+        self.blocks = blocks
+        self.styles = styles
+        self._owns_package = owns_package
+
+    def close(self):
+        """Luk pakken, hvis parse_document() åbnede den."""
+        if self._owns_package:
+            self.doc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def tables(self) -> list:
+        return [block for block in self.blocks if block.kind == BLOCK_TABLE]
+
+
+def parse_document(doc, streaming: bool = False) -> ParsedDocument:
+    """Pars et Word-dokument til den fælles block-IR.
+
+    Body-XML'en gennemløbes én gang; style-navn, paragraf-type, tekst,
+    run-spans, billed-referencer og hyperlinks beregnes pr. block.
+
+    En sti eller et file-like objekt åbnes som DocxPackage (se docx_package):
+    kun document.xml, styles.xml og relationerne læses ind, og billederne
+    hentes fra zip-filen først når konverteringen bruger dem.
+
+    Med streaming=True (eller en DocxPackage åbnet med streaming=True) bliver
+    blocks en BlockStream: document.xml læses med iterparse ved hvert
+    gennemløb, og hverken XML-træet eller listen af blocks holdes i
+    hukommelsen. Sammen med convert_to_file() er hukommelsen så den samme
+    uanset dokumentets længde - til gengæld læses body'en en gang pr. trin
+    (TOC, fonte, body, ...).
+
+    Args:
+        doc: Document objekt, DocxPackage, sti til en .docx fil eller et file-like objekt
+        streaming: Stream body'en i stedet for at bygge alle blocks (kun for
+                   stier, file-like objekter og DocxPackage)
+
+    Returns:
+        ParsedDocument der kan genbruges af alle entry points. Luk det med
+        close() eller brug det i en with-blok, når doc var en sti eller et
+        file-like objekt.
+    """
+    if isinstance(doc, ParsedDocument):
+        return doc
+    owns_package = not hasattr(doc, 'element')
+    if owns_package:
+        doc = DocxPackage(doc, streaming=streaming)
+
+    try:
+        styles = style_table(doc.part)
+        if getattr(doc, 'streaming', False):
+            return ParsedDocument(doc, BlockStream(doc, styles), styles, owns_package)
+        return ParsedDocument(doc, list(_iter_blocks(doc, styles)), styles, owns_package)
+    except BaseException:
+        if owns_package:
+            doc.close()
+        raise
+
+
+def _iter_blocks(doc, styles: "StyleTable"):
+    """Byg dokumentets blocks i rækkefølge, med overskrifts-anchors."""
+    from docx.text.paragraph import Paragraph
+
+    para_index = 0
+    tag_p = qn('w:p')
+    tag_tbl = qn('w:tbl')
+    # Felter (f.eks. TOC) kan starte i én paragraf og slutte mange paragraffer senere
+    fields = FieldState()
+    anchors = set()
+
+    for child in _body_elements(doc):
+        if child.tag == tag_p:
+            block = _paragraph_block(Paragraph(child, doc), para_index, styles, fields)
+            _assign_heading_id(block, anchors)
+            para_index += 1
+            yield block
+        elif child.tag == tag_tbl:
+            yield _table_block(child, doc.part)
+
+
+def _body_elements(doc):
+    """Body'ens børn fra et Document eller en DocxPackage (evt. streamet)."""
+    if isinstance(doc, DocxPackage):
+        return doc.iter_body()
+    return doc.element.body.iterchildren()
+
+
+class BlockStream:
+    """Blocks der bygges på ny fra document.xml ved hver iteration.
+
+    blocks for et ParsedDocument fra parse_document(..., streaming=True).
+    Kan gennemløbes flere gange, men ikke indekseres; en Block holder ingen
+    referencer til XML'en, så kun den block der behandles lige nu, er i
+    hukommelsen.
+    """
+    __slots__ = ('_doc', '_styles')
+
+    def __init__(self, doc, styles: "StyleTable"):
+        self._doc = doc
+        self._styles = styles
+
+    def __iter__(self):
+        return _iter_blocks(self._doc, self._styles)
+
+
+# Danske bogstaver translittereres før resten reduceres til ASCII
+SLUG_TRANSLATION = str.maketrans({'æ': 'ae', 'ø': 'oe', 'å': 'aa'})
+HEADING_TYPES = ('h1', 'h2', 'h3')
+
+
+def _heading_slug(text: str) -> str:
+    """URL-venligt id fra en overskrift ("1.2 Økonomi" → "1-2-oekonomi")."""
+    text = unicodedata.normalize('NFKD', text.lower().translate(SLUG_TRANSLATION))
+    slug = re.sub(r'[^a-z0-9]+', '-', text.encode('ascii', 'ignore').decode('ascii')).strip('-')
+    return slug[:60].rstrip('-') or 'afsnit'
+
+
+def _assign_heading_id(block: Block, used: set):
+    """Giv en H1-H3 block et unikt, deterministisk anchor.
+
+    Id'et afhænger kun af overskrifternes tekst og rækkefølge (used er
+    anchors for de foregående overskrifter), så samme dokument altid giver
+    samme links. Gentagne overskrifter (f.eks. "Opsummering" i hvert
+    kapitel) nummereres: opsummering, opsummering-2, ...
+    """
+    if block.style_type not in HEADING_TYPES or not block.text:
+        return
+    base = _heading_slug(block.text)
+    anchor = base
+    number = 2
+    while anchor in used:
+        anchor = f'{base}-{number}'
+        number += 1
+    used.add(anchor)
+    block.anchor = anchor
+
+
+def _as_parsed(doc) -> ParsedDocument:
+    """Returnér doc som ParsedDocument (parser kun hvis nødvendigt)."""
+    if isinstance(doc, ParsedDocument):
+        return doc
+    return parse_document(doc)
+
+
+@contextmanager
+def _parsed_document(doc):
+    """_as_parsed() der lukker pakken igen, hvis den blev åbnet her (sti eller file-objekt)."""
+    parsed = _as_parsed(doc)
+    try:
+        yield parsed
+    finally:
+        if parsed is not doc:
+            parsed.close()
+
+
+def _paragraph_block(para, para_index: int = None, styles: "StyleTable" = None,
+                     fields: "FieldState" = None) -> Block:
+    """Byg en paragraf-Block fra en python-docx Paragraph.
+
+    fields er felt-tilstanden fra de foregående paragraffer (se FieldState).
+    """
+    if styles is None:
+        styles = style_table(para.part)
+    style_id = para._element.style
+    runs = _extract_runs(para._element, para.part, fields)
+    # Samme tekst som para.text, men uden felt-instruktioner og med felt-resultater
+    raw_text = ''.join(span[0] for span in runs)
+    return Block(
+        BLOCK_PARAGRAPH,
+        para_index=para_index,
+        style_name=styles.name(style_id),
+        style_type=_classify_paragraph(styles.kind(style_id), raw_text, para._element),
+        text=raw_text.strip(),
+        runs=runs,
+        image_ids=_extract_image_ids(para._element),
+        links=[href for _, _, _, href in runs if href],
+    )
+
+
+# Tags i tabel-XML'en
+TAG_P = qn('w:p')
+TAG_TR = qn('w:tr')
+TAG_TC = qn('w:tc')
+TAG_TRPR = qn('w:trPr')
+TAG_TCPR = qn('w:tcPr')
+TAG_TBL_HEADER = qn('w:tblHeader')
+TAG_GRID_BEFORE = qn('w:gridBefore')
+TAG_GRID_SPAN = qn('w:gridSpan')
+TAG_VMERGE = qn('w:vMerge')
+
+# Rækker og celler kan ligge i content controls (w:sdt) eller w:customXml
+TABLE_CONTAINER_TAGS = {qn('w:sdt'), qn('w:sdtContent'), qn('w:customXml')}
+
+# Største antal rækker tabelhovedet trækkes ud til af celler der fletter ned i kroppen
+MAX_HEADER_ROWS = 3
+
+
+def _table_block(tbl, part=None) -> Block:
+    """Byg en tabel-Block direkte fra et w:tbl element.
+
+    w:tr/w:tc gennemløbes én gang (python-docx' row.cells genberegner hele
+    grid'et pr. række). w:gridSpan bliver colspan og w:vMerge rowspan, så en
+    flettet celle kun optræder én gang. Ledende rækker markeret som
+    gentagne overskriftsrækker (w:tblHeader) bliver tabellens hoved - uden
+    dem er første række hovedet. En celle i hovedet der fletter ned i
+    kroppen, trækker højst MAX_HEADER_ROWS rækker med ind i hovedet - ellers
+    deles fletningen ved hovedets kant (se _split_header_merges).
+
+    Args:
+        tbl: w:tbl element (eller en python-docx Table)
+        part: Dokument-part (til hyperlinks i cellerne)
+    """
+    if not hasattr(tbl, 'tag'):
+        tbl, part = tbl._tbl, tbl.part
+
+    rows = []
+    header_rows = 0
+    in_header = True
+    # Grid-kolonne → cellen der er startet med vMerge="restart" i kolonnen
+    merges = {}
+    # Celle → grid-kolonnen den starter i (til _split_header_merges)
+    columns = {}
+
+    for tr in _table_children(tbl, TAG_TR):
+        row = []
+        column = 0
+        is_header = False
+        for tr_child in tr:
+            if tr_child.tag == TAG_TRPR:
+                for prop in tr_child:
+                    if prop.tag == TAG_GRID_BEFORE:
+                        column = _int_val(prop, 0)
+                    elif prop.tag == TAG_TBL_HEADER:
+                        is_header = prop.get(TAG_VAL) not in OFF_VALUES
+            if tr_child.tag in (TAG_TRPR, TAG_TC):
+                break
+
+        covered = set()  # grid-kolonner hvor en celle starter i denne række
+        for tc in _table_children(tr, TAG_TC):
+            colspan = 1
+            merge = None
+            paragraphs = []
+            for tc_child in tc:
+                tag = tc_child.tag
+                if tag == TAG_P:
+                    paragraphs.append(tc_child)
+                elif tag == TAG_TCPR:
+                    for prop in tc_child:
+                        if prop.tag == TAG_GRID_SPAN:
+                            colspan = max(1, _int_val(prop, 1))
+                        elif prop.tag == TAG_VMERGE:
+                            merge = prop.get(TAG_VAL) or 'continue'
+
+            started = merges.get(column)
+            if merge == 'continue' and started is not None and started.colspan == colspan:
+                # Fortsættelse af en lodret fletning - cellen over bliver højere
+                started.rowspan += 1
+            else:
+                # Felt-tilstanden følger cellens paragraffer som i body'en (se FieldState)
+                fields = FieldState()
+                cell = TableCell(tuple(_cell_paragraph_text(p, part, fields) for p in paragraphs),
+                                 colspan)
+                row.append(cell)
+                columns[cell] = column
+                if merge == 'restart':
+                    merges[column] = cell
+                else:
+                    merges.pop(column, None)
+            covered.add(column)
+            column += colspan
+
+        # Kolonner rækken ikke dækker (w:gridBefore, korte rækker) afbryder en fletning -
+        # en senere vMerge="continue" i kolonnen må ikke forlænge cellen fra før hullet
+        for merged_column in [c for c in merges if c not in covered]:
+            del merges[merged_column]
+
+        rows.append(row)
+        if in_header and is_header:
+            header_rows += 1
+        else:
+            in_header = False
+
+    if rows and not header_rows:
+        header_rows = 1
+    header_rows = min(header_rows, len(rows))
+    # En celle i hovedet der fletter ned i kroppen trækker rækkerne med i hovedet
+    extended = header_rows
+    row_index = 0
+    while row_index < extended:
+        for cell in rows[row_index]:
+            extended = max(extended, row_index + cell.rowspan)
+        row_index += 1
+    if extended <= max(header_rows, MAX_HEADER_ROWS):
+        header_rows = extended
+    else:
+        # F.eks. en hoved-celle flettet gennem et helt bilag - kroppen bliver i <tbody>
+        _split_header_merges(rows, header_rows, columns)
+
+    return Block(BLOCK_TABLE, rows=rows, header_rows=header_rows)
+
+
+def _split_header_merges(rows: list, header_rows: int, columns: dict):
+    """Del celler der fletter fra hovedet ned i kroppen ved hovedets kant.
+
+    Hoved-cellen beholder teksten; resten af fletningen bliver en tom celle
+    i første kropsrække, placeret efter grid-kolonne.
+    """
+    body_row = rows[header_rows]
+    for row_index in range(header_rows):
+        for cell in rows[row_index]:
+            remainder = row_index + cell.rowspan - header_rows
+            if remainder <= 0:
+                continue
+            cell.rowspan -= remainder
+            continuation = TableCell((), cell.colspan, remainder)
+            columns[continuation] = columns[cell]
+            position = sum(1 for other in body_row if columns[other] < columns[cell])
+            body_row.insert(position, continuation)
+
+
+def _table_children(parent, tag):
+    """Børn med tag, også dem der ligger i content controls o.l."""
+    for child in parent:
+        if child.tag == tag:
+            yield child
+        elif child.tag in TABLE_CONTAINER_TAGS:
+            yield from _table_children(child, tag)
+
+
+def _int_val(element, default: int) -> int:
+    """Heltallet i et elements w:val (default hvis det mangler eller er ugyldigt)."""
+    try:
+        return int(element.get(TAG_VAL))
+    except (TypeError, ValueError):
+        return default
+
+
+def _cell_paragraph_text(p_element, part, fields: "FieldState" = None) -> str:
+    """Tekst for én paragraf i en tabelcelle (samme regler som _extract_runs)."""
+    return ''.join(span[0] for span in _extract_runs(p_element, part, fields))
+
+
+def _extract_image_ids(p_element) -> list:
+    """Find relationship-ID'er for alle billeder (a:blip) i en paragraf."""
+    image_ids = []
+    for blip in p_element.iter(qn('a:blip')):
+        embed_id = blip.get(qn('r:embed'))
+        if embed_id:
+            image_ids.append(embed_id)
+    return image_ids
+
+
+# Lokaliserede navne på Words indbyggede styles. Word selv gemmer de engelske
+# navne i styles.xml, men dokumenter fra f.eks. LibreOffice og ældre skabeloner
+# har de oversatte navne direkte ("Overskrift 1").
+LOCALIZED_STYLE_NAMES = {
+    **{f'{word} {level}': f'Heading {level}'
+       for word in ('overskrift', 'rubrik', 'überschrift', 'otsikko')
+       for level in range(1, 10)},
+    'overskrift til indholdsfortegnelse': 'TOC Heading',
+    'indholdsfortegnelsesoverskrift': 'TOC Heading',
+}
+
+
+class StyleTable:
+    """Dokumentets styles slået op én gang fra styles.xml.
+
+    For hvert styleId gemmes navnet som python-docx viser det (para.style.name)
+    og den paragraf-type style-navnet giver. Typen findes ved at gå styles
+    arvekæde igennem: stylens eget navn, den linkede style ("Heading 1 Char"
+    → "Heading 1") og basedOn-kæden, med lokaliserede navne oversat
+    ("Overskrift 1" → "Heading 1"). Første navn der afgør typen vinder.
+
+    Opslag med name()/kind() er derefter O(1) pr. paragraf.
+    """
+
+    def __init__(self, styles_element):
+        from docx.styles import BabelFish
+
+        raw = {}
+        self.default_id = None
+        for style in styles_element.iterchildren(qn('w:style')):
+            style_id = style.get(qn('w:styleId'))
+            if style_id is None:
+                continue
+            name = style.find(qn('w:name'))
+            based_on = style.find(qn('w:basedOn'))
+            link = style.find(qn('w:link'))
+            style_type = style.get(qn('w:type'), 'paragraph')
+            raw[style_id] = (
+                BabelFish.internal2ui(name.get(qn('w:val'))) if name is not None else None,
+                style_type,
+                based_on.get(qn('w:val')) if based_on is not None else None,
+                link.get(qn('w:val')) if link is not None else None,
+            )
+            if style_type == 'paragraph' and style.get(qn('w:default')) in ('1', 'true', 'on'):
+                self.default_id = style_id
+
+        self._raw = raw
+        self.names = {style_id: entry[0] or style_id for style_id, entry in raw.items()}
+        self.types = {style_id: entry[1] for style_id, entry in raw.items()}
+        self.kinds = {style_id: self._resolve_kind(style_id) for style_id in raw}
+
+    def chain(self, style_id: str) -> list:
+        """Navnene i stylens arvekæde: egen, linket, basedOn, basedOn's linkede ..."""
+        names = []
+        seen = set()
+        while style_id in self._raw and style_id not in seen:
+            seen.add(style_id)
+            name, _, based_on, link = self._raw[style_id]
+            names.append(self.names[style_id])
+            if link in self._raw and link not in seen:
+                seen.add(link)
+                names.append(self.names[link])
+            style_id = based_on
+        return names
+
+    def _resolve_kind(self, style_id: str) -> str:
+        for name in self.chain(style_id):
+            kind = _style_name_kind(LOCALIZED_STYLE_NAMES.get(name.lower(), name))
+            if kind:
+                return kind
+        return None
+
+    def _paragraph_style_id(self, style_id: str) -> str:
+        """Som python-docx: ukendte eller ikke-paragraf styles giver default-stylen."""
+        if style_id in self._raw and self.types[style_id] == 'paragraph':
+            return style_id
+        return self.default_id
+
+    def name(self, style_id: str) -> str:
+        """Style-navn for en paragraf (samme værdi som para.style.name)."""
+        style_id = self._paragraph_style_id(style_id)
+        return self.names[style_id] if style_id is not None else "Normal"
+
+    def kind(self, style_id: str) -> str:
+        """Paragraf-typen stylen giver ('h1', 'toc_entry', 'code' ...) eller None."""
+        return self.kinds.get(self._paragraph_style_id(style_id))
+
+
+# Én StyleTable pr. dokument-part, så også rå python-docx paragraffer slår op i O(1)
+_STYLE_TABLES = weakref.WeakKeyDictionary()
+
+
+def style_table(part) -> StyleTable:
+    """StyleTable for et dokument (bygges første gang og genbruges derefter)."""
+    table = _STYLE_TABLES.get(part)
+    if table is None:
+        table = _STYLE_TABLES[part] = StyleTable(part.styles.element)
+    return table
 
 
 def extract_paragraphs_for_analysis(doc) -> list:
@@ -64,18 +743,29 @@ def extract_paragraphs_for_analysis(doc) -> list:
     Bruges af Claude til at identificere call-out kandidater.
     Returnerer liste af dicts med paragraf-info.
 
+    Args:
+        doc: Document objekt eller ParsedDocument fra parse_document()
+
     Returns:
         Liste af dicts: [{"index": 0, "text": "...", "style": "Normal", "length": 123}, ...]
     """
+    with _parsed_document(doc) as parsed:
+        return _analysis_paragraphs(parsed)
+
+
+def _analysis_paragraphs(parsed: ParsedDocument) -> list:
     paragraphs = []
 
-    for i, para in enumerate(doc.paragraphs):
-        text = para.text.strip()
+    for block in parsed.blocks:
+        if block.kind != BLOCK_PARAGRAPH:
+            continue
+
+        text = block.text
         if not text:
             continue
 
         # Skip TOC entries
-        style_name = para.style.name if para.style else "Normal"
+        style_name = block.style_name
         if 'TOC' in style_name or 'Indholdsfortegnelse' in style_name:
             continue
 
@@ -84,11 +774,11 @@ def extract_paragraphs_for_analysis(doc) -> list:
             continue
 
         # Skip headings (de skal ikke være call-outs)
-        if 'Heading' in style_name:
+        if 'Heading' in style_name or block.style_type in ('h1', 'h2', 'h3'):
             continue
 
         paragraphs.append({
-            "index": i,
+            "index": block.para_index,
             "text": text,
             "style": style_name,
             "length": len(text),
@@ -202,7 +892,7 @@ def generate_back_page(title: str, caption: str = "RAPPORT") -> str:
 
 def convert_to_html(doc: Document, title: str = "Dokument", callout_paragraphs: list = None,
                     cover_caption: str = "RAPPORT", cover_description: str = None,
-                    cover_date: str = None) -> str:
+                    cover_date: str = None, context: ConversionContext = None) -> str:
     """Konverterer Word-dokument til HTML med Backstage styling og A4 sider.
 
     Genererer:
@@ -211,7 +901,7 @@ def convert_to_html(doc: Document, title: str = "Dokument", callout_paragraphs:
     - Dokumentindhold med Backstage formatering
 
     Args:
-        doc: Word Document objekt
+        doc: Word Document objekt eller ParsedDocument fra parse_document()
         title: Dokumenttitel (bruges til forside OG HTML head)
         callout_paragraphs: Liste af tekst-snippets der skal formateres som call-out boxes.
                            Identificeres typisk via semantisk analyse af Claude.
@@ -222,26 +912,147 @@ def convert_to_html(doc: Document, title: str = "Dokument", callout_paragraphs:
                           Vises KUN på forsiden, ikke bagsiden.
         cover_date: Dato for rapporten (f.eks. "Februar 2026").
                    Vises til højre for logoet på forsiden.
+        context: Valgfrit ConversionContext til denne konvertering. Oprettes
+                automatisk hvis det ikke angives.
+
+    Returns:
+        Hele HTML-dokumentet som string. Brug convert_to_file() eller
+        convert_to_html_stream() for store dokumenter.
     """
-    # Gem callout_paragraphs globalt så is_highlight_box() kan bruge dem
-    global _semantic_callouts, _last_was_callout
-    _semantic_callouts = callout_paragraphs or []
-    _last_was_callout = False  # Reset ved start af ny konvertering
+    return ''.join(convert_to_html_stream(doc, title, callout_paragraphs, cover_caption,
+                                          cover_description, cover_date, context))
+
+
+def convert_to_html_stream(doc: Document, title: str = "Dokument", callout_paragraphs: list = None,
+                           cover_caption: str = "RAPPORT", cover_description: str = None,
+                           cover_date: str = None, context: ConversionContext = None):
+    """Konverterer Word-dokument til HTML som en strøm af fragmenter.
+
+    Header, forside, TOC, body-blocks og footer gives i rækkefølge, efterhånden
+    som de genereres, så hele outputtet aldrig skal ligge i hukommelsen på én
+    gang. ''.join() af fragmenterne er identisk med convert_to_html().
+
+    Argumenter som convert_to_html().
+
+    Yields:
+        HTML-fragmenter (str)
+    """
+    # Al tilstand for denne konvertering bor i context - ingen globale variabler
+    if context is None:
+        context = ConversionContext(callout_paragraphs)
+    elif callout_paragraphs is not None:
+        context.semantic_callouts = list(callout_paragraphs)
+
+    # Pars dokumentet én gang - alle trin læser fra den samme IR.
+    # Sker før første fragment, så en ugyldig fil fejler inden output skrives.
+    # En pakke der åbnes her, lukkes igen når strømmen er løbet ud (eller lukkes).
+    with _parsed_document(doc) as parsed:
+        # QC-tællingerne følger med fragmenterne i stedet for at parse HTML'en bagefter.
+        # Ikke for et streamet dokument: ordlisten vokser med dokumentet - brug
+        # quality_check(parsed, html_path=...) på den skrevne fil i stedet.
+        counts = context.output_counts = None if isinstance(parsed.blocks, BlockStream) else OutputCounts()
+
+        first = True
+        for part in _iter_html_parts(parsed, title, cover_caption, cover_description, cover_date, context):
+            if not first:
+                yield '\n'
+            first = False
+            if counts is not None:
+                counts.feed(part)
+            yield part
+
+
+def convert_to_file(doc: Document, output, title: str = "Dokument", callout_paragraphs: list = None,
+                    cover_caption: str = "RAPPORT", cover_description: str = None,
+                    cover_date: str = None, context: ConversionContext = None) -> int:
+    """Konverterer Word-dokument og skriver HTML som UTF-8 direkte til en binær strøm.
+
+    Fragmenterne encodes og skrives ét ad gangen, så peak-hukommelsen ikke
+    vokser med dokumentets størrelse (bortset fra det største enkeltbillede).
+
+    Args:
+        doc: Word Document objekt eller ParsedDocument fra parse_document()
+        output: Binært file-objekt (åbnet med 'wb') eller sti til output-filen.
+               En sti skrives atomisk (midlertidig fil + os.replace).
+        Øvrige argumenter som convert_to_html().
+
+    Returns:
+        Antal skrevne bytes
+    """
+    if isinstance(output, (str, os.PathLike)):
+        # Midlertidig fil i samme mappe, så en fejlet konvertering aldrig efterlader en halv HTML-fil
+        tmp_path = f'{os.fspath(output)}.{uuid.uuid4().hex[:8]}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                written = convert_to_file(doc, f, title, callout_paragraphs, cover_caption,
+                                          cover_description, cover_date, context)
+            os.replace(tmp_path, output)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return written
+
+    written = 0
+    # Pakken lukkes her, også hvis skrivningen fejler midt i strømmen
+    with _parsed_document(doc) as parsed:
+        for fragment in convert_to_html_stream(parsed, title, callout_paragraphs, cover_caption,
+                                               cover_description, cover_date, context):
+            data = fragment.encode('utf-8')
+            output.write(data)
+            written += len(data)
+    return written
+
+
+def _iter_html_parts(doc, title, cover_caption, cover_description, cover_date, context):
+    """Generér HTML-dokumentets dele i rækkefølge (uden separatorer)."""
+    parsed = _as_parsed(doc)
+
+    # Delt CSS/JS skrives én gang pr. version - rapporterne linker bare til den
+    runtime = write_runtime(context.runtime_dir, context.runtime_url) if context.runtime_dir else None
+
+    # Billeder encodes først når de bruges (og kun én gang pr. unikt billede)
+    images = context.images = extract_images(parsed, optimizer=context.image_optimizer,
+                                             asset_dir=context.asset_dir, asset_url=context.asset_url)
+
+    # Kun de fonte dokumentet bruger erklæres (og subsettes til dokumentets tegn),
+    # før headeren kan skrives
+    font_faces = document_font_faces(parsed)
+    font_sources = None
+    if context.font_subsetter is not None:
+        characters = document_characters(parsed, title, cover_caption, cover_description, cover_date)
+        font_sources = _subset_font_sources(characters, font_faces, context, images)
 
     # Start HTML med forside først
-    html_parts = [get_html_header_no_page(title)]
+    # Billeder der bruges flere gange, står én gang i headerens CSS
+    image_css = images.shared_css(parsed.blocks)
+
+    yield get_html_header_no_page(title, runtime, font_faces, font_sources, image_css)
 
     # === INDSÆT FORSIDE ===
-    html_parts.append(generate_cover_page(title, cover_caption, cover_description, cover_date))
+    yield generate_cover_page(title, cover_caption, cover_description, cover_date)
+
+    if context.paginate:
+        # Hele body'en måles før første side kan skrives (sidetal i TOC'en)
+        paginator = Paginator(image_sizes=images.sizes)
+        pages = paginator.paginate(_iter_body_parts(parsed, title, context, images))
+        for number, page in enumerate(pages, 1):
+            yield get_page_html('\n'.join(page), number)
+        yield get_html_footer_paginated()
+        return
 
     # Start første indholdsside
-    html_parts.append('    <div class="page">\n      <div class="page-content">')
+    yield '    <div class="page">\n      <div class="page-content">'
+    yield from _iter_body_parts(parsed, title, context, images)
 
-    # Ekstraher billeder først
-    images = extract_images(doc)
+    # === AFSLUT DOKUMENT ===
+    # Brug standard footer (som virker) - den lukker page-content, page, og document
+    yield get_html_footer(runtime)
 
+
+def _iter_body_parts(parsed, title, context, images):
+    """Generér body-blokkenes HTML (TOC, labels, billeder, paragraffer, tabeller)."""
     # === STEP 1: Saml alle overskrifter til TOC ===
-    toc_entries = collect_headings_for_toc(doc)
+    toc_entries = collect_headings_for_toc(parsed)
 
     # Track H1 count for page breaks
     h1_count = 0
@@ -250,12 +1061,12 @@ def convert_to_html(doc: Document, title: str = "Dokument", callout_paragraphs:
     seen_first_content_h1 = False  # Flag til at tracke om vi har nået faktisk indhold
 
     # Iterér over dokumentet i rigtig rækkefølge (paragraffer OG tabeller)
-    for element in iter_block_items(doc):
-        if isinstance(element, type(doc.paragraphs[0])) if doc.paragraphs else False:
+    for block in parsed.blocks:
+        if block.kind == BLOCK_PARAGRAPH:
             # Det er en paragraf
-            para = element
-            text = para.text.strip()
-            style_type = get_style_type(para)
+            para = block
+            text = block.text
+            style_type = block.style_type
 
             # === SKIP MANUEL TOC FRA WORD ===
             # Spring Word's egen indholdsfortegnelse over - vi genererer vores egen
@@ -275,9 +1086,9 @@ def convert_to_html(doc: Document, title: str = "Dokument", callout_paragraphs:
                 if len(text) < 150 or is_title_block_metadata(text):
                     # VIGTIGT: Tjek for billede FØR vi springer teksten over
                     # Billeder i title block skal stadig med i dokumentet
-                    image_html = get_paragraph_image(para, images)
+                    image_html = _block_image_html(para, images)
                     if image_html:
-                        html_parts.append(image_html)
+                        yield image_html
                     continue  # Spring kun TEKSTEN over, ikke billedet
 
             # TOC heading - INGEN label/caption (regel)
@@ -302,54 +1113,61 @@ def convert_to_html(doc: Document, title: str = "Dokument", callout_paragraphs:
 
                 # Indsæt TOC før første INDHOLD-H1 (ikke titel)
                 if not toc_inserted:
-                    html_parts.append(generate_toc_html(toc_entries))
-                    html_parts.append('<div class="page-break"></div>')
+                    yield generate_toc_html(toc_entries)
+                    yield '<div class="page-break"></div>'
                     toc_inserted = True
                 else:
                     # Page break før efterfølgende kapitler
-                    html_parts.append('<div class="page-break"></div>')
+                    yield '<div class="page-break"></div>'
 
                 # Tilføj label før H1 - MEN IKKE for Bilag, Ordliste, etc.
-                heading_text = para.text.strip().lower()
+                heading_text = text.lower()
                 should_have_label = not any(skip in heading_text for skip in NO_LABEL_HEADINGS)
                 if should_have_label:
-                    label = generate_label(para.text.strip())
-                    html_parts.append(f'<span class="label">{html_lib.escape(label)}</span>')
+                    label = generate_label(text)
+                    yield f'<span class="label">{html_lib.escape(label)}</span>'
 
             # Check for billede i paragraf
-            image_html = get_paragraph_image(para, images)
+            image_html = _block_image_html(para, images)
             if image_html:
-                html_parts.append(image_html)
+                yield image_html
 
             # Process tekst (kan være tom hvis det kun var et billede)
-            para_html = process_paragraph(para)
+            para_html = process_paragraph(para, context)
             if para_html:
-                html_parts.append(para_html)
+                yield para_html
 
-        elif hasattr(element, 'rows'):
+        elif block.kind == BLOCK_TABLE:
             # Det er en tabel
-            html_parts.append(process_table(element))
+            yield process_table(block)
 
-    # === AFSLUT DOKUMENT ===
-    # Brug standard footer (som virker) - den lukker page-content, page, og document
-    html_parts.append(get_html_footer())
 
-    return '\n'.join(html_parts)
-
-
-def collect_headings_for_toc(doc: Document) -> list:
+def collect_headings_for_toc(doc) -> list:
     """Saml alle overskrifter fra dokumentet til indholdsfortegnelse.
 
-    Returnerer liste af tuples: (niveau, tekst)
+    Accepterer et Document eller et ParsedDocument fra parse_document().
+
+    Returnerer liste af tuples: (niveau, tekst, anchor)
     niveau: 1=H1, 2=H2, 3=H3
+    anchor: Overskriftens HTML-id (se _assign_heading_id) - sat for både et
+            Document og et ParsedDocument
+
+    Før anchors kom til, var tuplerne (niveau, tekst); kald der pakker to
+    værdier ud, skal bruge entry[:2].
     """
+    with _parsed_document(doc) as parsed:
+        return _toc_headings(parsed)
+
+
+def _toc_headings(parsed: ParsedDocument) -> list:
     headings = []
     h1_count = 0
 
-    for para in doc.paragraphs:
-        style_name = para.style.name if para.style else "Normal"
-        text = para.text.strip()
+    for block in parsed.blocks:
+        if block.kind != BLOCK_PARAGRAPH:
+            continue
 
+        text = block.text
         if not text:
             continue
 
@@ -357,48 +1175,107 @@ def collect_headings_for_toc(doc: Document) -> list:
         if is_manual_toc_heading(text):
             continue
 
-        if 'Heading 1' in style_name:
+        style_type = block.style_type
+        if style_type == 'h1':
             h1_count += 1
             # Skip første H1 (det er titlen, ikke et kapitel)
             if h1_count > 1:
-                headings.append((1, text))
-        elif 'Heading 2' in style_name:
-            headings.append((2, text))
-        elif 'Heading 3' in style_name:
-            headings.append((3, text))
+                headings.append((1, text, block.anchor))
+        elif style_type == 'h2':
+            headings.append((2, text, block.anchor))
+        elif style_type == 'h3':
+            headings.append((3, text, block.anchor))
 
     return headings
 
 
 def generate_toc_html(entries: list) -> str:
-    """Generer HTML for indholdsfortegnelse."""
+    """Generer HTML for indholdsfortegnelse.
+
+    Hver linje linker til overskriftens id, så TOC'en er klikbar (også i
+    PDF) og sidetallene kan slås op direkte på id'et.
+    """
     if not entries:
         return ''
 
     html_parts = []
     html_parts.append('<h2 class="toc-heading">Indholdsfortegnelse</h2>')
 
-    for level, text in entries:
+    for level, text, anchor in entries:
         escaped_text = html_lib.escape(text)
+        if anchor:
+            escaped_text = f'<a href="#{anchor}">{escaped_text}</a>'
         html_parts.append(f'<p class="toc-entry toc-level-{level}">{escaped_text}</p>')
 
     return '\n'.join(html_parts)
 
 
 def iter_block_items(doc):
-    """Iterér over alle block-level elementer i dokumentrækkefølge."""
-    from docx.document import Document as DocDocument
+    """Iterér over alle block-level elementer i dokumentrækkefølge.
+
+    For et Document eller en DocxPackage gives python-docx Paragraph/Table
+    objekter; for et ParsedDocument gives dets Block records. Med en
+    streamende DocxPackage er et objekt kun gyldigt indtil det næste hentes.
+    """
+    if isinstance(doc, ParsedDocument):
+        yield from doc.blocks
+        return
+
     from docx.table import Table
     from docx.text.paragraph import Paragraph
 
-    body = doc.element.body
-    for child in body.iterchildren():
-        if child.tag.endswith('p'):
+    tag_p = qn('w:p')
+    tag_tbl = qn('w:tbl')
+    for child in _body_elements(doc):
+        if child.tag == tag_p:
             yield Paragraph(child, doc)
-        elif child.tag.endswith('tbl'):
+        elif child.tag == tag_tbl:
             yield Table(child, doc)
 
 
+# Kendte mønstre → labels (første mønster i listen der findes i titlen vinder)
+LABEL_PATTERNS = [
+    (r'resum[eé]', 'Resumé'),
+    (r'konklu', 'Konklusion'),
+    (r'indled', 'Indledning'),
+    (r'baggrund', 'Baggrund'),
+    (r'metod', 'Metodik'),
+    (r'resultat', 'Resultater'),
+    (r'analy', 'Analyse'),
+    (r'anbefal', 'Anbefaling'),
+    (r'diskuss', 'Diskussion'),
+    (r'bilag', 'Bilag'),
+    (r'ordliste', 'Ordliste'),
+    (r'roadmap', 'Roadmap'),
+    (r'evaluer', 'Evaluering'),
+    (r'teknisk', 'Teknisk'),
+    (r'forudsæt', 'Forudsætninger'),
+    (r'hovedresultat', 'Hovedresultater'),
+    (r'forretning', 'Forretning'),
+    (r'platform', 'Platform'),
+]
+
+# Alle label-mønstre som én alternation med en navngiven gruppe pr. mønster
+# (l0, l1, ...). Ét search finder den første position hvor et mønster matcher;
+# kun mønstre med højere prioritet end det fundne skal derefter prøves fra den
+# position, så listens rækkefølge bevares.
+LABEL_MATCHER = re.compile(
+    '|'.join(f'(?P<l{i}>{pattern})' for i, (pattern, _) in enumerate(LABEL_PATTERNS)))
+LABEL_REGEXES = [re.compile(pattern) for pattern, _ in LABEL_PATTERNS]
+
+
+def _match_label(text_lower: str) -> str:
+    """Label for første mønster i LABEL_PATTERNS der findes i teksten (eller None)."""
+    match = LABEL_MATCHER.search(text_lower)
+    if match is None:
+        return None
+    best = int(match.lastgroup[1:])
+    for index in range(best):
+        if LABEL_REGEXES[index].search(text_lower, match.start()):
+            return LABEL_PATTERNS[index][1]
+    return LABEL_PATTERNS[best][1]
+
+
 def generate_label(h1_text: str) -> str:
     """Generér en kort label baseret på H1-titlen."""
     text = h1_text.strip()
@@ -406,32 +1283,9 @@ def generate_label(h1_text: str) -> str:
     # Fjern kapitel-nummerering (1., 2., 1.1, etc.)
     text = re.sub(r'^\d+(\.\d+)*\.?\s*', '', text)
 
-    # Kendte mønstre → labels
-    label_patterns = [
-        (r'resum[eé]', 'Resumé'),
-        (r'konklu', 'Konklusion'),
-        (r'indled', 'Indledning'),
-        (r'baggrund', 'Baggrund'),
-        (r'metod', 'Metodik'),
-        (r'resultat', 'Resultater'),
-        (r'analy', 'Analyse'),
-        (r'anbefal', 'Anbefaling'),
-        (r'diskuss', 'Diskussion'),
-        (r'bilag', 'Bilag'),
-        (r'ordliste', 'Ordliste'),
-        (r'roadmap', 'Roadmap'),
-        (r'evaluer', 'Evaluering'),
-        (r'teknisk', 'Teknisk'),
-        (r'forudsæt', 'Forudsætninger'),
-        (r'hovedresultat', 'Hovedresultater'),
-        (r'forretning', 'Forretning'),
-        (r'platform', 'Platform'),
-    ]
-
-    text_lower = text.lower()
-    for pattern, label in label_patterns:
-        if re.search(pattern, text_lower):
-            return label
+    label = _match_label(text.lower())
+    if label:
+        return label
 
     # Fallback: Brug første 2-3 ord (max 25 tegn)
     words = text.split()
@@ -464,8 +1318,14 @@ def format_heading_numbers(text: str) -> str:
 
 def get_style_type(para) -> str:
     """Bestem paragraf-typen."""
-    style_name = para.style.name if para.style else "Normal"
+    if isinstance(para, Block):
+        return para.style_type
+    style_kind = style_table(para.part).kind(para._element.style)
+    return _classify_paragraph(style_kind, para.text, para._element)
+
 
+def _style_name_kind(style_name: str) -> str:
+    """Paragraf-type ud fra ét style-navn alene (None hvis navnet ikke afgør typen)."""
     if 'Heading 1' in style_name:
         return 'h1'
     elif 'Heading 2' in style_name:
@@ -479,9 +1339,16 @@ def get_style_type(para) -> str:
         return 'toc_entry'
     elif 'Source Code' in style_name or style_name == 'Source Code':
         return 'code'
-    elif is_list_item(para):
+    return None
+
+
+def _classify_paragraph(style_kind: str, text: str, p_element) -> str:
+    """Bestem paragraf-typen ud fra style (StyleTable.kind), tekst og paragraf-XML."""
+    if style_kind:
+        return style_kind
+    elif _is_list_item(text, p_element):
         return 'list'
-    elif is_pseudo_heading(para.text):
+    elif is_pseudo_heading(text):
         # Detect paragraphs that look like headings but aren't styled as such
         return 'pseudo_h3'
     else:
@@ -490,18 +1357,33 @@ def get_style_type(para) -> str:
 
 def is_list_item(para) -> bool:
     """Check om paragraf er et list item."""
-    text = para.text.strip()
+    if isinstance(para, Block):
+        return para.style_type == 'list'
+    return _is_list_item(para.text, para._element)
+
+
+def _is_list_item(text: str, p_element) -> bool:
+    """Check om paragraf-tekst/XML er et list item."""
+    text = text.strip()
     if text.startswith(('•', '-', '*', '–', '→')):
         return True
     if re.match(r'^\d+\.?\s', text):
         return True
-    if para._element.pPr is not None:
-        numPr = para._element.pPr.find(qn('w:numPr'))
+    pPr = p_element.find(qn('w:pPr'))
+    if pPr is not None:
+        numPr = pPr.find(qn('w:numPr'))
         if numPr is not None:
             return True
     return False
 
 
+# Start-ord for pseudo-overskrifter (matches mod teksten i lowercase).
+# str.startswith med en tuple er ét C-kald og slår en regex for så få ord.
+QUESTION_STARTERS = ('how', 'what', 'when', 'why', 'where', 'which', 'who',
+                     'hvordan', 'hvad', 'hvornår', 'hvorfor', 'hvor', 'hvilken', 'hvem')
+SECTION_STARTERS = ('summary:', 'opsummering:', 'konklusion:', 'note:', 'bemærk:')
+
+
 def is_pseudo_heading(text: str) -> bool:
     """Detect pseudo-headings - paragraphs that act as section headers but aren't styled as headings.
 
@@ -527,10 +1409,10 @@ def is_pseudo_heading(text: str) -> bool:
     if text.endswith(':') and len(text) < 80:
         return True
 
+    text_lower = text.lower()
+
     # Pattern 2: Question-style heading (starts with question word, ends with ?)
-    question_starters = ('how', 'what', 'when', 'why', 'where', 'which', 'who',
-                         'hvordan', 'hvad', 'hvornår', 'hvorfor', 'hvor', 'hvilken', 'hvem')
-    if text.lower().startswith(question_starters) and text.endswith('?'):
+    if text_lower.startswith(QUESTION_STARTERS) and text.endswith('?'):
         return True
 
     # Pattern 3: Contains em-dash separator (often subtitles) - "Topic – Description:"
@@ -540,14 +1422,13 @@ def is_pseudo_heading(text: str) -> bool:
             return True
 
     # Pattern 4: Summary/section pattern
-    section_patterns = ('summary:', 'opsummering:', 'konklusion:', 'note:', 'bemærk:')
-    if text.lower().startswith(section_patterns):
+    if text_lower.startswith(SECTION_STARTERS):
         return True
 
     return False
 
 
-def is_highlight_box(text: str) -> bool:
+def is_highlight_box(text: str, context: ConversionContext = None) -> bool:
     """Check om tekst skal være i highlight box.
 
     REGEL: Callout skal have substantielt indhold - ikke bare en overskriftslignende linje.
@@ -555,9 +1436,8 @@ def is_highlight_box(text: str) -> bool:
 
     Tjekker TO kilder:
     1. Keyword-matching (starter med "Vigtig:", "Konklusion:", etc.)
-    2. Semantisk identificerede call-outs (fra _semantic_callouts listen)
+    2. Semantisk identificerede call-outs (fra context.semantic_callouts)
     """
-    global _semantic_callouts
     text = text.strip()
 
     # Minimum længde for at være en callout (ikke bare en overskrift)
@@ -566,27 +1446,120 @@ def is_highlight_box(text: str) -> bool:
     if len(text) < MIN_CALLOUT_LENGTH:
         return False
 
-    # Metode 1: Keyword-matching (original logik)
-    for keyword in HIGHLIGHT_KEYWORDS:
-        if text.startswith(keyword):
-            return True
+    # Metode 1: Keyword-matching (HIGHLIGHT_KEYWORDS kompileret til ét prefix-træ)
+    if HIGHLIGHT_MATCHER.match(text):
+        return True
 
-    # Metode 2: Semantisk identificerede call-outs
-    # Matcher hvis de første 50 tegn af teksten findes i listen
-    if _semantic_callouts:
-        text_start = text[:50].lower().strip()
-        for callout in _semantic_callouts:
-            callout_start = callout[:50].lower().strip() if len(callout) >= 50 else callout.lower().strip()
-            # Match hvis tekst starter med callout-snippet eller omvendt
-            if text_start.startswith(callout_start) or callout_start.startswith(text_start):
-                return True
-            # Eller hvis der er et substantielt overlap
-            if len(callout_start) > 20 and callout_start in text.lower():
-                return True
+    # Metode 2: Semantisk identificerede call-outs (opslag i context.callout_index)
+    if context is not None and context.semantic_callouts:
+        return context.callout_index.match(text)
 
     return False
 
 
+# Antal tegn fra starten af paragraf og call-out der sammenlignes
+CALLOUT_PREFIX_LENGTH = 50
+# Et call-out skal være længere end dette for at matche midt i en paragraf
+CALLOUT_MIN_OVERLAP = 20
+
+
+class CalloutIndex:
+    """Indeks over semantiske call-outs, normaliseret én gang pr. konvertering.
+
+    En paragraf matcher et call-out når (alt i lowercase, de første 50 tegn):
+    1. paragrafens start begynder med call-outets start,
+    2. call-outets start begynder med paragrafens start, eller
+    3. call-outets start (over 20 tegn) findes et sted i paragrafen.
+
+    1 og 2 er hash-opslag: starts rummer hver call-out-start, prefixes
+    alle prefixes af dem. 3 er en Aho-Corasick automat, der finder alle
+    call-outs i ét gennemløb af paragraffen. Hver paragraf koster derfor det
+    samme uanset hvor mange call-outs listen har.
+
+    Indekset husker hvilke call-outs der har matchet (se unmatched()).
+    """
+
+    def __init__(self, callouts: list):
+        self.callouts = list(callouts)
+        self.matched = set()  # index i callouts
+
+        self._starts = {}     # call-out-start -> [index]
+        self._prefixes = {}   # prefix af en call-out-start -> [index]
+        overlap = []
+        for i, callout in enumerate(self.callouts):
+            start = callout[:CALLOUT_PREFIX_LENGTH].lower().strip()
+            self._starts.setdefault(start, []).append(i)
+            for length in range(len(start) + 1):
+                self._prefixes.setdefault(start[:length], []).append(i)
+            if len(start) > CALLOUT_MIN_OVERLAP:
+                overlap.append((start, i))
+        self._lengths = sorted({len(start) for start in self._starts})
+        self._build_automaton(overlap)
+
+    def _build_automaton(self, patterns: list):
+        """Byg Aho-Corasick automaten (goto/fail/output tabeller) over patterns."""
+        goto = [{}]
+        output = [[]]
+        for pattern, index in patterns:
+            state = 0
+            for char in pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    goto.append({})
+                    output.append([])
+                    next_state = goto[state][char] = len(goto) - 1
+                state = next_state
+            output[state].append(index)
+
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                output[next_state] = output[next_state] + output[fail[next_state]]
+
+        self._goto = goto
+        self._fail = fail
+        self._output = output
+
+    def _find_overlaps(self, text_lower: str) -> set:
+        """Index for alle call-outs (over 20 tegn) der findes i teksten."""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+        for char in text_lower:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    def match(self, text: str) -> bool:
+        """Check om en (strippet) paragraf matcher et call-out og husk hvilke."""
+        text_start = text[:CALLOUT_PREFIX_LENGTH].lower().strip()
+
+        found = set(self._prefixes.get(text_start, ()))
+        for length in self._lengths:
+            if length > len(text_start):
+                break
+            found.update(self._starts.get(text_start[:length], ()))
+
+        if not found and len(self._goto) > 1:
+            found = self._find_overlaps(text.lower())
+
+        self.matched.update(found)
+        return bool(found)
+
+    def unmatched(self) -> list:
+        """Call-outs der endnu ikke har matchet en paragraf (i listens rækkefølge)."""
+        return [callout for i, callout in enumerate(self.callouts) if i not in self.matched]
+
+
 def is_page_number(text: str) -> bool:
     """Check om tekst er et løst sidetal (skal ignoreres)."""
     text = text.strip()
@@ -636,6 +1609,25 @@ def is_manual_toc_heading(text: str) -> bool:
     return text in toc_headings
 
 
+# Metadata-mønstre (matches fra starten af teksten i lowercase)
+METADATA_PATTERNS = [
+    r'udarbejdet af[:\s]',
+    r'forfatter[:\s]',
+    r'author[:\s]',
+    r'dato[:\s]',
+    r'date[:\s]',
+    r'version[:\s]',
+    r'v\d+\.\d+',
+    r'fortroligt',
+    r'confidential',
+    r'intern',
+    r'internal',
+    r'draft',
+    r'udkast',
+]
+METADATA_MATCHER = re.compile('(?:' + '|'.join(METADATA_PATTERNS) + ')')
+
+
 def is_title_block_metadata(text: str) -> bool:
     """Check om tekst er metadata fra et 'title block' i starten af dokumentet.
 
@@ -647,30 +1639,7 @@ def is_title_block_metadata(text: str) -> bool:
 
     Disse springes over da de typisk bruges på forsiden.
     """
-    text = text.strip().lower()
-
-    # Metadata-mønstre
-    metadata_patterns = [
-        r'^udarbejdet af[:\s]',
-        r'^forfatter[:\s]',
-        r'^author[:\s]',
-        r'^dato[:\s]',
-        r'^date[:\s]',
-        r'^version[:\s]',
-        r'^v\d+\.\d+',
-        r'^fortroligt',
-        r'^confidential',
-        r'^intern',
-        r'^internal',
-        r'^draft',
-        r'^udkast',
-    ]
-
-    for pattern in metadata_patterns:
-        if re.match(pattern, text):
-            return True
-
-    return False
+    return METADATA_MATCHER.match(text.strip().lower()) is not None
 
 
 def clean_word_field_codes(text: str) -> str:
@@ -680,6 +1649,10 @@ def clean_word_field_codes(text: str) -> str:
     skal ikke vises i output - de er interne Word-kommandoer.
 
     Håndterer både normale quotes (") og HTML-escaped quotes (&quot;)
+
+    Bruges ikke længere af konverteren: _extract_runs springer
+    felt-instruktioner over strukturelt (se FieldState). Funktionen er
+    bevaret til tekst der ikke kommer fra et Word-dokument.
     """
     # Quote pattern der matcher både " og &quot;
     q = r'(?:"|&quot;)'
@@ -706,11 +1679,22 @@ def clean_word_field_codes(text: str) -> str:
     return text.strip()
 
 
-def process_paragraph(para) -> str:
-    """Konverter paragraf til HTML."""
-    global _last_was_callout
+# Korte "Etiket: Værdi" linjer (fx "Datakilder: Tabeller") vises som data-label
+DATA_LABEL_PATTERN = re.compile(r'^[A-Za-zÆØÅæøå]+:\s*[A-Za-zÆØÅæøå]+$')
+
 
-    text = para.text.strip()
+def process_paragraph(para, context: ConversionContext = None) -> str:
+    """Konverter paragraf til HTML.
+
+    Accepterer en Block fra parse_document() eller en python-docx Paragraph.
+    context bærer call-out tilstanden mellem paragraffer i en konvertering.
+    """
+    if context is None:
+        context = ConversionContext()
+
+    block = para if isinstance(para, Block) else _paragraph_block(para)
+
+    text = block.text
     if not text:
         return ''
 
@@ -718,43 +1702,39 @@ def process_paragraph(para) -> str:
     if is_page_number(text):
         return ''
 
-    # Fjern Word felt-koder fra rå tekst (til highlight-check etc.)
-    text = clean_word_field_codes(text)
-    if not text:
-        return ''
-
     # Process bold/italic from runs
-    processed_text = process_runs(para)
-
-    # Fjern evt. felt-koder fra processed tekst også
-    processed_text = clean_word_field_codes(processed_text)
+    # (felt-instruktioner er allerede sorteret fra i _extract_runs - se FieldState)
+    processed_text = render_runs(block.runs, block.text).strip()
     if not processed_text:
         return ''
 
-    style_type = get_style_type(para)
+    style_type = block.style_type
+
+    # En overskrift der vises som call-out, beholder sit id - TOC'en linker til den
+    anchor = f' id="{block.anchor}"' if block.anchor else ''
 
     # Highlight box - MEN ALDRIG to i træk!
     # REGEL: Hvis forrige paragraf var en call-out, spring denne over
-    if is_highlight_box(text):
-        if _last_was_callout:
+    if is_highlight_box(text, context):
+        if context.last_was_callout:
             # Skip denne call-out - lav normal paragraf i stedet
-            _last_was_callout = False  # Reset så næste KAN være call-out
-            return f'<p>{processed_text}</p>'
+            context.last_was_callout = False  # Reset så næste KAN være call-out
+            return f'<p{anchor}>{processed_text}</p>'
         else:
             # Lav call-out og marker at vi lige har lavet én
-            _last_was_callout = True
-            return f'<div class="highlight-box"><p>{processed_text}</p></div>'
+            context.last_was_callout = True
+            return f'<div class="highlight-box"{anchor}><p>{processed_text}</p></div>'
 
     # Alle andre element-typer resetter call-out flaget
     # (så Callout → Normal → Callout er tilladt)
-    _last_was_callout = False
+    context.last_was_callout = False
 
     # TOC (Indholdsfortegnelse) - INGEN thin space, INGEN label, INGEN divider
     if style_type == 'toc_heading':
         return f'<h2 class="toc-heading">Indholdsfortegnelse</h2>'
     elif style_type == 'toc_entry':
         # Bestem TOC niveau fra style name
-        style_name = para.style.name if para.style else ""
+        style_name = block.style_name
         toc_level = 1
         if '2' in style_name:
             toc_level = 2
@@ -768,15 +1748,10 @@ def process_paragraph(para) -> str:
         return f'<p class="toc-entry toc-level-{toc_level}">{clean_text.strip()}</p>'
 
     # Headings - tilføj tyndt mellemrum i nummererede overskrifter (H1, H2, H3)
-    elif style_type == 'h1':
-        formatted = format_heading_numbers(processed_text)
-        return f'<h1>{formatted}</h1>'
-    elif style_type == 'h2':
+    # id'et er TOC-linjernes link-mål (se _assign_heading_id)
+    elif style_type in HEADING_TYPES:
         formatted = format_heading_numbers(processed_text)
-        return f'<h2>{formatted}</h2>'
-    elif style_type == 'h3':
-        formatted = format_heading_numbers(processed_text)
-        return f'<h3>{formatted}</h3>'
+        return f'<{style_type}{anchor}>{formatted}</{style_type}>'
 
     # Pseudo-headings - paragraphs that look like headings but aren't styled as such
     # Rendered as H3 with a special class for styling
@@ -803,7 +1778,7 @@ def process_paragraph(para) -> str:
     # Normal paragraph - check for long text with markdown headers
     else:
         # Check for data label (fx "Datakilder: Tabeller")
-        if re.match(r'^[A-Za-zÆØÅæøå]+:\s*[A-Za-zÆØÅæøå]+$', text.strip()):
+        if DATA_LABEL_PATTERN.match(text.strip()):
             return f'<p class="data-label">{processed_text}</p>'
 
         # Detect markdown-style headers and multiple paragraphs
@@ -911,205 +1886,1242 @@ def format_instruction_set(text: str) -> str:
 
 def process_runs(para) -> str:
     """Process runs for bold/italic formatting AND hyperlinks."""
-    from docx.oxml.ns import qn as oxml_qn
+    if isinstance(para, Block):
+        return render_runs(para.runs, para.text)
+    return render_runs(_extract_runs(para._element, para.part), para.text)
+
+
+TAG_FLDCHAR = qn('w:fldChar')
+TAG_FLDCHAR_TYPE = qn('w:fldCharType')
+TAG_INSTRTEXT = qn('w:instrText')
+TAG_FLDSIMPLE = qn('w:fldSimple')
+
+
+class FieldState:
+    """Hvor i Words felt-struktur (w:fldChar) vi er, på tværs af runs og paragraffer.
 
+    Et felt er begin → instruktion (w:instrText) → separate → resultat → end.
+    Instruktionen ("TOC \\o", "HYPERLINK ...", "INCLUDEPICTURE ...") skal
+    aldrig vises; resultatet er den tekst Word selv viser. Felter kan nestes
+    (f.eks. et IF-felt med et MERGEFIELD i instruktionen), så tilstanden er en
+    stak: tekst er kun synlig når intet åbent felt er i sin instruktionsdel.
+
+    Et felts resultat kan strække sig over mange paragraffer (TOC), men
+    instruktionen står i én paragraf. Er et felt stadig i sin instruktionsdel
+    når paragraffen slutter (begin uden separate/end - beskadigede eller
+    håndredigerede dokumenter), lukker end_paragraph() det, så resten af
+    dokumentet ikke skjules. Samme regel gælder for paragraffer i tabelceller.
+    """
+
+    def __init__(self):
+        self._stack = []  # True = feltet er i resultat-delen
+
+    def update(self, fld_char):
+        """Opdatér tilstanden ud fra et w:fldChar element."""
+        kind = fld_char.get(TAG_FLDCHAR_TYPE)
+        if kind == 'begin':
+            self._stack.append(False)
+        elif kind == 'separate':
+            if self._stack:
+                self._stack[-1] = True
+        elif kind == 'end':
+            if self._stack:
+                self._stack.pop()
+
+    def end_paragraph(self):
+        """Luk felter der stadig er i instruktionsdelen (og felter nestet i dem)."""
+        if not self.visible:
+            del self._stack[self._stack.index(False):]
+
+    @property
+    def visible(self) -> bool:
+        return all(self._stack)
+
+
+# Tags i run-XML'en, slået op med eksakt Clark-notation ({namespace}navn)
+TAG_R = qn('w:r')
+TAG_T = qn('w:t')
+TAG_BR = qn('w:br')
+TAG_BR_TYPE = qn('w:type')
+TAG_RPR = qn('w:rPr')
+TAG_B = qn('w:b')
+TAG_I = qn('w:i')
+TAG_VAL = qn('w:val')
+TAG_HYPERLINK = qn('w:hyperlink')
+TAG_R_ID = qn('r:id')
+
+# Run-elementer der svarer til ét tegn (som i python-docx' Run.text)
+RUN_CHAR_TAGS = {
+    qn('w:tab'): '\t',
+    qn('w:ptab'): '\t',
+    qn('w:cr'): '\n',
+    qn('w:noBreakHyphen'): '-',
+}
+
+# Paragraf-børn hvis indhold er almindelige runs (ændringssporing, content
+# controls, smart tags). w:fldSimple har instruktionen som attribut, så
+# børnene er feltets resultat. w:del og w:sdtPr er ikke med - de vises ikke.
+RUN_CONTAINER_TAGS = {
+    qn('w:ins'), qn('w:smartTag'), qn('w:customXml'), qn('w:sdt'), qn('w:sdtContent'),
+    TAG_FLDSIMPLE,
+}
+
+# w:val værdier der slår en toggle-egenskab (w:b, w:i) fra
+OFF_VALUES = ('0', 'false', 'off')
+
+# Hyperlink-mål pr. part (rId → URL), bygget én gang pr. dokument
+_HYPERLINK_TARGETS = weakref.WeakKeyDictionary()
+
+
+def _hyperlink_targets(part) -> dict:
+    """rId → mål for alle relationer i en part (slås op én gang pr. part)."""
+    if part is None:
+        return {}
+    targets = _HYPERLINK_TARGETS.get(part)
+    if targets is None:
+        targets = _HYPERLINK_TARGETS[part] = {
+            r_id: rel.target_ref for r_id, rel in part.rels.items()
+        }
+    return targets
+
+
+def _extract_runs(p_element, part, fields: FieldState = None) -> list:
+    """Udtræk (tekst, fed, kursiv, href) spans fra en paragrafs XML.
+
+    Elementerne genkendes på eksakte tags. Felt-instruktioner springes over,
+    felt-resultater beholdes. fields bærer felt-tilstanden videre mellem
+    paragraffer (default: ny tilstand); felter der ikke er nået forbi
+    instruktionen ved paragrafslut, lukkes (se FieldState). Naboruns med samme formatering slås
+    sammen til ét span, så Words opsplitning i mange runs ikke giver
+    <strong>a</strong><strong>b</strong>.
+    """
+    if fields is None:
+        fields = FieldState()
+    spans = []
+    _collect_spans(p_element, _hyperlink_targets(part), fields, spans)
+    fields.end_paragraph()
+    return _coalesce_spans(spans)
+
+
+def _collect_spans(parent, targets: dict, fields: FieldState, spans: list):
+    """Tilføj spans for parent's børn (rekursivt gennem container-elementer)."""
+    for child in parent:
+        tag = child.tag
+        if tag == TAG_R:
+            text, is_bold, is_italic = _run_text(child, fields)
+            if text:
+                spans.append((text, is_bold, is_italic, None))
+
+        elif tag == TAG_HYPERLINK:
+            # Links vises uden fed/kursiv - hele link-teksten bliver ét span
+            link_spans = []
+            _collect_spans(child, targets, fields, link_spans)
+            link_text = ''.join(span[0] for span in link_spans)
+            if link_text:
+                spans.append((link_text, False, False, targets.get(child.get(TAG_R_ID)) or None))
+
+        elif tag in RUN_CONTAINER_TAGS:
+            _collect_spans(child, targets, fields, spans)
+
+
+def _run_text(run, fields: FieldState) -> tuple:
+    """(tekst, fed, kursiv) for ét w:r element."""
+    parts = []
+    is_bold = False
+    is_italic = False
+    visible = fields.visible
+
+    for elem in run:
+        tag = elem.tag
+        if tag == TAG_T:
+            if visible and elem.text:
+                parts.append(elem.text)
+        elif tag == TAG_RPR:
+            for prop in elem:
+                prop_tag = prop.tag
+                if prop_tag == TAG_B:
+                    is_bold = prop.get(TAG_VAL) not in OFF_VALUES
+                elif prop_tag == TAG_I:
+                    is_italic = prop.get(TAG_VAL) not in OFF_VALUES
+        elif tag == TAG_FLDCHAR:
+            fields.update(elem)
+            visible = fields.visible
+        elif not visible:
+            continue
+        elif tag in RUN_CHAR_TAGS:
+            parts.append(RUN_CHAR_TAGS[tag])
+        elif tag == TAG_BR and elem.get(TAG_BR_TYPE) in (None, 'textWrapping'):
+            # Linjeskift - side- og kolonneskift giver ingen tekst
+            parts.append('\n')
+
+    return ''.join(parts), is_bold, is_italic
+
+
+def _coalesce_spans(spans: list) -> list:
+    """Slå naboer med samme formatering sammen (links forbliver separate)."""
+    coalesced = []
+    texts = []
+    current = None
+    for text, is_bold, is_italic, url in spans:
+        if url is None and current == (is_bold, is_italic):
+            texts.append(text)
+            continue
+        if current is not None:
+            coalesced.append((''.join(texts), current[0], current[1], None))
+            current = None
+        if url is None:
+            texts = [text]
+            current = (is_bold, is_italic)
+        else:
+            coalesced.append((text, is_bold, is_italic, url))
+    if current is not None:
+        coalesced.append((''.join(texts), current[0], current[1], None))
+    return coalesced
+
+
+def render_runs(spans, fallback_text: str = '') -> str:
+    """Render run-spans fra en Block til HTML (fed, kursiv og links)."""
     result = []
 
-    # Iterate through all child elements in the paragraph XML
-    for child in para._element:
-        # Handle hyperlinks
-        if child.tag.endswith('hyperlink'):
-            # Get the relationship ID for the URL
-            r_id = child.get(oxml_qn('r:id'))
-            url = None
-            if r_id:
-                try:
-                    rel = para.part.rels[r_id]
-                    url = rel.target_ref if hasattr(rel, 'target_ref') else str(rel._target)
-                except:
-                    pass
-
-            # Get the text content of the hyperlink
-            link_text_parts = []
-            for r in child.iter():
-                if r.tag.endswith('}t'):  # Text element
-                    if r.text:
-                        link_text_parts.append(r.text)
-
-            link_text = ''.join(link_text_parts)
-
-            if url and link_text:
-                escaped_text = html_lib.escape(link_text)
-                escaped_url = html_lib.escape(url)
-                result.append(f'<a href="{escaped_url}" class="link">{escaped_text}</a>')
-            elif link_text:
-                result.append(html_lib.escape(link_text))
-
-        # Handle regular runs
-        elif child.tag.endswith('r'):
-            text_parts = []
-            is_bold = False
-            is_italic = False
-
-            for elem in child:
-                if elem.tag.endswith('rPr'):  # Run properties
-                    for prop in elem:
-                        if prop.tag.endswith('b'):
-                            is_bold = True
-                        if prop.tag.endswith('i'):
-                            is_italic = True
-                elif elem.tag.endswith('t'):  # Text
-                    if elem.text:
-                        text_parts.append(elem.text)
-
-            text = html_lib.escape(''.join(text_parts))
-
-            if is_bold:
-                text = f'<strong>{text}</strong>'
-            if is_italic:
-                text = f'<em>{text}</em>'
-
-            result.append(text)
+    for text, is_bold, is_italic, url in spans:
+        if url:
+            escaped_text = html_lib.escape(text)
+            escaped_url = html_lib.escape(url)
+            result.append(f'<a href="{escaped_url}" class="link">{escaped_text}</a>')
+            continue
+
+        text = html_lib.escape(text)
+
+        if is_bold:
+            text = f'<strong>{text}</strong>'
+        if is_italic:
+            text = f'<em>{text}</em>'
+
+        result.append(text)
 
     # Fallback: if no result, use simple text extraction
     if not result:
-        return html_lib.escape(para.text)
+        return html_lib.escape(fallback_text)
 
     return ''.join(result)
 
 
 def process_table(table) -> str:
-    """Konverter tabel til HTML."""
-    html_parts = ['<table>']
+    """Konverter tabel til HTML.
 
-    for row_idx, row in enumerate(table.rows):
-        html_parts.append('<tr>')
-        for cell in row.cells:
-            tag = 'th' if row_idx == 0 else 'td'
-            cell_text = ' '.join(p.text for p in cell.paragraphs)
-            html_parts.append(f'<{tag}>{html_lib.escape(cell_text)}</{tag}>')
+    Accepterer en tabel-Block fra parse_document() eller en python-docx Table.
+    Hovedrækkerne kommer i <thead> med <th>, resten i <tbody>. Rækker der
+    fortsætter en lodret fletning markeres med data-merged, så sideskift-
+    scriptet ikke splitter tabellen midt i en flettet celle.
+    """
+    block = table if isinstance(table, Block) else _table_block(table)
+    html_parts = ['<table>']
+    # Rækker der dækkes af en rowspan fra en tidligere række
+    merged_rows = set()
+
+    for row_idx, row in enumerate(block.rows):
+        if row_idx == 0 and block.header_rows:
+            html_parts.append('<thead>')
+        elif row_idx == block.header_rows:
+            html_parts.append('<tbody>')
+
+        html_parts.append('<tr data-merged>' if row_idx in merged_rows else '<tr>')
+        tag = 'th' if row_idx < block.header_rows else 'td'
+        for cell in row:
+            spans = ''
+            if cell.colspan > 1:
+                spans += f' colspan="{cell.colspan}"'
+            if cell.rowspan > 1:
+                spans += f' rowspan="{cell.rowspan}"'
+                merged_rows.update(range(row_idx + 1, row_idx + cell.rowspan))
+            cell_text = ' '.join(cell.paragraphs)
+            html_parts.append(f'<{tag}{spans}>{html_lib.escape(cell_text)}</{tag}>')
         html_parts.append('</tr>')
 
+        if row_idx == block.header_rows - 1:
+            html_parts.append('</thead>')
+
+    if len(block.rows) > block.header_rows:
+        html_parts.append('</tbody>')
     html_parts.append('</table>')
     return '\n'.join(html_parts)
 
 
-def extract_images(doc: Document) -> dict:
-    """Ekstraher alle billeder fra Word-dokument som base64."""
-    images = {}
+def extract_images(doc, optimizer: ImageOptimizer = None, asset_dir: str = None,
+                   asset_url: str = ASSET_URL) -> "ImageStore":
+    """Ekstraher alle billeder fra Word-dokument som base64.
+
+    Returnerer et ImageStore, der opfører sig som en dict
+    (rel_id → {'data': data-URI, 'type': 'png'}), men først base64-encoder
+    et billede når det slås op. Med en optimizer nedskaleres og re-encodes
+    billederne først (se image_optimizer). Med asset_dir skriver
+    ImageStore.image_html() billederne som filer i stedet for data-URI'er.
+
+    Billederne læses fra pakken, når de slås op. Er doc en sti eller et
+    file-like objekt, ejer ImageStore'et pakken: luk den med close() eller
+    brug ImageStore'et i en with-blok.
+    """
+    parsed = _as_parsed(doc)
+    owned = parsed if parsed is not doc else None
+    try:
+        return ImageStore(parsed.doc, optimizer, asset_dir, asset_url, owned)
+    except BaseException:
+        if owned is not None:
+            owned.close()
+        raise
+
+
+def _image_type(content_type: str) -> str:
+    """Bestem billedtype til data-URI ud fra part'ens content type."""
+    if 'png' in content_type:
+        return 'png'
+    elif 'jpeg' in content_type or 'jpg' in content_type:
+        return 'jpeg'
+    elif 'gif' in content_type:
+        return 'gif'
+    elif 'webp' in content_type:
+        return 'webp'
+    return 'png'  # default
+
+
+def _image_extents(elements) -> dict:
+    """Største viste størrelse (cx, cy i EMU) pr. billed-relation i body'ens elementer."""
+    extents = {}
+    drawing_tags = (qn('wp:inline'), qn('wp:anchor'))
+    for element in elements:
+        for drawing in element.iter(drawing_tags):
+            extent = drawing.find(qn('wp:extent'))
+            if extent is None:
+                continue
+            size = (int(extent.get('cx', 0)), int(extent.get('cy', 0)))
+            for blip in drawing.iter(qn('a:blip')):
+                embed_id = blip.get(qn('r:embed'))
+                if embed_id and size[0] > extents.get(embed_id, (0, 0))[0]:
+                    extents[embed_id] = size
+    return extents
+
+
+class ImageStore(Mapping):
+    """Billeder fra ét Word-dokument, base64-encodet først når de bruges.
+
+    Som mapping (rel_id → {'data', 'type'}) virker det som den tidligere dict
+    fra extract_images(). Konverteren bruger image_html(), der deduplikerer på
+    indholds-hash på tværs af relationship-ID'er: et billede der bruges mere end
+    én gang, indlejres én gang i en CSS-regel i headeren (se shared_css), og
+    hver forekomst er et <img> med billedets klasse - uden JavaScript. Billeder
+    der aldrig refereres, encodes aldrig.
+
+    Med en ImageOptimizer skaleres hvert unikt billede til sin viste
+    størrelse (wp:extent) og re-encodes, før det indlejres.
+
+    Med asset_dir indlejres billederne ikke: hvert unikt billede skrives én
+    gang som <indholds-hash>.<ext> i asset_dir og refereres med en relativ
+    URL. Filnavnet afhænger kun af indholdet, så rapporter der eksporteres
+    til samme mappe deler billedfilerne.
+
+    Et ImageStore tilhører én konvertering (se ConversionContext.images).
+    owned er et ParsedDocument som extract_images() har åbnet - close()
+    lukker det; ellers er close() en no-op.
+    """
 
-    # Hent alle image relationships
-    for rel_id, rel in doc.part.rels.items():
-        if "image" in rel.reltype:
+    def __init__(self, doc, optimizer: ImageOptimizer = None, asset_dir: str = None,
+                 asset_url: str = ASSET_URL, owned: ParsedDocument = None):
+        self._owned = owned
+        # Kun interne image-relationer - eksterne links har ingen part at læse
+        self._rels = {
+            rel_id: rel for rel_id, rel in doc.part.rels.items()
+            if "image" in rel.reltype and not rel.is_external
+        }
+        self._optimizer = optimizer
+        self._asset_dir = asset_dir
+        self._asset_url = asset_url
+        self._assets = {}     # indholds-hash -> img-attributter (relativ src + størrelse)
+        self._extents = _image_extents(_body_elements(doc)) if optimizer else {}
+        self._cache = {}      # rel_id -> {'data', 'type'} (kun mapping-adgang)
+        self._digests = {}    # rel_id -> indholds-hash
+        self._optimized = {}  # indholds-hash -> (blob, billedtype) efter optimering
+        self._embedded = {}   # indholds-hash -> længde af indlejret data-URI
+        self._shared = {}     # indholds-hash -> (reference-HTML, længde af HTML med data-URI)
+        self.references = 0
+        self.bytes_saved = 0
+        self.bytes_original = 0
+        self.bytes_optimized = 0
+        self.assets_written = 0
+        self.asset_files = []  # filnavne i asset_dir som HTML'en refererer
+        self.bytes_external = 0
+        self.sizes = {}        # indholds-hash -> pixelstørrelse af det viste billede (pagination)
+
+    def close(self):
+        """Luk pakken, hvis extract_images() åbnede den."""
+        if self._owned is not None:
+            self._owned.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getitem__(self, rel_id):
+        if rel_id not in self._cache:
+            loaded = self._load(rel_id) if rel_id in self._rels else None
+            if loaded is None:
+                raise KeyError(rel_id)
+            blob, img_type = self._prepare(rel_id, *loaded)
+            self._cache[rel_id] = {'data': _data_uri(blob, img_type), 'type': img_type}
+        return self._cache[rel_id]
+
+    def __contains__(self, rel_id):
+        return rel_id in self._rels
+
+    def __iter__(self):
+        return iter(self._rels)
+
+    def __len__(self):
+        return len(self._rels)
+
+    def _load(self, rel_id):
+        """Returnér (blob, billedtype) for en relation, eller None ved fejl."""
+        rel = self._rels[rel_id]
+        try:
+            return rel.target_part.blob, _image_type(rel.target_part.content_type)
+        except Exception as e:
+            print(f"Kunne ikke ekstrahere billede {rel_id}: {e}")
+            return None
+
+    def _digest(self, rel_id: str, blob: bytes) -> str:
+        """Indholds-hash for en relation (beregnes én gang pr. rel_id)."""
+        digest = self._digests.get(rel_id)
+        if digest is None:
+            digest = hashlib.sha256(blob).hexdigest()[:16]
+            self._digests[rel_id] = digest
+        return digest
+
+    def _prepare(self, rel_id: str, blob: bytes, img_type: str):
+        """Returnér (blob, billedtype) klar til indlejring - optimeret hvis slået til."""
+        if self._optimizer is None:
+            return blob, img_type
+
+        digest = self._digest(rel_id, blob)
+        if digest not in self._optimized:
+            optimized = self._optimizer.optimize(blob, self._extents.get(rel_id))
+            self._optimized[digest] = optimized or (blob, img_type)
+            self.bytes_original += len(blob)
+            self.bytes_optimized += len(self._optimized[digest][0])
+        return self._optimized[digest]
+
+    def shared_css(self, blocks) -> str:
+        """CSS-regler med data-URI'en for billeder der bruges i flere paragraffer.
+
+        Kaldes før første image_html() (headeren skrives før body'en): hver
+        forekomst af et delt billede bliver et <img> med klassen img-<hash>,
+        en lille SVG i billedets størrelse som src og selve billedet som
+        baggrund fra reglen. Outputtet er gyldig HTML og vises også uden
+        JavaScript (PDF-værktøjer, mailklienter, arkiverede kopier). Billeder
+        med ukendt størrelse indlejres i stedet ved hver brug.
+        """
+        if self._asset_dir is not None:
+            return ''
+
+        # Paragraffer hvor relationen er det første billede (som _block_image_html)
+        uses = {}
+        for block in blocks:
+            if block.kind != BLOCK_PARAGRAPH:
+                continue
+            rel_id = next((rel_id for rel_id in block.image_ids if rel_id in self._rels), None)
+            if rel_id is not None:
+                uses[rel_id] = uses.get(rel_id, 0) + 1
+
+        # Samme indhold kan ligge bag flere relationer - tæl pr. indholds-hash
+        counts = {}
+        first_rel = {}
+        for rel_id, count in uses.items():
             try:
-                image_data = rel.target_part.blob
-                # Bestem billedtype
-                content_type = rel.target_part.content_type
-                if 'png' in content_type:
-                    img_type = 'png'
-                elif 'jpeg' in content_type or 'jpg' in content_type:
-                    img_type = 'jpeg'
-                elif 'gif' in content_type:
-                    img_type = 'gif'
-                else:
-                    img_type = 'png'  # default
+                digest = self._digest(rel_id, self._rels[rel_id].target_part.blob)
+            except Exception:
+                continue  # image_html() rapporterer fejlen når billedet bruges
+            counts[digest] = counts.get(digest, 0) + count
+            first_rel.setdefault(digest, rel_id)
+
+        rules = []
+        for digest, count in counts.items():
+            if count < 2:
+                continue
+            loaded = self._load(first_rel[digest])
+            if loaded is None:
+                continue
+            prepared = self._prepare(first_rel[digest], *loaded)
+            size = image_size(prepared[0])
+            if not size:
+                continue
+            data_uri = _data_uri(*prepared)
+            rule = (f'    img.img-{digest} {{ background: url({data_uri}) center / 100% 100% no-repeat; '
+                    f'-webkit-print-color-adjust: exact; print-color-adjust: exact; }}')
+            ref_html = (f'<div class="image-container"><img class="img-{digest}" '
+                        f'src="{_placeholder_uri(*size)}" alt="Billede" width="{size[0]}" '
+                        f'height="{size[1]}" data-img="{digest}"></div>')
+            inline_html = _inline_image_html(data_uri, digest)
+            self._shared[digest] = (ref_html, len(inline_html))
+            self._embedded[digest] = len(data_uri)
+            self.sizes[digest] = size
+            self.bytes_saved -= len(rule) + 1
+            rules.append(rule)
+        return '\n'.join(rules)
+
+    def image_html(self, rel_id: str) -> str:
+        """HTML for et billede. Delte billeder (se shared_css) refereres, resten indlejres."""
+        digest = self._digests.get(rel_id)
+        if digest is not None and (digest in self._shared or digest in self._assets):
+            # Står i headerens CSS eller i asset_dir - billedet skal ikke læses fra pakken igen
+            blob = img_type = None
+        else:
+            loaded = self._load(rel_id)
+            if loaded is None:
+                return None
+            blob, img_type = loaded
+            digest = self._digest(rel_id, blob)
+
+        self.references += 1
+        if self._asset_dir is not None:
+            return f'<div class="image-container"><img {self._asset(rel_id, digest, blob, img_type)} alt="Billede"></div>'
+
+        shared = self._shared.get(digest)
+        if shared is not None:
+            # Sparet: HTML'en med hele data-URI'en minus referencens faktiske længde
+            ref_html, inline_length = shared
+            self.bytes_saved += inline_length - len(ref_html)
+            return ref_html
+
+        prepared = self._prepare(rel_id, blob, img_type)
+        data_uri = _data_uri(*prepared)
+        self._embedded[digest] = len(data_uri)
+        size = image_size(prepared[0])
+        if size:
+            self.sizes[digest] = size
+        return _inline_image_html(data_uri, digest)
+
+    def _asset(self, rel_id: str, digest: str, blob: bytes, img_type: str) -> str:
+        """Skriv billedet til asset_dir (hvis det ikke findes) og returnér img-attributter.
+
+        width/height sættes, så browseren reserverer pladsen før filen er
+        hentet - pagineringen måler siderne, når DOM'en og fontene er indlæst.
+        """
+        if digest not in self._assets:
+            blob, img_type = self._prepare(rel_id, blob, img_type)
+            extension = 'jpg' if img_type == 'jpeg' else img_type
+            filename = f'{hashlib.sha256(blob).hexdigest()[:16]}.{extension}'
+            if _write_asset(os.path.join(self._asset_dir, filename), blob):
+                self.assets_written += 1
+            self.asset_files.append(filename)
+            self.bytes_external += len(blob)
+            attributes = f'src="{html_lib.escape(self._asset_url + filename)}"'
+            size = image_size(blob)
+            if size:
+                attributes += f' width="{size[0]}" height="{size[1]}"'
+                self.sizes[digest] = size
+            self._assets[digest] = attributes
+        return self._assets[digest]
+
+    def stats(self) -> dict:
+        """Statistik over billeder i denne konvertering."""
+        return {
+            "images": len(self._rels),
+            "unique_embedded": len(self._embedded),
+            "unique_external": len(self._assets),
+            "assets_written": self.assets_written,
+            "bytes_external": self.bytes_external,
+            "references": self.references,
+            "unused": len(self._rels) - len(self._digests),
+            "bytes_embedded": sum(self._embedded.values()),
+            "bytes_saved": self.bytes_saved,
+            "optimized": self._optimizer is not None,
+            "bytes_original": self.bytes_original,
+            "bytes_optimized": self.bytes_optimized,
+        }
+
+
+def _write_asset(path: str, blob: bytes) -> bool:
+    """Skriv en billedfil atomisk. Returnerer False hvis filen allerede fandtes.
+
+    Filnavnet er indholdets hash, så en eksisterende fil har samme indhold -
+    også når flere processer eksporterer til samme mappe samtidig.
+    """
+    if os.path.exists(path):
+        return False
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    return True
+
+
+def _data_uri(blob: bytes, img_type: str) -> str:
+    """Base64 data-URI for et billede."""
+    b64_data = base64.b64encode(blob).decode('ascii')
+    return f'data:image/{img_type};base64,{b64_data}'
 
-                # Konverter til base64
-                b64_data = base64.b64encode(image_data).decode('utf-8')
-                images[rel_id] = {
-                    'data': f'data:image/{img_type};base64,{b64_data}',
-                    'type': img_type
-                }
-            except Exception as e:
-                print(f"Kunne ikke ekstrahere billede {rel_id}: {e}")
 
-    return images
+def _inline_image_html(data_uri: str, digest: str) -> str:
+    """Image-container med billedet indlejret direkte i src."""
+    return f'<div class="image-container"><img src="{data_uri}" alt="Billede" data-img="{digest}"></div>'
+
+
+def _placeholder_uri(width: int, height: int) -> str:
+    """Tom SVG i billedets størrelse - src for et delt billede, så højde/bredde-forholdet
+    følger billedet (max-width: 100%; height: auto)."""
+    return (f'data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 '
+            f'width=%22{width}%22 height=%22{height}%22/%3E')
 
 
 def get_paragraph_image(para, images: dict) -> str:
     """Check om paragraf indeholder et billede og returner HTML."""
-    # Check for drawing elements (nyere Word format)
-    drawings = para._element.findall('.//' + qn('a:blip'),
-        namespaces={'a': 'http://schemas.openxmlformats.org/drawingml/2006/main'})
+    if isinstance(para, Block):
+        return _block_image_html(para, images)
 
-    for drawing in drawings:
-        embed_id = drawing.get(qn('r:embed'))
-        if embed_id and embed_id in images:
+    # Check for drawing elements (a:blip dækker både nyere og inline shapes)
+    for embed_id in _extract_image_ids(para._element):
+        if embed_id in images:
             return f'<div class="image-container"><img src="{images[embed_id]["data"]}" alt="Billede"></div>'
 
-    # Check for inline shapes (ældre format)
-    blips = para._element.findall('.//' + qn('a:blip'),
-        namespaces={'a': 'http://schemas.openxmlformats.org/drawingml/2006/main'})
+    return None
 
-    for blip in blips:
-        embed_id = blip.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed')
-        if embed_id and embed_id in images:
-            return f'<div class="image-container"><img src="{images[embed_id]["data"]}" alt="Billede"></div>'
 
+def _block_image_html(block: Block, images) -> str:
+    """Returnér HTML for første billede i en paragraf-Block (eller None)."""
+    for embed_id in block.image_ids:
+        if embed_id not in images:
+            continue
+        if isinstance(images, ImageStore):
+            image_html = images.image_html(embed_id)
+            if image_html:
+                return image_html
+        else:
+            return f'<div class="image-container"><img src="{images[embed_id]["data"]}" alt="Billede"></div>'
     return None
 
 
-def get_html_header(title: str) -> str:
-    """HTML header med Backstage CSS og A4 sideopdeling."""
-    return f'''<!DOCTYPE html>
-<html lang="da">
-<head>
-  <meta charset="UTF-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1.0">
-  <title>{html_lib.escape(title)}</title>
-  <style>
-    /* FH Lecturis - Backstage custom font */
-    @font-face {{
-      font-family: 'FH Lecturis';
-      src: url('../Fonts/FHLecturis_BSCustom_Regular.otf') format('opentype');
-      font-weight: 400;
-      font-style: normal;
-    }}
+PAGINATION_SCRIPT = '''    // Auto-pagination: splits content across pages when it overflows.
+    // Alle målinger læses samlet før DOM'en ændres (én reflow pr. fase), siderne
+    // holdes i et array, og efterjusteringen besøger kun sider der er ændret.
+    document.addEventListener('DOMContentLoaded', function() {
+      const startTime = performance.now();
+      const timings = {};
+      let phaseStart = startTime;
+      function endPhase(name) {
+        const now = performance.now();
+        timings[name] = now - phaseStart;
+        phaseStart = now;
+      }
+
+      // Mål først når fontene er indlæst - ellers måles teksten med fallback-fonten.
+      // offsetHeight tvinger et layout, så browseren har startet indlæsningen af de
+      // fonte siden bruger, før document.fonts.ready aflæses.
+      document.body.offsetHeight;
+      (document.fonts ? document.fonts.ready : Promise.resolve()).then(paginate);
+
+      function paginate() {
+        endPhase('fonts');
+
+        // Indholdssider (forside og bagside røres ikke)
+        const sections = Array.from(document.querySelectorAll('.page:not(.cover-page):not(.back-page)'));
+        if (sections.length === 0) return;
+
+        // Max content height in pixels (235mm for safety margin above footer)
+        const mmToPx = 3.7795275591; // 1mm = 3.78px at 96dpi
+        const maxContentHeight = 235 * mmToPx;
+
+        const SPLIT_RESERVE = 50;          // Plads til padding/margin ved split
+        const MIN_SPLIT_SPACE = 100;       // Split kun hvis der er mindst 100px tilbage
+        const MIN_ROWS_WITH_HEADER = 2;    // Tabelhovedet skal have mindst 2 body-rækker med sig
+        const MIN_CODE_LINES = 3;
+        const CONTINUED_MARKER = 20;       // "(fortsat)"-markøren på fortsatte dele
+        const MIN_CONTENT_AFTER_HEADING = 80;
+        const MIN_SPACE_FOR_ORPHAN = 100;
 
-    @font-face {{
-      font-family: 'FH Lecturis';
-      src: url('../Fonts/FHLecturis_BSCustom_Bold.otf') format('opentype');
-      font-weight: 700;
-      font-style: normal;
-    }}
+        const footerSource = sections[0].querySelector('.page-footer');
+        const footerTemplate = footerSource ? footerSource.cloneNode(true) : null;
+
+        // Alle indholdssider i dokumentrækkefølge - opdateres når der oprettes sider
+        const pages = [];
+
+        // Helper: Create a new page with content wrapper and footer
+        function createNewPage() {
+          const newPage = document.createElement('div');
+          newPage.className = 'page';
+
+          const newContent = document.createElement('div');
+          newContent.className = 'page-content';
+          newPage.appendChild(newContent);
+
+          if (footerTemplate) {
+            newPage.appendChild(footerTemplate.cloneNode(true));
+          }
+          return newPage;
+        }
+
+        function createCodeBlock(text) {
+          const block = document.createElement('div');
+          block.className = 'code-block code-block-continued';
+          const pre = document.createElement('pre');
+          const code = document.createElement('code');
+          code.textContent = text;
+          pre.appendChild(code);
+          block.appendChild(pre);
+          return block;
+        }
+
+        // Helper: Check if element is a heading that should stay with next content
+        function isHeadingElement(element) {
+          if (!element || !element.tagName) return false;
+          const tagName = element.tagName.toUpperCase();
+          if (['H1', 'H2', 'H3', 'H4'].includes(tagName)) return true;
+          if (element.classList) {
+            if (element.classList.contains('label')) return true;
+            if (element.classList.contains('data-label')) return true;
+            // Instruction section headers should also stay with content
+            if (element.classList.contains('instruction-section') &&
+                element.querySelector('.instruction-header') &&
+                !element.querySelector('code')) return true;
+          }
+          // Korte paragraffer der ender med ":" er subheadings
+          // F.eks. "Data- og tekniske forudsætninger:"
+          if (tagName === 'P') {
+            const text = element.textContent.trim();
+            if (text.endsWith(':') && text.length < 80) return true;
+          }
+          return false;
+        }
+
+        function sum(values, from, to) {
+          let total = 0;
+          for (let i = from; i < to; i++) total += values[i];
+          return total;
+        }
+
+        // === FASE 1: Måling - kun læsninger, så browseren laver ét layout ===
+        function measureItem(el) {
+          if (el.classList.contains('page-break')) return { el: el, pageBreak: true };
+
+          const rect = el.getBoundingClientRect();
+          const style = window.getComputedStyle(el);
+          const margins = (parseFloat(style.marginTop) || 0) + (parseFloat(style.marginBottom) || 0);
+          const item = { el: el, height: rect.height + margins, heading: isHeadingElement(el), kind: null, count: 0 };
+
+          // Splitbare elementer: højden af hver del (række, kodelinje, paragraf) og resten ("chrome")
+          if (el.tagName === 'TABLE') {
+            const thead = el.querySelector('thead');
+            const tbody = el.querySelector('tbody');
+            const allRows = Array.from(el.querySelectorAll('tr'));
+            const headerRow = thead ? thead.querySelector('tr') : allRows[0];
+            const rows = tbody ? Array.from(tbody.querySelectorAll('tr')) : allRows.slice(1);
+            if (rows.length > 1) {
+              const header = thead || headerRow;
+              item.kind = 'table';
+              item.thead = thead;
+              item.headerRow = headerRow;
+              item.headerHeight = header ? header.offsetHeight || 40 : 40;
+              item.rows = rows;
+              item.sizes = rows.map(row => row.offsetHeight || 35);
+              item.merged = rows.map(row => row.hasAttribute('data-merged'));
+              item.count = rows.length;
+              item.chrome = Math.max(item.height - item.headerHeight - sum(item.sizes, 0, rows.length), 0);
+            }
+          } else if (el.classList.contains('code-block')) {
+            const code = el.querySelector('code');
+            if (code) {
+              const lines = code.textContent.split('\\n');
+              // Gennemsnit pr. kildelinje - lange linjer brydes af pre-wrap
+              const lineHeight = code.offsetHeight / lines.length || 18;
+              item.kind = 'code';
+              item.code = code;
+              item.lines = lines;
+              item.sizes = lines.map(() => lineHeight);
+              item.count = lines.length;
+              item.chrome = Math.max(item.height - code.offsetHeight, 0);
+            }
+          } else if (el.classList.contains('highlight-box')) {
+            const paragraphs = Array.from(el.querySelectorAll('p'));
+            if (paragraphs.length > 1) {
+              item.kind = 'highlight';
+              item.paragraphs = paragraphs;
+              item.sizes = paragraphs.map(p => p.offsetHeight || 20);
+              item.count = paragraphs.length;
+              item.chrome = Math.max(item.height - sum(item.sizes, 0, paragraphs.length), 0);
+            }
+          }
+          return item;
+        }
+
+        // === FASE 2: Layout - ren JavaScript ud fra målingerne, ingen DOM ===
+        // En entry er et element eller en del af det: { item, from, to } (rækker/linjer/paragraffer)
+        function entryHeight(entry) {
+          const item = entry.item;
+          if (!item.kind || (entry.from === 0 && entry.to === item.count)) return item.height;
+          let height = item.chrome + sum(item.sizes, entry.from, entry.to);
+          if (item.kind === 'table') height += item.headerHeight;
+          if (entry.from > 0) height += CONTINUED_MARKER;
+          return height;
+        }
+
+        // Index hvor entry skal deles for at første del fylder højst maxHeight (-1 = kan ikke deles)
+        function planSplit(entry, maxHeight) {
+          const item = entry.item;
+          let used = (item.kind === 'table' ? item.headerHeight : item.chrome) +
+                     (entry.from > 0 ? CONTINUED_MARKER : 0);
+          let index = entry.from;
+          while (index < entry.to && used + item.sizes[index] <= maxHeight) {
+            used += item.sizes[index];
+            index++;
+          }
+
+          // Never split inside a merged cell: step back to the row that starts the rowspan
+          if (item.kind === 'table') {
+            while (index > entry.from && index < entry.to && item.merged[index]) index--;
+          }
+
+          const minimum = item.kind === 'table' ? MIN_ROWS_WITH_HEADER : item.kind === 'code' ? MIN_CODE_LINES : 1;
+          if (index - entry.from < minimum || index >= entry.to) return -1;
+          return index;
+        }
+
+        // Fordel en sektions elementer på sider: returnerer en liste af sider (lister af entries)
+        function layoutSection(items) {
+          const layout = [[]];
+          let page = layout[0];
+          let used = 0;
+
+          function place(entry) {
+            page.push(entry);
+            used += entryHeight(entry);
+          }
+
+          function nextPage() {
+            page = [];
+            layout.push(page);
+            used = 0;
+          }
+
+          let index = 0;
+          let pending = null;
+          while (pending || index < items.length) {
+            let entry = pending;
+            if (!entry) {
+              const item = items[index++];
+              // Step 1: Explicit page breaks (H1 chapters)
+              if (item.pageBreak) {
+                if (page.length > 0) nextPage();
+                continue;
+              }
+              entry = { item: item, from: 0, to: item.count };
+            }
+            pending = null;
 
-    @font-face {{
-      font-family: 'FH Lecturis';
-      src: url('../Fonts/FHLecturis_BSCustom_Light.otf') format('opentype');
-      font-weight: 300;
-      font-style: normal;
-    }}
+            if (used + entryHeight(entry) <= maxContentHeight) {
+              place(entry);
+              continue;
+            }
+
+            // Step 2: Split tables, code blocks and highlight boxes with the space that is left
+            const item = entry.item;
+            const remaining = maxContentHeight - used - SPLIT_RESERVE;
+            if (item.kind && (page.length === 0 || remaining > MIN_SPLIT_SPACE)) {
+              const split = planSplit(entry, page.length === 0 ? maxContentHeight - SPLIT_RESERVE : remaining);
+              if (split > 0) {
+                place({ item: item, from: entry.from, to: split });
+                nextPage();
+                pending = { item: item, from: split, to: entry.to };
+                continue;
+              }
+            }
 
-    /* Helvetica Neue */
-    @font-face {{
-      font-family: 'Helvetica Neue';
-      src: url('../Fonts/HelveticaNeue/HelveticaNeue-Light-08.ttf') format('truetype');
-      font-weight: 300;
-      font-style: normal;
-    }}
+            // Too tall for a page and cannot be split - accept overflow
+            if (page.length === 0) {
+              place(entry);
+              continue;
+            }
+
+            // Overskrifter i bunden af siden følger med indholdet under dem
+            let headings = 0;
+            while (headings < page.length && page[page.length - 1 - headings].item.heading) headings++;
+            const carried = headings < page.length ? page.splice(page.length - headings, headings) : [];
+            nextPage();
+            carried.forEach(place);
+            pending = entry;
+          }
+          return layout;
+        }
+
+        // === FASE 3: Skrivning - kun DOM-ændringer, ingen målinger ===
+        function materialize(entry) {
+          const item = entry.item;
+          // Første del af et split element er selve elementet - resten flyttes ud af det
+          if (!item.kind || entry.from === 0) {
+            if (item.kind === 'code' && entry.to < item.count) {
+              item.code.textContent = item.lines.slice(0, entry.to).join('\\n');
+            }
+            return item.el;
+          }
+
+          if (item.kind === 'table') {
+            const table = document.createElement('table');
+            table.className = ((item.el.className || '').replace('table-continued', '').trim() + ' table-continued').trim();
+            // Clone header (all header rows when the table has a thead)
+            if (item.thead) {
+              table.appendChild(item.thead.cloneNode(true));
+            } else if (item.headerRow) {
+              const thead = document.createElement('thead');
+              thead.appendChild(item.headerRow.cloneNode(true));
+              table.appendChild(thead);
+            }
+            const tbody = document.createElement('tbody');
+            for (let i = entry.from; i < entry.to; i++) tbody.appendChild(item.rows[i]);
+            table.appendChild(tbody);
+            return table;
+          }
+
+          if (item.kind === 'code') {
+            return createCodeBlock(item.lines.slice(entry.from, entry.to).join('\\n'));
+          }
+
+          const box = document.createElement('div');
+          box.className = 'highlight-box highlight-box-continued';
+          for (let i = entry.from; i < entry.to; i++) box.appendChild(item.paragraphs[i]);
+          return box;
+        }
+
+        // Skriv en sektions layout: første side genbruges, nye sider bygges uden for DOM'en
+        function writeSection(sectionPage, items, layout) {
+          items.forEach(item => { if (item.pageBreak) item.el.remove(); });
+
+          const sectionPages = [];
+          layout.forEach((entries, index) => {
+            const page = index === 0 ? sectionPage : createNewPage();
+            const fragment = document.createDocumentFragment();
+            entries.forEach(entry => fragment.appendChild(materialize(entry)));
+            const content = page.querySelector('.page-content');
+            if (content) content.appendChild(fragment);
+            sectionPages.push(page);
+          });
+          sectionPage.after(...sectionPages.slice(1));
+          return sectionPages;
+        }
+
+        // === FASE 4: Efterjustering ud fra de renderede positioner ===
+        function pageAfter(page) {
+          const index = pages.indexOf(page);
+          if (index + 1 < pages.length) return pages[index + 1];
+          const newPage = createNewPage();
+          page.after(newPage);
+          pages.splice(index + 1, 0, newPage);
+          return newPage;
+        }
+
+        function moveToNextPage(elements, page) {
+          const nextPage = pageAfter(page);
+          const content = nextPage.querySelector('.page-content');
+          const fragment = document.createDocumentFragment();
+          elements.forEach(el => fragment.appendChild(el));
+          content.insertBefore(fragment, content.firstChild);
+          return nextPage;
+        }
+
+        // Cut content that overlaps the footer. Returnerer siden der fik indhold (eller null)
+        function enforceFooterBoundary(check) {
+          const index = check.rects.findIndex(rect => rect.bottom > check.footerTop - 10); // 10px safety margin
+          if (index === -1) return null;
+          const elem = check.children[index];
+          const rect = check.rects[index];
+
+          // Is it a code block we can cut?
+          if (elem.classList.contains('code-block')) {
+            const code = elem.querySelector('code');
+            const lines = code ? code.textContent.split('\\n') : [];
+            const linesCanFit = Math.floor((check.footerTop - rect.top - 50) / 18);
+            if (lines.length > 5 && linesCanFit >= MIN_CODE_LINES && linesCanFit < lines.length) {
+              code.textContent = lines.slice(0, linesCanFit).join('\\n');
+              const rest = createCodeBlock(lines.slice(linesCanFit).join('\\n'));
+              return moveToNextPage([rest].concat(check.children.slice(index + 1)), check.page);
+            }
+          }
+
+          // If there's very little content after the heading above, move the heading too
+          let start = index;
+          if (index > 0 && check.headings[index - 1] &&
+              rect.top - check.rects[index - 1].bottom < MIN_CONTENT_AFTER_HEADING) {
+            start = index - 1;
+          }
+          // Første element er for højt til en side - kun det efterfølgende flyttes
+          if (start === 0) start = index + 1;
+          if (start >= check.children.length) return null;
+          return moveToNextPage(check.children.slice(start), check.page);
+        }
+
+        // Headings at the bottom of a page with significant empty space below move to the next page
+        // REGEL: Første indholdsside røres ALDRIG
+        function preventOrphanedHeadings(check) {
+          if (check.index === 0) return null;
+          let lastContent = check.children.length - 1;
+          while (lastContent >= 0 && check.headings[lastContent]) lastContent--;
+          if (lastContent < 0 || lastContent === check.children.length - 1) return null;
+
+          const spaceBelow = check.footerTop - check.rects[check.rects.length - 1].bottom;
+          if (spaceBelow <= MIN_SPACE_FOR_ORPHAN) return null;
+          return moveToNextPage(check.children.slice(lastContent + 1), check.page);
+        }
+
+        function fixPages(dirty) {
+          let rounds = 0;
+          while (dirty.size > 0 && rounds++ < pages.length * 2 + 10) {
+            // Læs: alle målinger for de ændrede sider på én gang
+            const checks = [];
+            pages.forEach((page, index) => {
+              if (!dirty.has(page)) return;
+              const footer = page.querySelector('.page-footer');
+              const content = page.querySelector('.page-content');
+              if (!footer || !content || content.children.length === 0) return;
+              const children = Array.from(content.children);
+              checks.push({
+                page: page,
+                index: index,
+                children: children,
+                footerTop: footer.getBoundingClientRect().top,
+                rects: children.map(child => child.getBoundingClientRect()),
+                headings: children.map(isHeadingElement),
+              });
+            });
+            dirty.clear();
+
+            // Skriv: flyt indhold ud fra målingerne. En side der har fået nyt indhold
+            // i denne runde har forældede målinger og tjekkes i næste runde.
+            const received = new Set();
+            checks.forEach(check => {
+              if (received.has(check.page)) {
+                dirty.add(check.page);
+                return;
+              }
+              const changed = enforceFooterBoundary(check) || preventOrphanedHeadings(check);
+              if (changed) {
+                received.add(changed);
+                dirty.add(changed);
+              }
+            });
+          }
+        }
+
+        // Execute pagination
+        const measured = sections.map(section => {
+          const content = section.querySelector('.page-content');
+          return content ? Array.from(content.children).map(measureItem) : [];
+        });
+        endPhase('measure');
+
+        const layouts = measured.map(layoutSection);
+        endPhase('layout');
+
+        sections.forEach((section, index) => {
+          pages.push(...writeSection(section, measured[index], layouts[index]));
+        });
+        endPhase('write');
+
+        fixPages(new Set(pages));
+        endPhase('fixup');
+
+        // Update page numbers (VIGTIGT: ekskluder cover-page og back-page)
+        const pageNumbers = new Map();
+        pages.forEach((page, index) => {
+          pageNumbers.set(page, index + 1);
+          const pageNum = page.querySelector('.page-number');
+          if (pageNum) pageNum.textContent = (index + 1);
+        });
+
+        // Generate TOC page numbers - TOC-linjerne linker til overskrifternes id
+        document.querySelectorAll('.toc-entry').forEach(entry => {
+          const link = entry.querySelector('a[href^="#"]');
+          const heading = link ? document.getElementById(link.getAttribute('href').slice(1)) : null;
+          const pageNumber = heading ? pageNumbers.get(heading.closest('.page')) : null;
+
+          if (pageNumber) {
+            const pageSpan = document.createElement('span');
+            pageSpan.className = 'toc-page-number';
+            pageSpan.textContent = pageNumber;
+            entry.appendChild(pageSpan);
+          }
+        });
+        endPhase('numbers');
 
-    @font-face {{
-      font-family: 'Helvetica Neue';
-      src: url('../Fonts/HelveticaNeue/HelveticaNeue-Medium-11.ttf') format('truetype');
-      font-weight: 500;
-      font-style: normal;
-    }}
+        // Timing: sammenlign store rapporter i konsollen eller via window.backstagePagination
+        const total = performance.now() - startTime;
+        window.backstagePagination = { pages: pages.length, total: total, phases: timings };
+        console.info('Paginering: ' + pages.length + ' sider på ' + total.toFixed(1) + ' ms (' +
+          Object.keys(timings).map(name => name + ' ' + timings[name].toFixed(1) + ' ms').join(', ') + ')');
+      }
+    });'''
 
-    @font-face {{
-      font-family: 'Helvetica Neue';
-      src: url('../Fonts/HelveticaNeue/HelveticaNeue-01.ttf') format('truetype');
-      font-weight: 400;
-      font-style: normal;
-    }}
 
-    @font-face {{
-      font-family: 'Helvetica Neue';
-      src: url('../Fonts/HelveticaNeue/HelveticaNeue-Bold-02.ttf') format('truetype');
-      font-weight: 700;
+# Fontene i @font-face (familie, vægt, fil i Fonts/, CSS-format) i den rækkefølge de erklæres
+FONT_FACES = (
+    ('FH Lecturis', 400, 'FHLecturis_BSCustom_Regular.otf', 'opentype'),
+    ('FH Lecturis', 700, 'FHLecturis_BSCustom_Bold.otf', 'opentype'),
+    ('FH Lecturis', 300, 'FHLecturis_BSCustom_Light.otf', 'opentype'),
+    ('Helvetica Neue', 300, 'HelveticaNeue/HelveticaNeue-Light-08.ttf', 'truetype'),
+    ('Helvetica Neue', 500, 'HelveticaNeue/HelveticaNeue-Medium-11.ttf', 'truetype'),
+    ('Helvetica Neue', 400, 'HelveticaNeue/HelveticaNeue-01.ttf', 'truetype'),
+    ('Helvetica Neue', 700, 'HelveticaNeue/HelveticaNeue-Bold-02.ttf', 'truetype'),
+)
+FONT_COMMENTS = {'FH Lecturis': 'FH Lecturis - Backstage custom font', 'Helvetica Neue': 'Helvetica Neue'}
+
+# Fontene ligger i Fonts/ ved siden af HTML Exports/
+FONT_URL = "../Fonts/"
+
+
+# Tegn der altid kommer med i font-subsets: ASCII (sidetal og "(fortsat)" fra
+# scriptet) og de ikke-ASCII tegn konverteren selv skriver (labels, pile, bullets)
+BASE_FONT_CHARACTERS = ''.join(map(chr, range(0x20, 0x7f))) + 'æøåÆØÅéÉü–—•→'
+
+
+def document_characters(doc, *texts) -> set:
+    """Alle tegn rapporten kan vise: dokumentets tekst, texts og BASE_FONT_CHARACTERS.
+
+    Både store og små bogstaver kommer med, da CSS'en bruger text-transform.
+
+    Args:
+        doc: Word Document objekt eller ParsedDocument fra parse_document()
+        texts: Øvrige tekster i rapporten (titel og forsidetekster; None ignoreres)
+    """
+    characters = set(BASE_FONT_CHARACTERS)
+    with _parsed_document(doc) as parsed:
+        for block in parsed.blocks:
+            if block.kind == BLOCK_TABLE:
+                for row in block.rows:
+                    for cell in row:
+                        for text in cell.paragraphs:
+                            characters.update(text)
+            else:
+                characters.update(block.text)
+    for text in texts:
+        characters.update(text or '')
+    cased = ''.join(characters)
+    characters.update(cased.upper())
+    characters.update(cased.lower())
+    return characters
+
+
+# De fonte CSS'en vælger (familie, vægt). Ingen regel beder om FH Lecturis 300
+# eller vægt over 500, så FH Lecturis 300/700 og Helvetica Neue 700 bruges aldrig
+FACE_HEADING = ('FH Lecturis', 400)     # h1-h3, TOC-overskrift, forsidens titel
+FACE_LIGHT = ('Helvetica Neue', 300)    # brødtekst, tabelceller, TOC-linjer, forsidens beskrivelse
+FACE_REGULAR = ('Helvetica Neue', 400)  # forsidens caption
+FACE_MEDIUM = ('Helvetica Neue', 500)   # strong, th, labels, h4, pseudo-overskrifter, TOC niveau 1
+
+# MIME-typer til <link rel="preload" as="font">
+FONT_MIME_TYPES = {'opentype': 'font/otf', 'truetype': 'font/ttf', 'woff2': 'font/woff2'}
+
+
+def document_font_faces(doc) -> set:
+    """(familie, vægt) for de fonte rapporten bruger, bestemt ud fra block-IR'en.
+
+    Forsiden, TOC'en og brødteksten bruger altid FH Lecturis 400 og Helvetica
+    Neue 300/400. Helvetica Neue 500 kommer med, når dokumentet har noget
+    CSS'en sætter i medium (se _uses_medium_weight). Kursiv syntetiseres af
+    browseren - der er ingen kursive @font-face regler.
+    """
+    faces = {FACE_HEADING, FACE_LIGHT, FACE_REGULAR}
+    with _parsed_document(doc) as parsed:
+        if any(_uses_medium_weight(block) for block in parsed.blocks):
+            faces.add(FACE_MEDIUM)
+    return faces
+
+
+def _uses_medium_weight(block: Block) -> bool:
+    """Om blokken giver elementer i vægt 500 (konservativt - hellere en font for meget)."""
+    if block.kind == BLOCK_TABLE:
+        return block.header_rows > 0  # <th>
+    text = block.text
+    style_type = block.style_type
+    return (any(span[1] for span in block.runs)  # <strong>
+            or style_type in ('h1', 'pseudo_h3')  # label + TOC niveau 1 / pseudo-overskrift
+            or (style_type == 'toc_entry' and not re.search(r'[23]', block.style_name))
+            or '## ' in text or text.startswith('# ')  # instruktionsoverskrifter (h4)
+            or bool(DATA_LABEL_PATTERN.match(text.strip())))
+
+
+def _font_faces(faces) -> list:
+    """FONT_FACES filtreret til faces (None = alle)."""
+    return [face for face in FONT_FACES if faces is None or face[:2] in faces]
+
+
+def _subset_font_sources(characters: set, faces: set, context: ConversionContext,
+                         images: "ImageStore") -> dict:
+    """Subset fontene i faces og returnér {fontfil: (url, 'woff2')} til get_font_face_css.
+
+    Med asset_dir skrives subsets som <indholds-hash>.woff2 ved siden af
+    billederne (og tælles med i images.asset_files), ellers indlejres de
+    som data-URI'er.
+    """
+    sources = {}
+    for _, _, filename, _ in _font_faces(faces):
+        blob = context.font_subsetter.subset(os.path.join(FONTS_DIR, filename), characters)
+        if context.asset_dir is not None:
+            asset_name = f'{hashlib.sha256(blob).hexdigest()[:16]}.woff2'
+            _write_asset(os.path.join(context.asset_dir, asset_name), blob)
+            images.asset_files.append(asset_name)
+            url = context.asset_url + asset_name
+        else:
+            url = f'data:font/woff2;base64,{base64.b64encode(blob).decode("ascii")}'
+        sources[filename] = (url, 'woff2')
+    return sources
+
+
+def get_font_face_css(faces: set = None, sources: dict = None) -> str:
+    """@font-face reglerne til <style> i rapportens header.
+
+    font-display: block skjuler teksten kortvarigt i stedet for at vise en
+    fallback-font - browser-pagineringen venter alligevel på fontene.
+
+    Args:
+        faces: (familie, vægt) der skal erklæres (se document_font_faces).
+               Default er alle fonte i FONT_FACES.
+        sources: {fontfil: (url, format)} for subsettede fonte (se
+                 _subset_font_sources). Default er filerne i ../Fonts/.
+    """
+    rules = []
+    family = None
+    for face_family, weight, filename, font_format in _font_faces(faces):
+        url, font_format = sources[filename] if sources else (FONT_URL + filename, font_format)
+        comment = f'    /* {FONT_COMMENTS[face_family]} */\n' if face_family != family else ''
+        family = face_family
+        rules.append(f'''{comment}    @font-face {{
+      font-family: '{face_family}';
+      src: url('{url}') format('{font_format}');
+      font-weight: {weight};
       font-style: normal;
-    }}
+      font-display: block;
+    }}''')
+    return '\n\n'.join(rules)
+
 
-    * {{ margin: 0; padding: 0; box-sizing: border-box; }}
+def get_font_preload_html(faces: set = None, sources: dict = None) -> str:
+    """<link rel="preload"> for fontfilerne, så de hentes parallelt med HTML'en.
+
+    Alle erklærede fonte bruges af dokumentet og skal være indlæst før
+    pagineringen kan måle teksten. Indlejrede fonte (data-URI'er) preloades ikke.
+    """
+    links = []
+    for _, _, filename, font_format in _font_faces(faces):
+        url, font_format = sources[filename] if sources else (FONT_URL + filename, font_format)
+        if not url.startswith('data:'):
+            links.append(f'  <link rel="preload" href="{html_lib.escape(url)}" as="font" '
+                         f'type="{FONT_MIME_TYPES[font_format]}" crossorigin>')
+    return '\n'.join(links)
+
+
+# Backstage CSS uden fonte - indlejres i <style> eller skrives til den delte runtime (se write_runtime)
+BACKSTAGE_CSS = f'''    * {{ margin: 0; padding: 0; box-sizing: border-box; }}
 
     /* A4 Page Setup */
     @page {{
@@ -1218,6 +3230,11 @@ def get_html_header(title: str) -> str:
       text-decoration: none;
     }}
 
+    .toc-entry a {{
+      color: inherit;
+      text-decoration: none;
+    }}
+
     /* Headings - keep with following content */
     h1, h2, h3, h4 {{
       page-break-after: avoid;
@@ -1849,8 +3866,106 @@ def get_html_header(title: str) -> str:
         -moz-osx-font-smoothing: grayscale;
         text-rendering: optimizeLegibility;
       }}
-    }}
-  </style>
+    }}'''
+
+
+RUNTIME_NAME = "backstage-runtime"
+
+
+class RuntimeFiles:
+    """URL'er til den delte runtime (CSS og JS) som rapporterne linker til."""
+
+    __slots__ = ('css_href', 'js_href')
+
+    def __init__(self, css_href: str, js_href: str):
+        self.css_href = css_href
+        self.js_href = js_href
+
+
+_RUNTIME_SOURCES = None
+
+
+def _minify_css(css: str) -> str:
+    """Fjern kommentarer og overflødigt whitespace (strenge i CSS'en har ingen {};:,)."""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    return css.replace(': ', ':').replace(';}', '}').strip()
+
+
+def _minify_js(script: str) -> str:
+    """Fjern kommentarer, indrykning og tomme linjer.
+
+    Linjeskift bevares, så automatisk semikolon-indsættelse virker som før.
+    """
+    lines = []
+    for line in script.split('\n'):
+        line = re.sub(r'\s+//\s.*$', '', line).strip()
+        if line and not line.startswith('//'):
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def runtime_sources() -> dict:
+    """Den minificerede runtime som {filnavn: bytes}.
+
+    Filnavnene er backstage-runtime.<indholds-hash>.css/.js, så en ny version
+    af CSS'en eller scripts aldrig genbruger en fil browseren har i cache.
+    """
+    global _RUNTIME_SOURCES
+    if _RUNTIME_SOURCES is None:
+        sources = {}
+        for extension, text in (('css', _minify_css(BACKSTAGE_CSS)),
+                                ('js', _minify_js(PAGINATION_SCRIPT))):
+            blob = text.encode('utf-8')
+            sources[f'{RUNTIME_NAME}.{hashlib.sha256(blob).hexdigest()[:12]}.{extension}'] = blob
+        _RUNTIME_SOURCES = sources
+    return _RUNTIME_SOURCES
+
+
+def write_runtime(runtime_dir: str, runtime_url: str = RUNTIME_URL) -> RuntimeFiles:
+    """Skriv den delte runtime til runtime_dir (hvis filerne ikke findes).
+
+    @font-face reglerne er ikke med i runtime'en - de står i hver rapports
+    header, da fontene kan være subsettet til den enkelte rapport.
+
+    Returns:
+        RuntimeFiles med URL'erne set fra HTML-filen
+    """
+    hrefs = {}
+    for filename, blob in runtime_sources().items():
+        _write_asset(os.path.join(runtime_dir, filename), blob)
+        hrefs[filename.rsplit('.', 1)[1]] = runtime_url + filename
+    return RuntimeFiles(hrefs['css'], hrefs['js'])
+
+
+def get_html_header(title: str, runtime: "RuntimeFiles" = None, font_faces: set = None,
+                    font_sources: dict = None, image_css: str = '') -> str:
+    """HTML header med Backstage CSS og A4 sideopdeling.
+
+    Med runtime (se write_runtime) linkes den delte CSS-fil i stedet for at
+    indlejre den. font_faces og font_sources vælger @font-face reglerne (se
+    get_font_face_css) - default er alle fonte i ../Fonts/. image_css er
+    reglerne for delte billeder (se ImageStore.shared_css).
+    """
+    font_css = get_font_face_css(font_faces, font_sources)
+    if image_css:
+        font_css += f'\n\n    /* Billeder der bruges flere gange - indlejret én gang */\n{image_css}'
+    styles = get_font_preload_html(font_faces, font_sources)
+    if styles:
+        styles += '\n'
+    if runtime is None:
+        styles += f'  <style>\n{font_css}\n\n{BACKSTAGE_CSS}\n  </style>'
+    else:
+        styles += (f'  <style>\n{font_css}\n  </style>\n'
+                   f'  <link rel="stylesheet" href="{html_lib.escape(runtime.css_href)}">')
+    return f'''<!DOCTYPE html>
+<html lang="da">
+<head>
+  <meta charset="UTF-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1.0">
+  <title>{html_lib.escape(title)}</title>
+{styles}
 </head>
 <body>
   <div class="document">
@@ -1859,14 +3974,15 @@ def get_html_header(title: str) -> str:
 '''
 
 
-def get_html_header_no_page(title: str) -> str:
+def get_html_header_no_page(title: str, runtime: "RuntimeFiles" = None, font_faces: set = None,
+                            font_sources: dict = None, image_css: str = '') -> str:
     """HTML header UDEN automatisk page - bruges med forside/bagside.
 
     Returnerer kun DOCTYPE, head, og document wrapper.
     Forside og sider skal tilføjes manuelt.
     """
     # Returner det samme som get_html_header() men UDEN de sidste 3 linjer
-    full_header = get_html_header(title)
+    full_header = get_html_header(title, runtime, font_faces, font_sources, image_css)
     # Fjern de sidste linjer der åbner page og page-content
     # Find og fjern: <div class="page">\n      <div class="page-content">\n
     return full_header.replace(
@@ -1875,7 +3991,16 @@ def get_html_header_no_page(title: str) -> str:
     )
 
 
-def get_html_footer() -> str:
+def _runtime_script_html(runtime: "RuntimeFiles" = None) -> str:
+    """Script-tag med pagineringen - indlejret eller fra den delte runtime."""
+    if runtime is not None:
+        return f'  <script src="{html_lib.escape(runtime.js_href)}"></script>'
+    return f'''  <script>
+{PAGINATION_SCRIPT}
+  </script>'''
+
+
+def get_html_footer(runtime: "RuntimeFiles" = None) -> str:
     """HTML footer - lukker sidste side."""
     return f'''
       </div><!-- end page-content -->
@@ -1886,680 +4011,33 @@ def get_html_footer() -> str:
     </div>
   </div>
 
-  <script>
-    // Auto-pagination: splits content across pages when it overflows
-    document.addEventListener('DOMContentLoaded', function() {{
-      const document_el = document.querySelector('.document');
-      const firstPage = document.querySelector('.page');
-
-      if (!firstPage) return;
-
-      // Max content height in pixels (235mm for safety margin above footer)
-      const mmToPx = 3.7795275591; // 1mm = 3.78px at 96dpi
-      const maxContentHeight = 235 * mmToPx;
-
-      // Clone footer template
-      const footerTemplate = firstPage.querySelector('.page-footer').cloneNode(true);
-
-      // Step 1: Handle explicit page breaks (H1 chapters)
-      function handlePageBreaks() {{
-        const firstContent = firstPage.querySelector('.page-content');
-        if (!firstContent) return;
-
-        const pageBreaks = firstContent.querySelectorAll('.page-break');
-        if (pageBreaks.length === 0) return;
-
-        pageBreaks.forEach((pb) => {{
-          const newPage = createNewPage();
-          const newContent = newPage.querySelector('.page-content');
-
-          // Move all siblings after page-break to new page
-          let sibling = pb.nextElementSibling;
-          while (sibling && !sibling.classList.contains('page-break')) {{
-            const next = sibling.nextElementSibling;
-            newContent.appendChild(sibling);
-            sibling = next;
-          }}
-
-          document_el.appendChild(newPage);
-          pb.remove();
-        }});
-      }}
-
-      // Step 2: Auto-paginate overflowing content
-      function autoPaginate() {{
-        let pages = document.querySelectorAll('.page');
-        let pageIndex = 0;
-
-        // Process pages one at a time (list changes as we add pages)
-        while (pageIndex < pages.length) {{
-          const page = pages[pageIndex];
-          const content = page.querySelector('.page-content');
-
-          if (!content) {{
-            pageIndex++;
-            continue;
-          }}
-
-          // Check if content overflows
-          if (content.scrollHeight <= maxContentHeight) {{
-            pageIndex++;
-            continue;
-          }}
-
-          const children = Array.from(content.children);
-          if (children.length === 0) {{
-            pageIndex++;
-            continue;
-          }}
-
-          // Find the element that causes overflow
-          let overflowIndex = -1;
-          let accumulatedHeight = 0;
-
-          for (let i = 0; i < children.length; i++) {{
-            const child = children[i];
-            const rect = child.getBoundingClientRect();
-            const style = window.getComputedStyle(child);
-            const marginTop = parseFloat(style.marginTop) || 0;
-            const marginBottom = parseFloat(style.marginBottom) || 0;
-            const totalHeight = rect.height + marginTop + marginBottom;
-
-            if (accumulatedHeight + totalHeight > maxContentHeight) {{
-              overflowIndex = i;
-              break;
-            }}
-            accumulatedHeight += totalHeight;
-          }}
-
-          // Handle edge cases
-          if (overflowIndex === -1) {{
-            // No overflow detected via measurement, but scrollHeight says there is
-            // This can happen with margin collapse - move last element
-            overflowIndex = children.length - 1;
-          }}
-
-          if (overflowIndex === 0) {{
-            // First element is too big - try to split it
-            const firstChild = children[0];
-            const remainingHeight = maxContentHeight - 50; // Leave some margin
-
-            // Try to split the element (tables, code blocks, highlight boxes)
-            if (splitElement(firstChild, content, remainingHeight)) {{
-              // Element was split - recheck this page
-              pages = document.querySelectorAll('.page');
-              continue;
-            }} else if (children.length > 1) {{
-              // Can't split, but there are more elements - move them
-              overflowIndex = 1;
-            }} else {{
-              // Only one element and it can't be split - accept overflow and move on
-              pageIndex++;
-              continue;
-            }}
-          }}
-
-          // NEW: Always try to split tables/code-blocks that overflow
-          // Calculate remaining space on current page
-          const overflowElement = children[overflowIndex];
-          if (overflowElement) {{
-            const tagName = overflowElement.tagName ? overflowElement.tagName.toUpperCase() : '';
-            const isTable = tagName === 'TABLE';
-            const isCodeBlock = overflowElement.classList && overflowElement.classList.contains('code-block');
-            const isHighlightBox = overflowElement.classList && overflowElement.classList.contains('highlight-box');
-
-            // For splittable elements, always try to split them
-            if (isTable || isCodeBlock || isHighlightBox) {{
-              // Calculate how much space is used by elements BEFORE the overflow element
-              let usedHeight = 0;
-              for (let i = 0; i < overflowIndex; i++) {{
-                const rect = children[i].getBoundingClientRect();
-                const style = window.getComputedStyle(children[i]);
-                usedHeight += rect.height + (parseFloat(style.marginTop) || 0) + (parseFloat(style.marginBottom) || 0);
-              }}
-              const remainingHeight = maxContentHeight - usedHeight - 50;
-
-              if (remainingHeight > 100 && splitElement(overflowElement, content, remainingHeight)) {{
-                // Element was split - recheck this page
-                pages = document.querySelectorAll('.page');
-                continue;
-              }}
-            }}
-          }}
-
-          // Create new page and move overflowing elements
-          const newPage = createNewPage();
-          const newContent = newPage.querySelector('.page-content');
-
-          // Move elements from overflowIndex onwards to new page
-          for (let i = overflowIndex; i < children.length; i++) {{
-            newContent.appendChild(children[i]);
-          }}
-
-          // Insert new page after current page
-          page.after(newPage);
-
-          // Refresh the pages list
-          pages = document.querySelectorAll('.page');
-          // Stay on the same pageIndex to check if current page still overflows
-        }}
-      }}
-
-      // Helper: Split a code block that's too tall for one page
-      function splitCodeBlock(codeBlock, parentContent, maxHeight) {{
-        const pre = codeBlock.querySelector('pre');
-        const code = codeBlock.querySelector('code');
-        if (!code) return false;
-
-        const text = code.textContent;
-        const lines = text.split('\\n');
-
-        // Calculate lines for FIRST chunk (may have less space due to content above)
-        // Use conservative estimates: 18px per line (accounts for variations)
-        // Add extra overhead for continuation marker (~20px)
-        const lineHeight = 18;
-        const blockOverhead = 80; // padding + margin + continuation marker buffer
-        const linesFirstChunk = Math.floor((maxHeight - blockOverhead) / lineHeight);
-
-        // For full pages, use a safe maximum of 38 lines
-        // This ensures content never overflows the footer
-        const linesFullPage = 38;
-
-        if (lines.length <= linesFirstChunk || linesFirstChunk < 3) return false;
-
-        // Split into chunks - first chunk uses remaining space, rest use full page
-        const chunks = [];
-
-        // First chunk
-        chunks.push(lines.slice(0, linesFirstChunk).join('\\n'));
-
-        // Remaining chunks use full page height
-        for (let i = linesFirstChunk; i < lines.length; i += linesFullPage) {{
-          chunks.push(lines.slice(i, i + linesFullPage).join('\\n'));
-        }}
-
-        // Replace original code block with first chunk
-        code.textContent = chunks[0];
-
-        // Create continuation blocks for remaining chunks
-        let currentBlock = codeBlock;
-        for (let i = 1; i < chunks.length; i++) {{
-          const newCodeBlock = document.createElement('div');
-          newCodeBlock.className = 'code-block code-block-continued';
-
-          const newPre = document.createElement('pre');
-          const newCode = document.createElement('code');
-          newCode.textContent = chunks[i];
-          newPre.appendChild(newCode);
-          newCodeBlock.appendChild(newPre);
-
-          // Insert after current block
-          if (currentBlock.nextSibling) {{
-            parentContent.insertBefore(newCodeBlock, currentBlock.nextSibling);
-          }} else {{
-            parentContent.appendChild(newCodeBlock);
-          }}
-
-          currentBlock = newCodeBlock;
-        }}
-        return true;
-      }}
-
-      // Helper: Split a table that's too tall for one page
-      function splitTable(table, parentContent, maxHeight) {{
-        const rows = Array.from(table.querySelectorAll('tr'));
-        if (rows.length <= 1) return false; // Only header or single row
-
-        // Find header row (first row or thead tr)
-        const thead = table.querySelector('thead');
-        const headerRow = thead ? thead.querySelector('tr') : rows[0];
-        const headerHeight = headerRow ? headerRow.offsetHeight || 40 : 40;
-
-        // Find body rows
-        const tbody = table.querySelector('tbody');
-        const bodyRows = tbody ? Array.from(tbody.querySelectorAll('tr')) : rows.slice(1);
-
-        if (bodyRows.length === 0) return false;
-
-        // MINIMUM ROWS: Header skal have mindst 2 body-rækker med sig
-        // Ellers flyttes hele tabellen til næste side i stedet for at splitte
-        const MIN_ROWS_WITH_HEADER = 2;
-
-        // Calculate how many rows fit using conservative estimate
-        // Average row height ~35px (9pt font + padding)
-        const avgRowHeight = 35;
-        const maxRowsPerPage = Math.floor((maxHeight - headerHeight - 50) / avgRowHeight);
-
-        // Use dynamic calculation but cap at maxRowsPerPage
-        let currentHeight = headerHeight;
-        let splitIndex = 0;
-
-        for (let i = 0; i < bodyRows.length; i++) {{
-          // Use actual height if available, otherwise estimate
-          const rowHeight = bodyRows[i].offsetHeight || avgRowHeight;
-          if (currentHeight + rowHeight > maxHeight || i >= maxRowsPerPage) {{
-            splitIndex = i;
-            break;
-          }}
-          currentHeight += rowHeight;
-          splitIndex = i + 1;
-        }}
-
-        // Don't split if:
-        // - No rows fit (splitIndex === 0)
-        // - All rows fit (splitIndex >= bodyRows.length)
-        // - Too few rows would stay with header (splitIndex < MIN_ROWS_WITH_HEADER)
-        if (splitIndex < MIN_ROWS_WITH_HEADER || splitIndex >= bodyRows.length) return false;
-
-        // Create new table for remaining rows
-        const newTable = document.createElement('table');
-        // Copy classes but remove the split guard so new table can be split again if needed
-        newTable.className = ((table.className || '').replace('table-split', '').trim() + ' table-continued').trim();
-
-        // Clone header
-        if (headerRow) {{
-          const newThead = document.createElement('thead');
-          newThead.appendChild(headerRow.cloneNode(true));
-          newTable.appendChild(newThead);
-        }}
-
-        // Move remaining rows to new table
-        const newTbody = document.createElement('tbody');
-        for (let i = splitIndex; i < bodyRows.length; i++) {{
-          newTbody.appendChild(bodyRows[i]);
-        }}
-        newTable.appendChild(newTbody);
-
-        // Insert new table after original
-        if (table.nextSibling) {{
-          parentContent.insertBefore(newTable, table.nextSibling);
-        }} else {{
-          parentContent.appendChild(newTable);
-        }}
-
-        return true;
-      }}
-
-      // Helper: Split a highlight box that's too tall for one page
-      function splitHighlightBox(box, parentContent, maxHeight) {{
-        const paragraphs = Array.from(box.querySelectorAll('p'));
-        if (paragraphs.length <= 1) return false;
-
-        // Calculate how many paragraphs fit
-        let currentHeight = 32; // Padding
-        let splitIndex = 0;
-
-        for (let i = 0; i < paragraphs.length; i++) {{
-          const pHeight = paragraphs[i].offsetHeight || 20;
-          if (currentHeight + pHeight > maxHeight) {{
-            splitIndex = i;
-            break;
-          }}
-          currentHeight += pHeight;
-          splitIndex = i + 1;
-        }}
-
-        if (splitIndex === 0 || splitIndex >= paragraphs.length) return false;
-
-        // Create new highlight box for remaining paragraphs
-        const newBox = document.createElement('div');
-        newBox.className = 'highlight-box highlight-box-continued';
-
-        // Move remaining paragraphs
-        for (let i = splitIndex; i < paragraphs.length; i++) {{
-          newBox.appendChild(paragraphs[i]);
-        }}
-
-        // Insert after original
-        if (box.nextSibling) {{
-          parentContent.insertBefore(newBox, box.nextSibling);
-        }} else {{
-          parentContent.appendChild(newBox);
-        }}
-
-        return true;
-      }}
-
-      // Generic element splitter - tries to split oversized elements
-      function splitElement(element, parentContent, maxHeight) {{
-        if (!element || !element.tagName) return false;
-
-        const tagName = element.tagName.toUpperCase();
-
-        // Table
-        if (tagName === 'TABLE') {{
-          if (!element.classList.contains('table-split')) {{
-            const result = splitTable(element, parentContent, maxHeight);
-            if (result) {{
-              element.classList.add('table-split'); // Only add guard if split succeeded
-            }}
-            return result;
-          }}
-        }}
-
-        // Code block
-        if (element.classList && element.classList.contains('code-block')) {{
-          if (!element.classList.contains('code-block-split')) {{
-            const result = splitCodeBlock(element, parentContent, maxHeight);
-            if (result) {{
-              element.classList.add('code-block-split'); // Only add guard if split succeeded
-            }}
-            return result;
-          }}
-        }}
-
-        // Highlight box
-        if (element.classList && element.classList.contains('highlight-box')) {{
-          if (!element.classList.contains('highlight-box-split')) {{
-            const result = splitHighlightBox(element, parentContent, maxHeight);
-            if (result) {{
-              element.classList.add('highlight-box-split'); // Only add guard if split succeeded
-            }}
-            return result;
-          }}
-        }}
-
-        return false;
-      }}
-
-      // Helper: Create a new page with content wrapper and footer
-      function createNewPage() {{
-        const newPage = document.createElement('div');
-        newPage.className = 'page';
-
-        const newContent = document.createElement('div');
-        newContent.className = 'page-content';
-        newPage.appendChild(newContent);
-
-        const newFooter = footerTemplate.cloneNode(true);
-        newPage.appendChild(newFooter);
-
-        return newPage;
-      }}
-
-      // Execute pagination
-      handlePageBreaks();
-      autoPaginate();
-
-      // Helper: Check if element is a heading that should stay with next content
-      function isHeadingElement(element) {{
-        if (!element || !element.tagName) return false;
-        const tagName = element.tagName.toUpperCase();
-        if (['H1', 'H2', 'H3', 'H4'].includes(tagName)) return true;
-        if (element.classList) {{
-          if (element.classList.contains('label')) return true;
-          if (element.classList.contains('data-label')) return true;
-          // Instruction section headers should also stay with content
-          if (element.classList.contains('instruction-section') &&
-              element.querySelector('.instruction-header') &&
-              !element.querySelector('code')) return true;
-        }}
-        // Korte paragraffer der ender med ":" er subheadings
-        // F.eks. "Data- og tekniske forudsætninger:"
-        if (tagName === 'P') {{
-          const text = element.textContent.trim();
-          if (text.endsWith(':') && text.length < 80) {{
-            return true;
-          }}
-        }}
-        return false;
-      }}
-
-      // Minimum content height required after a heading (px)
-      const MIN_CONTENT_AFTER_HEADING = 80;
-
-      // POST-PROCESSING: Cut content that overlaps footer
-      // This is the final safety net - uses actual rendered positions
-      function enforceFooterBoundary() {{
-        const pages = document.querySelectorAll('.page');
-        let madeChanges = true;
-        let iterations = 0;
-        const maxIterations = 100; // Safety limit
-
-        while (madeChanges && iterations < maxIterations) {{
-          madeChanges = false;
-          iterations++;
+{_runtime_script_html(runtime)}
+</body>
+</html>'''
 
-          for (const page of document.querySelectorAll('.page')) {{
-            const footer = page.querySelector('.page-footer');
-            const content = page.querySelector('.page-content');
-            if (!footer || !content) continue;
-
-            const footerRect = footer.getBoundingClientRect();
-            const footerTop = footerRect.top;
-
-            // Check each element in content
-            for (const elem of content.children) {{
-              const elemRect = elem.getBoundingClientRect();
-
-              // Does this element overlap the footer?
-              if (elemRect.bottom > footerTop - 10) {{ // 10px safety margin
-                // This element overlaps - need to handle it
-
-                // Is it a code block we can cut?
-                if (elem.classList.contains('code-block')) {{
-                  const code = elem.querySelector('code');
-                  if (code) {{
-                    const lines = code.textContent.split('\\n');
-                    if (lines.length > 5) {{
-                      // Calculate how much space we have
-                      const availableHeight = footerTop - elemRect.top - 50; // 50px for padding/margin
-                      const lineHeight = 18; // Conservative estimate
-                      const linesCanFit = Math.floor(availableHeight / lineHeight);
-
-                      if (linesCanFit >= 3 && linesCanFit < lines.length) {{
-                        // Split the code block
-                        const keepLines = lines.slice(0, linesCanFit);
-                        const moveLines = lines.slice(linesCanFit);
-
-                        code.textContent = keepLines.join('\\n');
-
-                        // Create continuation block
-                        const newBlock = document.createElement('div');
-                        newBlock.className = 'code-block code-block-continued';
-                        const newPre = document.createElement('pre');
-                        const newCode = document.createElement('code');
-                        newCode.textContent = moveLines.join('\\n');
-                        newPre.appendChild(newCode);
-                        newBlock.appendChild(newPre);
-
-                        // Insert after current element
-                        elem.after(newBlock);
-                        madeChanges = true;
-                        break; // Restart checking this page
-                      }}
-                    }}
-                  }}
-                }}
-
-                // Move element to next page if we couldn't split it
-                if (!madeChanges) {{
-                  // Find or create next page
-                  let nextPage = page.nextElementSibling;
-                  if (!nextPage || !nextPage.classList.contains('page')) {{
-                    nextPage = createNewPage();
-                    page.after(nextPage);
-                  }}
-                  const nextContent = nextPage.querySelector('.page-content');
-                  if (nextContent) {{
-                    // Check if previous element is an orphaned heading
-                    // If so, move the heading along with this element
-                    const prevSibling = elem.previousElementSibling;
-                    let startElement = elem;
-                    if (prevSibling && isHeadingElement(prevSibling)) {{
-                      // Check how much content is visible after the heading
-                      const headingRect = prevSibling.getBoundingClientRect();
-                      const contentBetween = elemRect.top - headingRect.bottom;
-                      // If there's very little content after the heading, move heading too
-                      if (contentBetween < MIN_CONTENT_AFTER_HEADING) {{
-                        startElement = prevSibling;
-                      }}
-                    }}
-
-                    // Move elements from startElement onwards to next page
-                    const toMove = [];
-                    let sibling = startElement;
-                    while (sibling) {{
-                      toMove.push(sibling);
-                      sibling = sibling.nextElementSibling;
-                    }}
-                    toMove.forEach(el => nextContent.insertBefore(el, nextContent.firstChild));
-                    madeChanges = true;
-                    break;
-                  }}
-                }}
-              }}
-            }}
-            if (madeChanges) break; // Restart from first page
-          }}
-        }}
-      }}
 
-      enforceFooterBoundary();
-
-      // FINAL PASS: Prevent orphaned headings at bottom of pages
-      // Checks if page ends with headings that have no content after them
-      // If there's significant empty space below, move headings to next page
-      // REGEL: Første side (forsiden) røres ALDRIG - titlen skal stå alene
-      function preventOrphanedHeadings() {{
-        let madeChanges = true;
-        let iterations = 0;
-        const maxIterations = 50;
-        const MIN_SPACE_FOR_ORPHAN = 100; // At least 100px empty = orphan problem
-
-        while (madeChanges && iterations < maxIterations) {{
-          madeChanges = false;
-          iterations++;
-
-          const pages = document.querySelectorAll('.page');
-          // Start fra side 2 (index 1) - spring forsiden over!
-          for (let i = 1; i < pages.length; i++) {{
-            const page = pages[i];
-            const footer = page.querySelector('.page-footer');
-            const content = page.querySelector('.page-content');
-            if (!footer || !content) continue;
-
-            const children = Array.from(content.children);
-            if (children.length === 0) continue;
-
-            // Find the last non-heading element (actual content)
-            let lastContentIndex = -1;
-            for (let j = children.length - 1; j >= 0; j--) {{
-              if (!isHeadingElement(children[j])) {{
-                lastContentIndex = j;
-                break;
-              }}
-            }}
-
-            // Check if page ends with orphaned headings (headings with no content after)
-            if (lastContentIndex < children.length - 1) {{
-              // We have heading(s) at the end with no content after them
-              const lastElement = children[children.length - 1];
-              const lastRect = lastElement.getBoundingClientRect();
-              const footerRect = footer.getBoundingClientRect();
-              const spaceBelow = footerRect.top - lastRect.bottom;
-
-              // If significant empty space below, these headings are orphaned
-              // They should move to next page where their content probably is
-              if (spaceBelow > MIN_SPACE_FOR_ORPHAN) {{
-                // Find or create next page
-                let nextPage = page.nextElementSibling;
-                if (!nextPage || !nextPage.classList.contains('page')) {{
-                  nextPage = createNewPage();
-                  page.after(nextPage);
-                }}
-                const nextContent = nextPage.querySelector('.page-content');
-                if (nextContent) {{
-                  // Move all orphaned headings (from lastContentIndex+1 to end)
-                  const toMove = children.slice(lastContentIndex + 1);
-                  // Insert at beginning of next page, in reverse to preserve order
-                  toMove.reverse().forEach(el => nextContent.insertBefore(el, nextContent.firstChild));
-                  madeChanges = true;
-                  break;
-                }}
-              }}
-            }}
-            if (madeChanges) break;
-          }}
-        }}
-      }}
+def get_page_html(content: str, page_number: int) -> str:
+    """Én færdig indholdsside med sidefod og sidetal (server-side paginering)."""
+    return f'''    <div class="page">
+      <div class="page-content">
+{content}
+      </div><!-- end page-content -->
+      <div class="page-footer">
+        {LOGO_HTML}
+        <span class="page-number" style="font-family: Arial, sans-serif; font-size: 9pt; font-weight: normal; color: #001270; -webkit-text-stroke: 0; text-stroke: 0;">{page_number}</span>
+      </div>
+    </div>'''
 
-      preventOrphanedHeadings();
-
-      // Update page numbers (VIGTIGT: ekskluder cover-page og back-page)
-      const contentPages = document.querySelectorAll('.page:not(.cover-page):not(.back-page)');
-      contentPages.forEach((page, index) => {{
-        const pageNum = page.querySelector('.page-number');
-        if (pageNum) pageNum.textContent = (index + 1);
-      }});
-
-      // Generate TOC page numbers
-      function generateTocPageNumbers() {{
-        const tocEntries = document.querySelectorAll('.toc-entry');
-        // VIGTIGT: Ekskluder cover-page, back-page, og page-footer fra heading søgning
-        const allHeadings = document.querySelectorAll('.page:not(.cover-page):not(.back-page) .page-content h1, .page:not(.cover-page):not(.back-page) .page-content h2, .page:not(.cover-page):not(.back-page) .page-content h3');
-
-        // Build a map of heading text to page number
-        // VIGTIGT: Kun tæl content-sider (ikke forside/bagside)
-        const headingPageMap = new Map();
-        const contentPages = Array.from(document.querySelectorAll('.page:not(.cover-page):not(.back-page)'));
-
-        allHeadings.forEach(heading => {{
-          const page = heading.closest('.page');
-          if (page) {{
-            const pageIndex = contentPages.indexOf(page);
-            const pageNumber = pageIndex + 1;
-            const normalizedText = heading.textContent.replace(/[\u2009\u200A\u200B]/g, '').replace(/\s+/g, ' ').trim();
-            // Brug fuld tekst som nøgle for at undgå duplikater
-            headingPageMap.set(normalizedText, pageNumber);
-          }}
-        }});
-
-        // Update TOC entries with page numbers
-        tocEntries.forEach(entry => {{
-          const entryText = entry.textContent.replace(/[\u2009\u200A\u200B]/g, '').replace(/\s+/g, ' ').trim();
-
-          let pageNumber = null;
-
-          // FØRST: Prøv eksakt match (prioriteret)
-          if (headingPageMap.has(entryText)) {{
-            pageNumber = headingPageMap.get(entryText);
-          }} else {{
-            // FALLBACK: Find bedste match baseret på længste fælles tekst
-            let bestMatch = null;
-            let bestMatchLength = 0;
-
-            for (const [headingText, pn] of headingPageMap) {{
-              // Tjek om den ene indeholder den anden
-              if (headingText.includes(entryText) || entryText.includes(headingText)) {{
-                // Vælg det længste match (mest specifikke)
-                const matchLength = Math.min(headingText.length, entryText.length);
-                if (matchLength > bestMatchLength) {{
-                  bestMatchLength = matchLength;
-                  bestMatch = pn;
-                }}
-              }}
-            }}
-            pageNumber = bestMatch;
-          }}
-
-          if (pageNumber) {{
-            const pageSpan = document.createElement('span');
-            pageSpan.className = 'toc-page-number';
-            pageSpan.textContent = pageNumber;
-            entry.appendChild(pageSpan);
-          }}
-        }});
-      }}
 
-      generateTocPageNumbers();
-    }});
-  </script>
+def get_html_footer_paginated() -> str:
+    """HTML footer efter server-paginerede sider - siderne er færdige, så intet script."""
+    return '''
+  </div><!-- end document -->
 </body>
 </html>'''
 
 
-def get_html_footer_without_page() -> str:
+def get_html_footer_without_page(runtime: "RuntimeFiles" = None) -> str:
     """HTML footer uden page-lukketags - bruges når page allerede er lukket.
 
     Bruges efter forside/bagside indsættelse hvor vi manuelt har lukket
@@ -2568,509 +4046,400 @@ def get_html_footer_without_page() -> str:
     return f'''
   </div><!-- end document -->
 
-  <script>
-    // Auto-pagination: splits content across pages when it overflows
-    document.addEventListener('DOMContentLoaded', function() {{
-      const document_el = document.querySelector('.document');
-      // Find first regular page (skip cover-page and back-page)
-      const firstPage = document.querySelector('.page:not(.cover-page):not(.back-page)');
-
-      if (!firstPage) return;
-
-      // Max content height in pixels (235mm for safety margin above footer)
-      const mmToPx = 3.7795275591; // 1mm = 3.78px at 96dpi
-      const maxContentHeight = 235 * mmToPx;
-
-      // Clone footer template from first regular page
-      const footerTemplate = firstPage.querySelector('.page-footer') ?
-        firstPage.querySelector('.page-footer').cloneNode(true) : null;
-
-      // Step 1: Handle explicit page breaks (H1 chapters)
-      function handlePageBreaks() {{
-        const pages = document.querySelectorAll('.page:not(.cover-page):not(.back-page)');
-        if (pages.length === 0) return;
-
-        pages.forEach(page => {{
-          const content = page.querySelector('.page-content');
-          if (!content) return;
-
-          const pageBreaks = content.querySelectorAll('.page-break');
-          pageBreaks.forEach((pb) => {{
-            const newPage = createNewPage();
-            const newContent = newPage.querySelector('.page-content');
-
-            // Move all siblings after page-break to new page
-            let sibling = pb.nextElementSibling;
-            while (sibling && !sibling.classList.contains('page-break')) {{
-              const next = sibling.nextElementSibling;
-              newContent.appendChild(sibling);
-              sibling = next;
-            }}
-
-            // Insert BEFORE back-page if it exists
-            const backPage = document.querySelector('.back-page');
-            if (backPage) {{
-              backPage.before(newPage);
-            }} else {{
-              document_el.appendChild(newPage);
-            }}
-            pb.remove();
-          }});
-        }});
-      }}
-
-      // Step 2: Auto-paginate overflowing content
-      function autoPaginate() {{
-        let pages = Array.from(document.querySelectorAll('.page:not(.cover-page):not(.back-page)'));
-        let pageIndex = 0;
-
-        // Process pages one at a time (list changes as we add pages)
-        while (pageIndex < pages.length) {{
-          const page = pages[pageIndex];
-          const content = page.querySelector('.page-content');
-
-          if (!content) {{
-            pageIndex++;
-            continue;
-          }}
-
-          // Check if content overflows
-          if (content.scrollHeight <= maxContentHeight) {{
-            pageIndex++;
-            continue;
-          }}
-
-          const children = Array.from(content.children);
-          if (children.length === 0) {{
-            pageIndex++;
-            continue;
-          }}
-
-          // Find the element that causes overflow
-          let overflowIndex = -1;
-          let accumulatedHeight = 0;
-
-          for (let i = 0; i < children.length; i++) {{
-            const child = children[i];
-            const rect = child.getBoundingClientRect();
-            const style = window.getComputedStyle(child);
-            const marginTop = parseFloat(style.marginTop) || 0;
-            const marginBottom = parseFloat(style.marginBottom) || 0;
-            const totalHeight = rect.height + marginTop + marginBottom;
-
-            if (accumulatedHeight + totalHeight > maxContentHeight) {{
-              overflowIndex = i;
-              break;
-            }}
-            accumulatedHeight += totalHeight;
-          }}
-
-          // Handle edge cases
-          if (overflowIndex === -1) {{
-            overflowIndex = children.length - 1;
-          }}
-
-          if (overflowIndex === 0) {{
-            const firstChild = children[0];
-            const remainingHeight = maxContentHeight - 50;
-
-            if (splitElement(firstChild, content, remainingHeight)) {{
-              pages = Array.from(document.querySelectorAll('.page:not(.cover-page):not(.back-page)'));
-              continue;
-            }} else if (children.length > 1) {{
-              overflowIndex = 1;
-            }} else {{
-              pageIndex++;
-              continue;
-            }}
-          }}
-
-          // Try to split tables/code-blocks
-          const overflowElement = children[overflowIndex];
-          if (overflowElement) {{
-            const tagName = overflowElement.tagName ? overflowElement.tagName.toUpperCase() : '';
-            const isTable = tagName === 'TABLE';
-            const isCodeBlock = overflowElement.classList && overflowElement.classList.contains('code-block');
-            const isHighlightBox = overflowElement.classList && overflowElement.classList.contains('highlight-box');
-
-            if (isTable || isCodeBlock || isHighlightBox) {{
-              let usedHeight = 0;
-              for (let i = 0; i < overflowIndex; i++) {{
-                const rect = children[i].getBoundingClientRect();
-                const style = window.getComputedStyle(children[i]);
-                usedHeight += rect.height + (parseFloat(style.marginTop) || 0) + (parseFloat(style.marginBottom) || 0);
-              }}
-              const remainingHeight = maxContentHeight - usedHeight - 50;
-
-              if (remainingHeight > 100 && splitElement(overflowElement, content, remainingHeight)) {{
-                pages = Array.from(document.querySelectorAll('.page:not(.cover-page):not(.back-page)'));
-                continue;
-              }}
-            }}
-          }}
-
-          // Create new page and move overflowing elements
-          const newPage = createNewPage();
-          const newContent = newPage.querySelector('.page-content');
-
-          for (let i = overflowIndex; i < children.length; i++) {{
-            newContent.appendChild(children[i]);
-          }}
-
-          // Insert BEFORE back-page
-          const backPage = document.querySelector('.back-page');
-          if (backPage) {{
-            backPage.before(newPage);
-          }} else {{
-            page.after(newPage);
-          }}
-
-          pages = Array.from(document.querySelectorAll('.page:not(.cover-page):not(.back-page)'));
-        }}
-      }}
-
-      // Helper: Split a code block
-      function splitCodeBlock(codeBlock, parentContent, maxHeight) {{
-        const pre = codeBlock.querySelector('pre');
-        const code = codeBlock.querySelector('code');
-        if (!code) return false;
-
-        const text = code.textContent;
-        const lines = text.split('\\n');
-
-        const lineHeight = 18;
-        const blockOverhead = 80;
-        const linesFirstChunk = Math.floor((maxHeight - blockOverhead) / lineHeight);
-        const linesFullPage = 38;
-
-        if (lines.length <= linesFirstChunk || linesFirstChunk < 3) return false;
-
-        const chunks = [];
-        chunks.push(lines.slice(0, linesFirstChunk).join('\\n'));
-
-        for (let i = linesFirstChunk; i < lines.length; i += linesFullPage) {{
-          chunks.push(lines.slice(i, i + linesFullPage).join('\\n'));
-        }}
-
-        code.textContent = chunks[0];
-
-        let currentBlock = codeBlock;
-        for (let i = 1; i < chunks.length; i++) {{
-          const newCodeBlock = document.createElement('div');
-          newCodeBlock.className = 'code-block code-block-continued';
-
-          const newPre = document.createElement('pre');
-          const newCode = document.createElement('code');
-          newCode.textContent = chunks[i];
-          newPre.appendChild(newCode);
-          newCodeBlock.appendChild(newPre);
-
-          if (currentBlock.nextSibling) {{
-            parentContent.insertBefore(newCodeBlock, currentBlock.nextSibling);
-          }} else {{
-            parentContent.appendChild(newCodeBlock);
-          }}
-
-          currentBlock = newCodeBlock;
-        }}
-        return true;
-      }}
-
-      // Helper: Split a table
-      function splitTable(table, parentContent, maxHeight) {{
-        const rows = Array.from(table.querySelectorAll('tr'));
-        if (rows.length <= 1) return false;
-
-        const thead = table.querySelector('thead');
-        const headerRow = thead ? thead.querySelector('tr') : rows[0];
-        const headerHeight = headerRow ? headerRow.offsetHeight || 40 : 40;
-
-        const tbody = table.querySelector('tbody');
-        const bodyRows = tbody ? Array.from(tbody.querySelectorAll('tr')) : rows.slice(1);
-
-        if (bodyRows.length === 0) return false;
-
-        const MIN_ROWS_WITH_HEADER = 2;
-        const avgRowHeight = 35;
-        const maxRowsPerPage = Math.floor((maxHeight - headerHeight - 50) / avgRowHeight);
-
-        let currentHeight = headerHeight;
-        let splitIndex = 0;
-
-        for (let i = 0; i < bodyRows.length; i++) {{
-          const rowHeight = bodyRows[i].offsetHeight || avgRowHeight;
-          if (currentHeight + rowHeight > maxHeight || i >= maxRowsPerPage) {{
-            splitIndex = i;
-            break;
-          }}
-          currentHeight += rowHeight;
-          splitIndex = i + 1;
-        }}
-
-        if (splitIndex < MIN_ROWS_WITH_HEADER || splitIndex >= bodyRows.length) return false;
-
-        const newTable = document.createElement('table');
-        newTable.className = ((table.className || '').replace('table-split', '').trim() + ' table-continued').trim();
-
-        if (headerRow) {{
-          const newThead = document.createElement('thead');
-          newThead.appendChild(headerRow.cloneNode(true));
-          newTable.appendChild(newThead);
-        }}
-
-        const newTbody = document.createElement('tbody');
-        for (let i = splitIndex; i < bodyRows.length; i++) {{
-          newTbody.appendChild(bodyRows[i]);
-        }}
-        newTable.appendChild(newTbody);
-
-        if (table.nextSibling) {{
-          parentContent.insertBefore(newTable, table.nextSibling);
-        }} else {{
-          parentContent.appendChild(newTable);
-        }}
-
-        return true;
-      }}
-
-      // Helper: Split a highlight box
-      function splitHighlightBox(box, parentContent, maxHeight) {{
-        const paragraphs = Array.from(box.querySelectorAll('p'));
-        if (paragraphs.length <= 1) return false;
-
-        let currentHeight = 32;
-        let splitIndex = 0;
-
-        for (let i = 0; i < paragraphs.length; i++) {{
-          const pHeight = paragraphs[i].offsetHeight || 20;
-          if (currentHeight + pHeight > maxHeight) {{
-            splitIndex = i;
-            break;
-          }}
-          currentHeight += pHeight;
-          splitIndex = i + 1;
-        }}
-
-        if (splitIndex === 0 || splitIndex >= paragraphs.length) return false;
+{_runtime_script_html(runtime)}
+</body>
+</html>'''
 
-        const newBox = document.createElement('div');
-        newBox.className = 'highlight-box highlight-box-continued';
 
-        for (let i = splitIndex; i < paragraphs.length; i++) {{
-          newBox.appendChild(paragraphs[i]);
-        }}
+# Word felt-koder der ikke må lække til HTML'en (mønster, beskrivelse)
+FIELD_CODE_PATTERNS = [
+    (re.compile(pattern, re.IGNORECASE), description) for pattern, description in [
+        (r'INCLUDEPICTURE', 'INCLUDEPICTURE (billede-felt)'),
+        (r'MERGEFORMAT', 'MERGEFORMAT (felt-kode)'),
+        (r'\\\\[A-Z]+\s*"', 'Word felt-kode'),
+        (r'attachment:[a-f0-9-]+:', 'Attachment reference'),
+        (r'HYPERLINK\s+"', 'HYPERLINK felt-kode'),
+        (r'TOC\s+\\\\', 'TOC felt-kode'),
+    ]
+]
+# Fælles forfilter: ingen af mønstrene kan matche uden et af disse ord eller en backslash
+FIELD_CODE_HINT = re.compile(r'INCLUDEPICTURE|MERGEFORMAT|attachment:|HYPERLINK|\\\\', re.IGNORECASE)
+
+# Tag eller tekst i et HTML-fragment. Attributværdier matches i ét hug, så en
+# data-URI i src aldrig gennemløbes tegn for tegn i Python
+HTML_TOKEN = re.compile(r'<(/?)([A-Za-z][A-Za-z0-9]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>'
+                        r'|<!--.*?-->|<![^>]*>|([^<]+)|<', re.DOTALL)
+HTML_CLASS = re.compile(r'\bclass="([^"]*)"')
+HTML_IMG_ALT = re.compile(r'\balt="([^"]*)"')
+HTML_IMG_SRC = re.compile(r'\bsrc="(?!data:)([^"]*)"')
+HTML_VOID_TAGS = {'img', 'br', 'hr', 'meta', 'link', 'input', 'source', 'wbr'}
+QC_HEADING_TAGS = ('h1', 'h2', 'h3')
+HTML_SCAN_CHUNK = 1 << 16  # tegn pr. læsning i scan_html
+# Data-URI i en attribut eller url() - ikke ordet "data:" i brødteksten
+DATA_URI_START = re.compile(r'(?<=["\'(])data:[\w.+-]+/[\w.+-]+[;,]')
+DATA_URI_HEAD = 64  # tegn der holdes tilbage i scan_html, så 'data:image/...;' ikke deles
+FIELD_CODE_OVERLAP = 256  # tegn fra forrige bid der søges igen (længere end en felt-kode)
+
+
+class OutputCounts:
+    """Output-siden af quality_check, talt mens HTML'en genereres.
+
+    convert_to_html_stream() giver hvert fragment til feed(), så QC ikke
+    behøver parse hele outputtet igen bagefter. Fragmenterne gennemløbes én
+    gang: indholdet af <script>/<style> og TOC-linjerne springes over, og
+    tags, overskrifter, synlige ord og lækkede felt-koder tælles i samme
+    gennemløb. Reglerne svarer til BeautifulSoup-tællingen i quality_check
+    (verify=True).
+    """
 
-        if (box.nextSibling) {{
-          parentContent.insertBefore(newBox, box.nextSibling);
-        }} else {{
-          parentContent.appendChild(newBox);
-        }}
+    __slots__ = ('h1', 'h2', 'h3', 'paragraphs', 'tables', 'images', 'links',
+                 'headings', 'words', 'field_codes', '_skip_until', '_heading', '_heading_text')
+
+    def __init__(self):
+        self.h1 = 0
+        self.h2 = 0
+        self.h3 = 0
+        self.paragraphs = 0
+        self.tables = 0
+        self.images = 0
+        self.links = 0
+        self.headings = {tag: [] for tag in QC_HEADING_TAGS}  # tag → overskriftstekster
+        self.words = []
+        self.field_codes = {}  # beskrivelse → antal
+
+        self._skip_until = None  # slut-tag for script/style/TOC-linje vi er inde i
+        self._heading = None
+        self._heading_text = []
+
+    def feed(self, fragment: str):
+        """Tæl ét HTML-fragment (fragmenter skal følge hinanden i dokumentets rækkefølge)."""
+        if 'data:' in fragment:
+            fragment = _without_data_uris(fragment)
+        self.scan_field_codes(fragment)
+
+        pos = 0
+        end = len(fragment)
+        while pos < end:
+            if self._skip_until is not None:
+                # Spring frem til slut-tagget uden at tokenisere script/CSS/TOC-linjen
+                close = fragment.find(self._skip_until, pos)
+                if close < 0:
+                    return
+                pos = close + len(self._skip_until)
+                self._skip_until = None
+                continue
+
+            match = HTML_TOKEN.match(fragment, pos)
+            pos = match.end()
+            text = match.group(4)
+            if text is not None:
+                self.text(html_lib.unescape(text))
+                continue
+
+            tag = match.group(2)
+            if tag is None:
+                continue  # kommentar, doctype eller et løst '<'
+            tag = tag.lower()
+            if match.group(1):
+                self.end_element(tag)
+            elif tag in ('script', 'style'):
+                self._skip_until = f'</{tag}>'
+            else:
+                attributes = match.group(3)
+                class_match = HTML_CLASS.search(attributes)
+                classes = class_match.group(1).split() if class_match else ()
+                if 'toc-entry' in classes:
+                    # TOC-linjerne (altid <p>) er ikke dokumentets tekst
+                    self._skip_until = f'</{tag}>'
+                    continue
+                alt = src = ''
+                if tag == 'img':
+                    alt_match = HTML_IMG_ALT.search(attributes)
+                    src_match = HTML_IMG_SRC.search(attributes)
+                    alt = alt_match.group(1) if alt_match else ''
+                    src = src_match.group(1) if src_match else ''
+                self.start_element(tag, classes, alt, src)
+
+    def scan_field_codes(self, text: str, start: int = 0):
+        """Tæl lækkede Word felt-koder i rå HTML (tags, attributter og tekst).
+
+        Kun match der slutter efter start tælles - tekst før start er allerede talt.
+        """
+        if FIELD_CODE_HINT.search(text):
+            for pattern, description in FIELD_CODE_PATTERNS:
+                if start:
+                    found = sum(1 for match in pattern.finditer(text) if match.end() > start)
+                else:
+                    found = len(pattern.findall(text))
+                if found:
+                    self.field_codes[description] = self.field_codes.get(description, 0) + found
+
+    def start_element(self, tag: str, classes, alt: str = '', src: str = ''):
+        """Tæl et start-tag uden for script/style og TOC-linjerne (alt og src kun for <img>)."""
+        if tag == 'p':
+            if 'list-item' not in classes:
+                self.paragraphs += 1
+        elif tag in QC_HEADING_TAGS:
+            if tag == 'h2' and 'toc-heading' in classes:
+                return
+            setattr(self, tag, getattr(self, tag) + 1)
+            self._heading = tag
+            self._heading_text = []
+        elif tag == 'table':
+            # Fortsatte tabeller (server-paginering) er dele af den samme Word-tabel
+            if 'table-continued' not in classes:
+                self.tables += 1
+        elif tag == 'img':
+            # Logoet i sidefoden er ikke et dokumentbillede
+            if 'logo' not in (alt + src).lower():
+                self.images += 1
+        elif tag == 'a':
+            self.links += 1
+
+    def end_element(self, tag: str):
+        if tag == self._heading:
+            self.headings[tag].append(''.join(self._heading_text)[:80])
+            self._heading = None
+
+    def text(self, text: str):
+        """Tæl synlig tekst (allerede unescaped)."""
+        self.words.extend(text.split())
+        if self._heading is not None:
+            self._heading_text.append(text)
+
+    def heading_list(self) -> list:
+        """[(niveau, tekst)] som i QC-rapporten: alle H1, så H2, så H3."""
+        return [(tag.upper(), text) for tag in QC_HEADING_TAGS for text in self.headings[tag]]
+
+
+def _without_data_uris(fragment: str) -> str:
+    """Fragmentet uden data-URI'ernes payload (base64-billeder og -fonte).
+
+    Payloaden er hverken tekst, tags eller felt-koder, men kan være mange MB -
+    den springes over med str.find i stedet for at blive gennemløbet af regex.
+    """
+    uris = _DataUriFilter()
+    return uris.filter(fragment) + uris.flush()
 
-        return true;
-      }}
 
-      // Generic element splitter
-      function splitElement(element, parentContent, maxHeight) {{
-        if (!element || !element.tagName) return false;
-
-        const tagName = element.tagName.toUpperCase();
-
-        if (tagName === 'TABLE') {{
-          if (!element.classList.contains('table-split')) {{
-            const result = splitTable(element, parentContent, maxHeight);
-            if (result) element.classList.add('table-split');
-            return result;
-          }}
-        }}
-
-        if (element.classList && element.classList.contains('code-block')) {{
-          if (!element.classList.contains('code-block-split')) {{
-            const result = splitCodeBlock(element, parentContent, maxHeight);
-            if (result) element.classList.add('code-block-split');
-            return result;
-          }}
-        }}
-
-        if (element.classList && element.classList.contains('highlight-box')) {{
-          if (!element.classList.contains('highlight-box-split')) {{
-            const result = splitHighlightBox(element, parentContent, maxHeight);
-            if (result) element.classList.add('highlight-box-split');
-            return result;
-          }}
-        }}
-
-        return false;
-      }}
+class _DataUriFilter:
+    """Fjerner data-URI payloads fra tekst der læses i bidder.
 
-      // Helper: Create a new page
-      function createNewPage() {{
-        const newPage = document.createElement('div');
-        newPage.className = 'page';
+    En payload kan fortsætte over flere bidder, og dens begyndelse kan være
+    delt mellem to - begge dele huskes til næste bid.
+    """
 
-        const newContent = document.createElement('div');
-        newContent.className = 'page-content';
-        newPage.appendChild(newContent);
+    __slots__ = ('_in_uri', '_pending')
+
+    def __init__(self):
+        self._in_uri = False
+        self._pending = ''
+
+    def filter(self, chunk: str) -> str:
+        chunk = self._pending + chunk
+        self._pending = ''
+        pieces = []
+        pos = 0
+        if self._in_uri:
+            pos = _data_uri_end(chunk, 0)
+            if pos < 0:
+                return ''
+            self._in_uri = False
+        while True:
+            match = DATA_URI_START.search(chunk, pos)
+            if match is None:
+                break
+            pieces.append(chunk[pos:match.start() + len('data:')])
+            pos = _data_uri_end(chunk, match.end())
+            if pos < 0:
+                self._in_uri = True
+                return ''.join(pieces)
+        # Begyndelsen af en data-URI kan stå sidst i bidden - den venter på næste bid
+        keep = max(pos, len(chunk) - DATA_URI_HEAD)
+        pieces.append(chunk[pos:keep])
+        self._pending = chunk[keep:]
+        return ''.join(pieces)
+
+    def flush(self) -> str:
+        pending = '' if self._in_uri else self._pending
+        self._pending = ''
+        return pending
+
+
+def _data_uri_end(text: str, start: int) -> int:
+    """Hvor en data-URI slutter: attributtens citationstegn eller url()'s parentes (-1 = ikke i text)."""
+    ends = [end for end in (text.find(quote, start) for quote in '"\')') if end >= 0]
+    return min(ends) if ends else -1
+
+
+class _HtmlCountParser(HTMLParser):
+    """HTMLParser der tæller et færdigt dokument ind i en OutputCounts uden at bygge et træ."""
+
+    def __init__(self, counts: OutputCounts):
+        super().__init__(convert_charrefs=True)
+        self.counts = counts
+        self._skip_tag = None  # script/style eller TOC-linje vi er inde i
+        self._skip_depth = 0
+        self._text = []  # tekst kan komme i flere bidder - samles til næste tag
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        attributes = dict(attrs)
+        classes = (attributes.get('class') or '').split()
+        if tag in ('script', 'style') or 'toc-entry' in classes:
+            if tag not in HTML_VOID_TAGS:
+                self._skip_tag = tag
+                self._skip_depth = 1
+            return
+        self.counts.start_element(tag, classes, attributes.get('alt') or '',
+                                  _url_src(attributes.get('src') or ''))
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if not self._skip_depth:
+                    self._skip_tag = None
+            return
+        self.counts.end_element(tag)
+
+    def handle_data(self, data):
+        if self._skip_tag is None:
+            self._text.append(data)
+
+    def handle_comment(self, data):
+        self._flush_text()
+
+    def close(self):
+        super().close()
+        self._flush_text()
+
+    def _flush_text(self):
+        if self._text:
+            self.counts.text(''.join(self._text))
+            self._text = []
+
+
+def scan_html(source, chunk_size: int = HTML_SCAN_CHUNK) -> OutputCounts:
+    """Tæl et færdigt HTML-dokument til quality_check i ét gennemløb.
+
+    Til eksporter uden tællinger fra konverteringen (context.output_counts).
+    Dokumentet læses i bidder af chunk_size tegn: data-URI payloads fjernes
+    før parseren ser dem, script/style og TOC-linjerne springes over, og
+    felt-koderne søges i samme gennemløb - hukommelsen afhænger af
+    dokumentets tekst, ikke af dets indlejrede billeder og fonte.
 
-        if (footerTemplate) {{
-          const newFooter = footerTemplate.cloneNode(true);
-          newPage.appendChild(newFooter);
-        }}
+    Args:
+        source: Sti til HTML-filen eller et tekst file-objekt (f.eks. io.StringIO)
+        chunk_size: Antal tegn der læses ad gangen
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, encoding='utf-8') as f:
+            return scan_html(f, chunk_size)
+
+    counts = OutputCounts()
+    parser = _HtmlCountParser(counts)
+    uris = _DataUriFilter()
+    overlap = ''  # slutningen af forrige bid, så felt-koder delt mellem to bidder findes
+    while True:
+        chunk = source.read(chunk_size)
+        text = uris.filter(chunk) if chunk else uris.flush()
+        if text:
+            counts.scan_field_codes(overlap + text, start=len(overlap))
+            overlap = (overlap + text)[-FIELD_CODE_OVERLAP:]
+            parser.feed(text)
+        if not chunk:
+            break
+    parser.close()
+    return counts
+
+
+def _url_src(src: str) -> str:
+    """src til logo-tjekket - en data-URI's base64 kan indeholde 'logo' helt tilfældigt."""
+    return '' if src.startswith('data:') else src
+
+
+def _soup_counts(html_output: str) -> OutputCounts:
+    """OutputCounts fra et færdigt HTML-dokument med BeautifulSoup (uafhængig kontrol)."""
+    from bs4 import BeautifulSoup
 
-        return newPage;
-      }}
+    counts = OutputCounts()
+    soup = BeautifulSoup(html_output, 'html.parser')
 
-      // Execute pagination
-      handlePageBreaks();
-      autoPaginate();
-
-      // Helper: Check if element is a heading
-      function isHeadingElement(element) {{
-        if (!element || !element.tagName) return false;
-        const tagName = element.tagName.toUpperCase();
-        if (['H1', 'H2', 'H3', 'H4'].includes(tagName)) return true;
-        if (element.classList) {{
-          if (element.classList.contains('label')) return true;
-          if (element.classList.contains('data-label')) return true;
-          if (element.classList.contains('instruction-section') &&
-              element.querySelector('.instruction-header') &&
-              !element.querySelector('code')) return true;
-        }}
-        if (tagName === 'P') {{
-          const text = element.textContent.trim();
-          if (text.endsWith(':') && text.length < 80) return true;
-        }}
-        return false;
-      }}
+    # Fjern TOC entries fra HTML før tekstekstraktion
+    for toc in soup.find_all(class_='toc-entry'):
+        toc.decompose()
 
-      const MIN_CONTENT_AFTER_HEADING = 80;
+    # Fjern script og style tags
+    for script in soup.find_all(['script', 'style']):
+        script.decompose()
 
-      // Prevent orphaned headings
-      function preventOrphanedHeadings() {{
-        let madeChanges = true;
-        let iterations = 0;
-        const maxIterations = 50;
-        const MIN_SPACE_FOR_ORPHAN = 100;
+    # Ekstraher tekst
+    counts.words = soup.get_text(separator=' ', strip=True).split()
+
+    counts.h1 = len(soup.find_all('h1'))
+    counts.h2 = len([h for h in soup.find_all('h2') if 'toc-heading' not in h.get('class', [])])
+    counts.h3 = len(soup.find_all('h3'))
+    counts.paragraphs = len([p for p in soup.find_all('p')
+                             if 'toc-entry' not in p.get('class', [])
+                             and 'list-item' not in p.get('class', [])])
+    # Fortsatte tabeller (server-paginering) er dele af den samme Word-tabel
+    counts.tables = len([t for t in soup.find_all('table') if 'table-continued' not in t.get('class', [])])
+    # Tæl billeder, ekskluder logo (som tilføjes i sidefod)
+    counts.images = len([img for img in soup.find_all('img')
+                         if 'logo' not in (img.get('alt', '') + _url_src(img.get('src', ''))).lower()])
+    counts.links = len(soup.find_all('a'))
 
-        while (madeChanges && iterations < maxIterations) {{
-          madeChanges = false;
-          iterations++;
+    counts.headings['h1'] = [h1.get_text()[:80] for h1 in soup.find_all('h1')]
+    counts.headings['h2'] = [h2.get_text()[:80] for h2 in soup.find_all('h2')
+                             if 'toc-heading' not in h2.get('class', [])]
+    counts.headings['h3'] = [h3.get_text()[:80] for h3 in soup.find_all('h3')]
 
-          const pages = document.querySelectorAll('.page:not(.cover-page):not(.back-page)');
-          for (let i = 0; i < pages.length; i++) {{
-            const page = pages[i];
-            const footer = page.querySelector('.page-footer');
-            const content = page.querySelector('.page-content');
-            if (!footer || !content) continue;
-
-            const children = Array.from(content.children);
-            if (children.length === 0) continue;
-
-            let lastContentIndex = -1;
-            for (let j = children.length - 1; j >= 0; j--) {{
-              if (!isHeadingElement(children[j])) {{
-                lastContentIndex = j;
-                break;
-              }}
-            }}
-
-            if (lastContentIndex < children.length - 1) {{
-              const lastElement = children[children.length - 1];
-              const lastRect = lastElement.getBoundingClientRect();
-              const footerRect = footer.getBoundingClientRect();
-              const spaceBelow = footerRect.top - lastRect.bottom;
-
-              if (spaceBelow > MIN_SPACE_FOR_ORPHAN) {{
-                let nextPage = page.nextElementSibling;
-                while (nextPage && (nextPage.classList.contains('cover-page') || nextPage.classList.contains('back-page'))) {{
-                  nextPage = nextPage.nextElementSibling;
-                }}
-                if (!nextPage || nextPage.classList.contains('back-page')) {{
-                  nextPage = createNewPage();
-                  const backPage = document.querySelector('.back-page');
-                  if (backPage) {{
-                    backPage.before(nextPage);
-                  }} else {{
-                    page.after(nextPage);
-                  }}
-                }}
-                const nextContent = nextPage.querySelector('.page-content');
-                if (nextContent) {{
-                  const toMove = children.slice(lastContentIndex + 1);
-                  toMove.reverse().forEach(el => nextContent.insertBefore(el, nextContent.firstChild));
-                  madeChanges = true;
-                  break;
-                }}
-              }}
-            }}
-            if (madeChanges) break;
-          }}
-        }}
-      }}
+    for pattern, description in FIELD_CODE_PATTERNS:
+        found = len(pattern.findall(html_output))
+        if found:
+            counts.field_codes[description] = found
+    return counts
 
-      preventOrphanedHeadings();
-
-      // Update page numbers - SKIP cover-page and back-page
-      const allPages = document.querySelectorAll('.page:not(.cover-page):not(.back-page)');
-      allPages.forEach((page, index) => {{
-        const pageNum = page.querySelector('.page-number');
-        if (pageNum) pageNum.textContent = (index + 1);
-      }});
-
-      // Generate TOC page numbers
-      function generateTocPageNumbers() {{
-        const tocEntries = document.querySelectorAll('.toc-entry');
-        const allHeadings = document.querySelectorAll('.page:not(.cover-page):not(.back-page) h1, .page:not(.cover-page):not(.back-page) h2, .page:not(.cover-page):not(.back-page) h3');
-
-        const headingPageMap = new Map();
-        allHeadings.forEach(heading => {{
-          const page = heading.closest('.page');
-          if (page) {{
-            const contentPages = Array.from(document.querySelectorAll('.page:not(.cover-page):not(.back-page)'));
-            const pageIndex = contentPages.indexOf(page);
-            const pageNumber = pageIndex + 1;
-            const normalizedText = heading.textContent.replace(/[\u2009\u200A\u200B]/g, '').replace(/\s+/g, ' ').trim();
-            headingPageMap.set(normalizedText, pageNumber);
-          }}
-        }});
-
-        tocEntries.forEach(entry => {{
-          const entryText = entry.textContent.replace(/[\u2009\u200A\u200B]/g, '').replace(/\s+/g, ' ').trim();
-
-          let pageNumber = null;
-          for (const [headingText, pn] of headingPageMap) {{
-            if (headingText === entryText ||
-                headingText.includes(entryText) ||
-                entryText.includes(headingText)) {{
-              pageNumber = pn;
-              break;
-            }}
-          }}
-
-          if (pageNumber) {{
-            const pageSpan = document.createElement('span');
-            pageSpan.className = 'toc-page-number';
-            pageSpan.textContent = pageNumber;
-            entry.appendChild(pageSpan);
-          }}
-        }});
-      }}
 
-      generateTocPageNumbers();
-    }});
-  </script>
-</body>
-</html>'''
+# Positionel tekstsammenligning i quality_check
+QC_MAX_SPANS = 20  # manglende tekststykker der nævnes i issues/warnings
+QC_CONTEXT_WORDS = 5  # ord før og efter et manglende stykke
+QC_SPAN_TEXT = 200  # tegn af et manglende stykke i rapporten
 
 
-def quality_check(doc: Document, html_output: str) -> dict:
+def quality_check(doc, html_output: str = None, counts: OutputCounts = None,
+                  verify: bool = False, html_path: str = None) -> dict:
     """
     QC-funktion: Sammenligner Word-dokument med HTML-output.
     Returnerer en rapport med antal af hvert element og eventuelle uoverensstemmelser.
 
+    doc kan være et Document eller et ParsedDocument fra parse_document().
+
     KRITISK: Tjekker ordantal for at sikre INGEN tekst udelades.
+
+    Args:
+        doc: Word Document objekt eller ParsedDocument
+        html_output: Hele HTML-dokumentet (bruges når counts mangler, og ved verify)
+        counts: OutputCounts fra konverteringen (context.output_counts) - så
+               parses HTML'en ikke igen
+        verify: Tæl også HTML'en med BeautifulSoup og advar, hvis tallene ikke
+               stemmer (kræver bs4)
+        html_path: En eksporteret HTML-fil i stedet for html_output - den
+               scannes i bidder uden at blive læst ind i hukommelsen
     """
-    from bs4 import BeautifulSoup
+    with _parsed_document(doc) as parsed:
+        return _quality_report(parsed, html_output, counts, verify, html_path)
+
 
+def _quality_report(parsed, html_output: str, counts: OutputCounts, verify: bool,
+                    html_path: str) -> dict:
+    """quality_check() for et ParsedDocument."""
     report = {
         "word": {},
         "html": {},
@@ -3085,13 +4454,32 @@ def quality_check(doc: Document, html_output: str) -> dict:
     word_h2 = 0
     word_h3 = 0
     word_paragraphs = 0
-    word_tables = len(doc.tables)
-    word_images = len([rel for rel in doc.part.rels.values() if "image" in rel.reltype])
+    word_tables = 0
+    table_texts = []
+    word_images = len([rel for rel in parsed.doc.part.rels.values() if "image" in rel.reltype])
     word_headings = []
 
-    for para in doc.paragraphs:
-        style_name = para.style.name if para.style else "Normal"
-        text = para.text.strip()
+    # Dokumentets ord i rækkefølge til den positionelle sammenligning, og hvor
+    # hver block starter (paragraf-index, tabelnummer, første ord) - så et hul
+    # kan placeres uden at slå blocks op igen (de kan være streamet)
+    word_tokens = []
+    token_blocks = []
+    # Forside-metadata før første indholds-H1 (som i konverteren) - dokumentets
+    # første H1 regnes for titlen, når den står før al anden tekst
+    in_title_block = True
+    title_h1_seen = False
+
+    for block in parsed.blocks:
+        if block.kind != BLOCK_PARAGRAPH:
+            cell_texts = ['\n'.join(cell.paragraphs).strip() for row in block.rows for cell in row]
+            word_tables += 1
+            token_blocks.append((None, word_tables, len(word_tokens)))
+            word_tokens.extend(' '.join(cell_texts).split())
+            table_texts.extend(text for text in cell_texts if text)
+            continue
+
+        style_name = block.style_name
+        text = block.text
 
         if not text:
             continue
@@ -3107,30 +4495,38 @@ def quality_check(doc: Document, html_output: str) -> dict:
         # Tilføj til samlet tekst
         word_all_text.append(text)
 
-        if 'Heading 1' in style_name:
+        if block.style_type == 'h1' and not is_manual_toc_heading(text):
+            if title_h1_seen or word_all_text[:-1]:
+                in_title_block = False
+            title_h1_seen = True
+
+        # Word's manuelle TOC erstattes af den genererede, og forside-metadata
+        # springes over - ingen af delene skal findes i HTML'en
+        replaced = (is_manual_toc_entry(text) or is_manual_toc_heading(text)
+                    or (in_title_block and block.style_type == 'p'
+                        and (len(text) < 150 or is_title_block_metadata(text))))
+        if not replaced:
+            token_blocks.append((block.para_index, None, len(word_tokens)))
+            word_tokens.extend(text.split())
+
+        # style_type følger StyleTable (arvede og lokaliserede overskrifter tæller med)
+        if block.style_type == 'h1':
             word_h1 += 1
             word_headings.append(("H1", text[:80]))
-        elif 'Heading 2' in style_name:
+        elif block.style_type == 'h2':
             word_h2 += 1
             word_headings.append(("H2", text[:80]))
-        elif 'Heading 3' in style_name:
+        elif block.style_type == 'h3':
             word_h3 += 1
             word_headings.append(("H3", text[:80]))
         else:
             word_paragraphs += 1
 
     # Tilføj tabelindhold til ordtælling
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                cell_text = cell.text.strip()
-                if cell_text:
-                    word_all_text.append(cell_text)
+    word_all_text.extend(table_texts)
 
     # Beregn ordantal i Word
-    word_full_text = ' '.join(word_all_text)
-    word_words = word_full_text.split()
-    word_word_count = len(word_words)
+    word_word_count = sum(len(text.split()) for text in word_all_text)
 
     report["word"] = {
         "h1": word_h1,
@@ -3143,42 +4539,27 @@ def quality_check(doc: Document, html_output: str) -> dict:
         "word_count": word_word_count
     }
 
-    # === Ekstraher AL tekst fra HTML-output ===
-    soup = BeautifulSoup(html_output, 'html.parser')
-
-    # Fjern TOC entries fra HTML før tekstekstraktion
-    for toc in soup.find_all(class_='toc-entry'):
-        toc.decompose()
-
-    # Fjern script og style tags
-    for script in soup.find_all(['script', 'style']):
-        script.decompose()
-
-    # Ekstraher tekst
-    html_text = soup.get_text(separator=' ', strip=True)
-    html_words = html_text.split()
+    # === HTML-siden: tællinger fra konverteringen, ellers fra den færdige HTML ===
+    if counts is None:
+        if html_output is None and html_path is None:
+            raise TypeError("quality_check kræver html_output, html_path eller counts")
+        counts = scan_html(io.StringIO(html_output) if html_output is not None else html_path)
+    if verify:
+        if html_output is None:
+            with open(html_path, encoding='utf-8') as f:
+                html_output = f.read()
+        _verify_counts(counts, _soup_counts(html_output), report)
+
+    html_words = counts.words
     html_word_count = len(html_words)
-
-    html_h1 = len(soup.find_all('h1'))
-    html_h2 = len([h for h in soup.find_all('h2') if 'toc-heading' not in h.get('class', [])])
-    html_h3 = len(soup.find_all('h3'))
-    html_paragraphs = len([p for p in soup.find_all('p')
-                          if 'toc-entry' not in p.get('class', [])
-                          and 'list-item' not in p.get('class', [])])
-    html_tables = len(soup.find_all('table'))
-    # Tæl billeder, ekskluder logo (som tilføjes i sidefod)
-    html_images = len([img for img in soup.find_all('img')
-                       if 'logo' not in (img.get('alt', '') + img.get('src', '')).lower()])
-    html_links = len(soup.find_all('a'))
-    html_headings = []
-
-    for h1 in soup.find_all('h1'):
-        html_headings.append(("H1", h1.get_text()[:80]))
-    for h2 in soup.find_all('h2'):
-        if 'toc-heading' not in h2.get('class', []):
-            html_headings.append(("H2", h2.get_text()[:80]))
-    for h3 in soup.find_all('h3'):
-        html_headings.append(("H3", h3.get_text()[:80]))
+    html_h1 = counts.h1
+    html_h2 = counts.h2
+    html_h3 = counts.h3
+    html_paragraphs = counts.paragraphs
+    html_tables = counts.tables
+    html_images = counts.images
+    html_links = counts.links
+    html_headings = counts.heading_list()
 
     report["html"] = {
         "h1": html_h1,
@@ -3238,33 +4619,86 @@ def quality_check(doc: Document, html_output: str) -> dict:
     for heading in missing_in_html:
         report["issues"].append(f"Manglende overskrift i HTML: '{heading}'")
 
-    # Find specifikke manglende ord (sample af ord der er i Word men ikke i HTML)
-    word_set = set(word_words)
-    html_set = set(html_words)
-    missing_words = word_set - html_set
+    # Find hvor tekst mangler: Word's ord aligneres med HTML'ens i rækkefølge
+    _compare_text(word_tokens, token_blocks, html_words, report)
 
-    # Filter til kun signifikante ord (>3 tegn, ikke tal)
-    significant_missing = [w for w in missing_words if len(w) > 3 and not w.isdigit()]
+    # === KRITISK: Check for lækkede Word felt-koder ===
+    for description, found in counts.field_codes.items():
+        report["issues"].append(f"⚠️ LÆKKET FELT-KODE: {description} fundet {found} gang(e)")
 
-    if len(significant_missing) > 10:
-        report["warnings"].append(f"Ord der kan mangle i HTML (sample): {', '.join(list(significant_missing)[:10])}")
+    return report
 
-    # === KRITISK: Check for lækkede Word felt-koder ===
-    field_code_patterns = [
-        (r'INCLUDEPICTURE', 'INCLUDEPICTURE (billede-felt)'),
-        (r'MERGEFORMAT', 'MERGEFORMAT (felt-kode)'),
-        (r'\\\\[A-Z]+\s*"', 'Word felt-kode'),
-        (r'attachment:[a-f0-9-]+:', 'Attachment reference'),
-        (r'HYPERLINK\s+"', 'HYPERLINK felt-kode'),
-        (r'TOC\s+\\\\', 'TOC felt-kode'),
-    ]
 
-    for pattern, description in field_code_patterns:
-        matches = re.findall(pattern, html_output, re.IGNORECASE)
-        if matches:
-            report["issues"].append(f"⚠️ LÆKKET FELT-KODE: {description} fundet {len(matches)} gang(e)")
+def _compare_text(word_tokens: list, token_blocks: list, html_words: list, report: dict):
+    """Positionel sammenligning af Word's og HTML'ens ord (se text_diff).
 
-    return report
+    Tilføjer manglende tekststykker til report["text_comparison"] med
+    paragraf-index og kontekst. Huller uden bogstaver (overskriftsnumre,
+    punkttegn, ##-markører) fjerner konverteringen med vilje og tæller ikke.
+    For de første QC_MAX_SPANS stykker tjekkes det om teksten står et andet
+    sted i HTML'en ("moved") - for resten er "moved" None. Flyttet betyder at
+    ordfølgen (med ordgrænser) står mindst lige så mange gange i HTML'en som
+    i Word, så et kort ord der også bruges andre steder, ikke tæller som fundet.
+    """
+    diff = compare_tokens(word_tokens, html_words)
+    block_starts = [start for _, _, start in token_blocks]
+    html_text = word_text = None
+
+    spans = []
+    for start, end in diff.spans():
+        missing = word_tokens[start:end]
+        if not any(char.isalpha() for token in missing for char in token):
+            continue
+        para_index, table_number, _ = token_blocks[bisect_right(block_starts, start) - 1]
+        span = {
+            "paragraph": para_index,
+            "table": table_number,
+            "words": end - start,
+            "text": ' '.join(missing)[:QC_SPAN_TEXT],
+            "context": (' '.join(word_tokens[max(0, start - QC_CONTEXT_WORDS):start]) + ' [' +
+                        ' '.join(missing)[:QC_SPAN_TEXT] + '] ' +
+                        ' '.join(word_tokens[end:end + QC_CONTEXT_WORDS])).strip(),
+            "moved": None,
+        }
+        if len(spans) < QC_MAX_SPANS:
+            # Står teksten et andet sted i HTML'en, er den flyttet eller gentaget - ikke tabt
+            if html_text is None:
+                # Mellemrum om hvert ord, så ' kunde ' ikke findes inde i 'kunder',
+                # og to ens ord i træk tælles to gange
+                html_text = f" {'  '.join(html_words)} "
+                word_text = f" {'  '.join(word_tokens)} "
+            phrase = f" {'  '.join(missing)} "
+            span["moved"] = html_text.count(phrase) >= word_text.count(phrase)
+            where = (f"tabel {span['table']}" if span["table"] is not None
+                     else f"paragraf {span['paragraph']}")
+            if span["moved"]:
+                report["warnings"].append(f"Tekst i {where} står et andet sted i HTML'en: '{span['context']}'")
+            else:
+                report["issues"].append(f"⚠️ MANGLENDE TEKST i {where} ({span['words']} ord): "
+                                        f"'{span['context']}'")
+        spans.append(span)
+
+    report["text_comparison"]["missing_words"] = sum(span["words"] for span in spans)
+    report["text_comparison"]["missing_spans"] = spans
+    report["text_comparison"]["surplus_words"] = sum(
+        1 for index in diff.surplus.nonzero()[0].tolist()
+        if any(char.isalpha() for char in word_tokens[index]))
+    if len(spans) > QC_MAX_SPANS:
+        report["warnings"].append(f"{len(spans) - QC_MAX_SPANS} tekststykker mere mangler i HTML "
+                                  f"(se text_comparison['missing_spans'])")
+
+
+def _verify_counts(counts: OutputCounts, reference: OutputCounts, report: dict):
+    """Advar hvis QC'ens tællinger afviger fra BeautifulSoups optælling af HTML'en."""
+    for field in ('h1', 'h2', 'h3', 'paragraphs', 'tables', 'images', 'links'):
+        if getattr(counts, field) != getattr(reference, field):
+            report["warnings"].append(f"QC-verifikation: {field} talt til {getattr(counts, field)}, "
+                                      f"BeautifulSoup tæller {getattr(reference, field)}")
+    if counts.words != reference.words:
+        report["warnings"].append(f"QC-verifikation: {len(counts.words)} ord talt, "
+                                  f"BeautifulSoup tæller {len(reference.words)}")
+    if counts.heading_list() != reference.heading_list() or counts.field_codes != reference.field_codes:
+        report["warnings"].append("QC-verifikation: overskrifter eller felt-koder afviger fra BeautifulSoup")
 
 
 def print_qc_report(report: dict):
@@ -3305,6 +4739,8 @@ def print_qc_report(report: dict):
             print(f"   Forskel: {-diff} ekstra ord i HTML")
         else:
             print(f"   ✅ Ingen forskel i ordantal")
+        if tc.get('missing_spans'):
+            print(f"   ⚠️ {tc['missing_words']} ord i {len(tc['missing_spans'])} tekststykker mangler på deres plads")
 
     if report.get("warnings"):
         print("\n⚡ ADVARSLER:")
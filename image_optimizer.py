@@ -0,0 +1,107 @@
+"""
+Backstage Billedoptimering
+==========================
+Nedskalerer billeder til printopløsning og re-encoder dem med Pillow.
+
+Bruges af html_converter når en konvertering har optimize_images slået til:
+hvert billede skaleres til mål-DPI for den størrelse det vises i (højst
+indholdsbredden på en A4-side), metadata fjernes, og billedet gemmes i det
+mindste af PNG/JPEG/WebP.
+"""
+
+import io
+
+from PIL import Image, ImageOps, features
+
+# Indholdsbredde på en A4-side (210mm minus marginer)
+CONTENT_WIDTH_MM = 170
+DEFAULT_DPI = 150
+DEFAULT_QUALITY = 80
+
+EMU_PER_MM = 36000
+MM_PER_INCH = 25.4
+
+# Billedformater Pillow kan læse og vi tør re-encode (EMF/WMF o.l. beholdes som de er)
+OPTIMIZABLE_FORMATS = {'PNG', 'JPEG', 'GIF', 'BMP', 'TIFF', 'WEBP'}
+
+
+def image_size(blob: bytes) -> tuple:
+    """Pixelstørrelse (bredde, højde) fra billedets header, eller None."""
+    try:
+        with Image.open(io.BytesIO(blob)) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+class ImageOptimizer:
+    """Re-encoder billeder til den mindste fil der holder mål-DPI og kvalitet.
+
+    Args:
+        dpi: Mål-opløsning for den viste størrelse
+        quality: JPEG/WebP kvalitet (0-100)
+        max_width_mm: Største viste bredde (default: A4 indholdsbredde)
+    """
+
+    def __init__(self, dpi: int = DEFAULT_DPI, quality: int = DEFAULT_QUALITY,
+                 max_width_mm: float = CONTENT_WIDTH_MM):
+        self.dpi = dpi
+        self.quality = quality
+        self.max_width_mm = max_width_mm
+        self.webp = features.check('webp')
+
+    def target_size(self, size: tuple, display_emu: tuple = None) -> tuple:
+        """Pixelstørrelse til et billede vist i display_emu (cx, cy) - aldrig opskaleret."""
+        width, height = size
+        width_mm = self.max_width_mm
+        if display_emu and display_emu[0] > 0:
+            width_mm = min(display_emu[0] / EMU_PER_MM, self.max_width_mm)
+
+        target_width = max(1, round(width_mm / MM_PER_INCH * self.dpi))
+        if target_width >= width:
+            return size
+        return target_width, max(1, round(height * target_width / width))
+
+    def optimize(self, blob: bytes, display_emu: tuple = None):
+        """Optimér ét billede.
+
+        Returns:
+            (blob, billedtype) for den mindste variant, eller None hvis
+            originalen skal beholdes (ukendt format, animation, allerede mindst)
+        """
+        try:
+            image = Image.open(io.BytesIO(blob))
+            if image.format not in OPTIMIZABLE_FORMATS or getattr(image, 'n_frames', 1) > 1:
+                return None
+            # Rotation fra EXIF skal bages ind, før metadata fjernes
+            image = ImageOps.exif_transpose(image)
+            image.load()
+            # Konverteringen kan også fejle (afkortede data, usædvanlige modes som I;16)
+            has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (
+                image.mode == 'P' and 'transparency' in image.info)
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        except Exception:
+            return None
+
+        size = self.target_size(image.size, display_emu)
+        if size != image.size:
+            image = image.resize(size, Image.LANCZOS)
+
+        candidates = [self._encode(image, 'PNG', optimize=True)]
+        if not has_alpha:
+            candidates.append(self._encode(image, 'JPEG', quality=self.quality,
+                                           optimize=True, progressive=True))
+        if self.webp:
+            candidates.append(self._encode(image, 'WEBP', quality=self.quality, method=6))
+
+        best = min(candidates, key=lambda candidate: len(candidate[0]))
+        if len(best[0]) >= len(blob):
+            return None
+        return best
+
+    @staticmethod
+    def _encode(image, fmt: str, **options):
+        """Gem billedet i fmt uden metadata og returnér (blob, billedtype)."""
+        buffer = io.BytesIO()
+        image.save(buffer, fmt, **options)
+        return buffer.getvalue(), fmt.lower()
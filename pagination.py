@@ -0,0 +1,784 @@
+"""
+Backstage Paginering
+====================
+Server-side sideopdeling af konverterens HTML med fontmetrik fra Fonts/.
+
+Browser-scriptet i get_html_footer() måler DOM'en og flytter elementer
+mellem sider, når siden er indlæst - langsomt for store rapporter og med
+sideskift der afhænger af maskinens fonte. Paginator gør det samme i Python:
+teksten måles med de medfølgende fonte (Pillow ImageFont), linjerne brydes
+som i browseren, og blokkene fordeles på 235mm indholdsområder. Tabeller,
+kodeblokke og highlight boxes splittes over sider, overskrifter følger
+indholdet de står over, og sidetal og TOC-numre er endelige i HTML'en.
+
+Målene nedenfor svarer til CSS'en i html_converter.get_html_header().
+
+Brug:
+    from pagination import Paginator
+
+    pages = Paginator().paginate(html_fragmenter)
+    for number, page in enumerate(pages, 1):
+        ...  # page er en liste af HTML-elementer
+"""
+
+import html as html_lib
+import os
+import re
+from collections import deque
+from html.parser import HTMLParser
+
+from PIL import ImageFont
+
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Fonts')
+
+# (familie, vægt, kursiv) → fontfil i FONTS_DIR
+FONT_FILES = {
+    ('FH Lecturis', 300, False): 'FHLecturis_BSCustom_Light.otf',
+    ('FH Lecturis', 400, False): 'FHLecturis_BSCustom_Regular.otf',
+    ('FH Lecturis', 700, False): 'FHLecturis_BSCustom_Bold.otf',
+    ('Helvetica Neue', 300, False): 'HelveticaNeue/HelveticaNeue-Light-08.ttf',
+    ('Helvetica Neue', 300, True): 'HelveticaNeue/HelveticaNeue-LightItalic-09.ttf',
+    ('Helvetica Neue', 400, False): 'HelveticaNeue/HelveticaNeue-01.ttf',
+    ('Helvetica Neue', 400, True): 'HelveticaNeue/HelveticaNeue-Italic-03.ttf',
+    ('Helvetica Neue', 500, False): 'HelveticaNeue/HelveticaNeue-Medium-11.ttf',
+    ('Helvetica Neue', 500, True): 'HelveticaNeue/HelveticaNeue-MediumItalic-12.ttf',
+    ('Helvetica Neue', 700, False): 'HelveticaNeue/HelveticaNeue-Bold-02.ttf',
+    ('Helvetica Neue', 700, True): 'HelveticaNeue/HelveticaNeue-BoldItalic-04.ttf',
+}
+MONOSPACE = 'monospace'
+
+# CSS-enheder ved 96 dpi
+PX_PER_PT = 96 / 72
+PX_PER_MM = 96 / 25.4
+
+CONTENT_WIDTH = 170 * PX_PER_MM   # 210mm - 2 x 20mm padding
+CONTENT_HEIGHT = 235 * PX_PER_MM  # .page-content max-height
+
+# Fontene indlæses i denne størrelse (px); bredder skaleres lineært
+FONT_UNITS = 100
+# Gennemsnitlig tegnbredde (em) når en font mangler, og for monospace
+FALLBACK_CHAR_WIDTH = 0.5
+MONOSPACE_CHAR_WIDTH = 0.6
+
+# Som i browser-scriptet: mindst 2 body-rækker med tabelhovedet, mindst 3
+# kodelinjer i en split kodeblok, og ingen split med under 100px tilbage
+MIN_TABLE_ROWS = 2
+MIN_CODE_LINES = 3
+MIN_SPLIT_SPACE = 100
+
+# Højde af "(fortsat)"-markøren på fortsatte tabeller/blokke (7pt x 1.7 + 8px)
+CONTINUED_MARKER = 7 * PX_PER_PT * 1.7 + 8
+
+# Plads til sidetallet i en TOC-linje (margin + tre cifre)
+TOC_NUMBER_WIDTH = 8 + 3 * 10 * PX_PER_PT * 0.56
+
+VOID_TAGS = {'img', 'br', 'hr', 'meta', 'input', 'source', 'wbr'}
+TOKEN_RE = re.compile(r'\S+|\s+')
+
+
+class TextStyle:
+    """Font og linjehøjde for en tekstblok (CSS-værdier i pt)."""
+    __slots__ = ('family', 'weight', 'size', 'line_height', 'letter_spacing', 'uppercase')
+
+    def __init__(self, family: str, weight: int, size: float, line_height: float,
+                 letter_spacing: float = 0.0, uppercase: bool = False):
+        self.family = family
+        self.weight = weight
+        self.size = size * PX_PER_PT
+        self.line_height = size * PX_PER_PT * line_height
+        self.letter_spacing = letter_spacing * PX_PER_PT
+        self.uppercase = uppercase
+
+    def with_weight(self, weight: int) -> "TextStyle":
+        style = TextStyle.__new__(TextStyle)
+        for name in self.__slots__:
+            setattr(style, name, getattr(self, name))
+        style.weight = weight
+        return style
+
+
+BODY = TextStyle('Helvetica Neue', 300, 10, 1.7, -0.3)
+H1 = TextStyle('FH Lecturis', 400, 32, 0.95, -1)
+H2 = TextStyle('FH Lecturis', 400, 20, 0.95, -0.6)
+H3 = TextStyle('FH Lecturis', 400, 14, 1.0, -0.4)
+H4 = TextStyle('Helvetica Neue', 500, 11, 1.7)
+PSEUDO_HEADING = TextStyle('Helvetica Neue', 500, 12, 1.2)
+SECTION_HEADER = TextStyle('Helvetica Neue', 500, 10, 1.7)
+DATA_LABEL = TextStyle('Helvetica Neue', 500, 10, 1.7, -0.3)
+LABEL = TextStyle('Helvetica Neue', 500, 9, 1.7, 0.375, uppercase=True)
+TOC_ENTRY = TextStyle('Helvetica Neue', 300, 10, 1.5, -0.3)
+TOC_ENTRY_SMALL = TextStyle('Helvetica Neue', 300, 9, 1.5, -0.3)
+TABLE_CELL = TextStyle('Helvetica Neue', 300, 9, 1.7)
+CODE = TextStyle(MONOSPACE, 400, 8, 1.5)
+
+
+class FontMetrics:
+    """Tekstbredder målt med fontfilerne i Fonts/ (cachet pr. font og ord)."""
+
+    def __init__(self, fonts_dir: str = FONTS_DIR):
+        self.fonts_dir = fonts_dir
+        self._fonts = {}
+        self._widths = {}
+
+    def _font(self, family: str, weight: int, italic: bool):
+        """ImageFont for den nærmeste vægt i familien (None hvis ingen fil findes)."""
+        key = (family, weight, italic)
+        if key not in self._fonts:
+            candidates = [k for k in FONT_FILES if k[0] == family and k[2] == italic] or \
+                         [k for k in FONT_FILES if k[0] == family]
+            font = None
+            if candidates:
+                closest = min(candidates, key=lambda k: abs(k[1] - weight))
+                try:
+                    font = ImageFont.truetype(os.path.join(self.fonts_dir, FONT_FILES[closest]), FONT_UNITS)
+                except OSError:
+                    font = None
+            self._fonts[key] = font
+        return self._fonts[key]
+
+    def width(self, text: str, style: TextStyle, weight: int = None, italic: bool = False) -> float:
+        """Bredde i px af text i style (med letter-spacing)."""
+        if style.uppercase:
+            text = text.upper()
+        weight = weight or style.weight
+        key = (style.family, weight, italic, text)
+        units = self._widths.get(key)
+        if units is None:
+            font = self._font(style.family, weight, italic) if style.family != MONOSPACE else None
+            if font is not None:
+                units = font.getlength(text)
+            else:
+                em = MONOSPACE_CHAR_WIDTH if style.family == MONOSPACE else FALLBACK_CHAR_WIDTH
+                units = len(text) * em * FONT_UNITS
+            self._widths[key] = units
+        return units * style.size / FONT_UNITS + style.letter_spacing * len(text)
+
+
+class Node:
+    """Et HTML-element fra et fragment, med kildens start/slut offset."""
+    __slots__ = ('tag', 'attrs', 'children', 'start', 'end', 'source')
+
+    def __init__(self, tag: str, attrs: dict, start: int, source: str):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.start = start
+        self.end = start
+        self.source = source
+
+    @property
+    def classes(self) -> tuple:
+        return tuple((self.attrs.get('class') or '').split())
+
+    @property
+    def html(self) -> str:
+        """Elementets uændrede HTML fra kilden."""
+        return self.source[self.start:self.end]
+
+    def text(self) -> str:
+        return ''.join(child if isinstance(child, str) else child.text() for child in self.children)
+
+    def find(self, tag: str, class_name: str = None):
+        """Første efterkommer med tag (og klasse)."""
+        for child in self.children:
+            if isinstance(child, Node):
+                if child.tag == tag and (class_name is None or class_name in child.classes):
+                    return child
+                found = child.find(tag, class_name)
+                if found is not None:
+                    return found
+        return None
+
+    def find_all(self, tag: str) -> list:
+        found = []
+        for child in self.children:
+            if isinstance(child, Node):
+                if child.tag == tag:
+                    found.append(child)
+                found.extend(child.find_all(tag))
+        return found
+
+
+class _FragmentParser(HTMLParser):
+    """Bygger Node-træer for top-level elementerne i et HTML-fragment."""
+
+    def __init__(self, source: str):
+        super().__init__(convert_charrefs=True)
+        self.source = source
+        self.roots = []
+        self._stack = []
+        # Start-offset for hver linje, så getpos() kan blive et absolut offset
+        self._line_starts = [0]
+        for match in re.finditer('\n', source):
+            self._line_starts.append(match.end())
+
+    def _offset(self) -> int:
+        line, column = self.getpos()
+        return self._line_starts[line - 1] + column
+
+    def _append(self, item):
+        if self._stack:
+            self._stack[-1].children.append(item)
+        elif isinstance(item, Node):
+            self.roots.append(item)
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, dict(attrs), self._offset(), self.source)
+        self._append(node)
+        if tag in VOID_TAGS:
+            node.end = node.start + len(self.get_starttag_text())
+        else:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        node = Node(tag, dict(attrs), self._offset(), self.source)
+        node.end = node.start + len(self.get_starttag_text())
+        self._append(node)
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        end = self.source.index('>', self._offset()) + 1
+        # Luk ned til det matchende element (tolerant over for manglende end-tags)
+        while self._stack:
+            node = self._stack.pop()
+            node.end = end
+            if node.tag == tag:
+                break
+
+    def handle_data(self, data):
+        self._append(data)
+
+
+def parse_fragment(source: str) -> list:
+    """Top-level elementer (Node) i et HTML-fragment. Løs tekst springes over."""
+    parser = _FragmentParser(source)
+    parser.feed(source)
+    parser.close()
+    return parser.roots
+
+
+class Box:
+    """Ét top-level element med målt højde og margener (px)."""
+    __slots__ = ('node', 'html', 'height', 'margin_top', 'margin_bottom',
+                 'keep_with_next', 'page_break', 'parts', 'kind')
+
+    def __init__(self, node: Node, html: str, height: float, margin_top: float = 0.0,
+                 margin_bottom: float = 0.0, keep_with_next: bool = False,
+                 kind: str = None, parts=None):
+        self.node = node
+        self.html = html
+        self.height = height
+        self.margin_top = margin_top
+        self.margin_bottom = margin_bottom
+        self.keep_with_next = keep_with_next
+        self.page_break = False
+        # Splitbare blokke: kind ('table', 'code', 'highlight') og deres dele
+        self.kind = kind
+        self.parts = parts
+
+    def __repr__(self):
+        return f'<Box {self.node.tag if self.node else "-"} {self.height:.0f}px>'
+
+
+class TablePart:
+    """Målte rækker for en tabel, så den kan splittes ved rækkegrænser."""
+    __slots__ = ('attrs', 'head_html', 'head_height', 'rows', 'continued')
+
+    def __init__(self, attrs: str, head_html: str, head_height: float, rows: list,
+                 continued: bool = False):
+        self.attrs = attrs
+        self.head_html = head_html
+        self.head_height = head_height
+        self.rows = rows  # [(html, højde, fortsætter en rowspan)]
+        self.continued = continued
+
+
+class Paginator:
+    """Fordeler konverterens HTML-fragmenter på A4-sider.
+
+    Args:
+        metrics: FontMetrics (default: fontene i Fonts/)
+        image_sizes: indholds-hash → (bredde, højde) for billeder uden
+                     width/height attributter (ImageStore.sizes)
+        content_height: Indholdsområdets højde i px (default 235mm)
+    """
+
+    def __init__(self, metrics: FontMetrics = None, image_sizes: dict = None,
+                 content_height: float = CONTENT_HEIGHT, content_width: float = CONTENT_WIDTH):
+        self.metrics = metrics or FontMetrics()
+        self.image_sizes = image_sizes if image_sizes is not None else {}
+        self.content_height = content_height
+        self.content_width = content_width
+
+    # === Måling ===
+
+    def _segments(self, node: Node, weight: int = None, italic: bool = False, segments: list = None) -> list:
+        """Inline-tekst som (tekst, vægt, kursiv) segmenter; None er et tvunget linjeskift."""
+        if segments is None:
+            segments = []
+        for child in node.children:
+            if isinstance(child, str):
+                segments.append((child, weight, italic))
+            elif child.tag == 'br':
+                segments.append(None)
+            elif 'arrow' in child.classes:
+                continue  # Pilen i list-items er absolut positioneret
+            elif child.tag in ('strong', 'b'):
+                self._segments(child, 500, italic, segments)
+            elif child.tag in ('em', 'i'):
+                self._segments(child, weight, True, segments)
+            else:
+                self._segments(child, weight, italic, segments)
+        return segments
+
+    def _line_count(self, segments: list, style: TextStyle, width: float) -> int:
+        """Antal linjer når segmenterne brydes ved mellemrum i width (som white-space: normal)."""
+        metrics = self.metrics
+        lines = 1
+        line = 0.0
+        word = 0.0
+        space = 0.0
+        for segment in segments:
+            if segment is None:
+                if word:
+                    lines += line and line + space + word > width
+                lines += 1
+                line = word = space = 0.0
+                continue
+            text, weight, italic = segment
+            for token in TOKEN_RE.findall(text):
+                if token[0].isspace():
+                    if word:
+                        if line and line + space + word > width:
+                            lines += 1
+                            line = word
+                        else:
+                            line = line + space + word if line else word
+                        word = 0.0
+                    space = metrics.width(' ', style, weight, italic)
+                else:
+                    word += metrics.width(token, style, weight, italic)
+        if word and line and line + space + word > width:
+            lines += 1
+        return lines
+
+    def _text_height(self, node: Node, style: TextStyle, width: float) -> float:
+        return self._line_count(self._segments(node), style, width) * style.line_height
+
+    def _code_line_heights(self, text: str, width: float) -> list:
+        """Højde pr. kildelinje i en pre-wrap kodeblok (lange linjer brydes)."""
+        heights = []
+        for line in text.split('\n'):
+            line_width = self.metrics.width(line, CODE) if line else 0.0
+            wrapped = max(1, -(-int(line_width) // max(1, int(width))))
+            heights.append(wrapped * CODE.line_height)
+        return heights
+
+    def measure(self, node: Node) -> Box:
+        """Box for ét top-level element."""
+        tag = node.tag
+        classes = node.classes
+        width = self.content_width
+
+        if 'page-break' in classes:
+            box = Box(node, '', 0.0)
+            box.page_break = True
+            return box
+
+        if tag == 'h1':
+            return Box(node, node.html, self._text_height(node, H1, width), 8, 24, keep_with_next=True)
+        if tag == 'h2':
+            if 'toc-heading' in classes:
+                return Box(node, node.html, self._text_height(node, H2, width), 0, 24, keep_with_next=True)
+            return Box(node, node.html, self._text_height(node, H2, width), 36, 18, keep_with_next=True)
+        if tag == 'h3':
+            if 'pseudo-heading' in classes:
+                return Box(node, node.html, self._text_height(node, PSEUDO_HEADING, width) + 7, 24, 12,
+                           keep_with_next=True)
+            return Box(node, node.html, self._text_height(node, H3, width), 28, 14, keep_with_next=True)
+        if tag == 'h4':
+            return Box(node, node.html, self._text_height(node, H4, width), 20, 8, keep_with_next=True)
+
+        if tag == 'span' and 'label' in classes:
+            # inline-block: tekst + padding 10px + border 2px + margin 10px
+            return Box(node, node.html, self._text_height(node, LABEL, width) + 22, keep_with_next=True)
+
+        if tag == 'p':
+            if 'toc-entry' in classes:
+                level = 3 if 'toc-level-3' in classes else 2 if 'toc-level-2' in classes else 1
+                style = TOC_ENTRY_SMALL if level == 3 else TOC_ENTRY.with_weight(500) if level == 1 else TOC_ENTRY
+                text_width = width - 20 * (level - 1) - TOC_NUMBER_WIDTH
+                return Box(node, node.html, self._text_height(node, style, text_width) + 17)
+            if 'data-label' in classes:
+                return Box(node, node.html, self._text_height(node, DATA_LABEL, width) + 5, 24, 8,
+                           keep_with_next=True)
+            if 'list-item' in classes:
+                return Box(node, node.html, self._text_height(node, BODY, width - 20), 0, 12)
+            text = node.text().strip()
+            # Som isHeadingElement(): korte paragraffer der ender med ":" er underoverskrifter
+            keep = text.endswith(':') and len(text) < 80
+            return Box(node, node.html, self._text_height(node, BODY, width), 0, 10, keep_with_next=keep)
+
+        if tag == 'div' and 'highlight-box' in classes:
+            return self._highlight_box(node, [p for p in node.children if isinstance(p, Node)])
+        if tag == 'div' and 'code-block' in classes:
+            code = node.find('code')
+            return self._code_box(node, code.text() if code is not None else '', continued=False, whole=True)
+        if tag == 'div' and 'instruction-section' in classes:
+            return self._instruction_section(node, classes)
+        if tag == 'div' and 'image-container' in classes:
+            return Box(node, node.html, self._image_height(node.find('img')) + 4, 24, 24)
+        if tag == 'table':
+            return self._table_box(self._table_part(node), node, whole=True)
+
+        # Ukendte elementer måles som brødtekst
+        return Box(node, node.html, self._text_height(node, BODY, width), 0, 10)
+
+    def _image_height(self, img: Node) -> float:
+        """Vist højde af et billede (naturlig størrelse, højst indholdsbredden)."""
+        if img is None:
+            return 0.0
+        size = None
+        try:
+            size = (float(img.attrs['width']), float(img.attrs['height']))
+        except (KeyError, TypeError, ValueError):
+            digest = img.attrs.get('data-img')
+            size = self.image_sizes.get(digest)
+        if not size or not size[0]:
+            # Ukendt størrelse: antag et billede i fuld bredde (4:3)
+            return self.content_width * 0.75
+        width, height = size
+        if width > self.content_width:
+            height = height * self.content_width / width
+        return height
+
+    def _highlight_box(self, node: Node, paragraphs: list, continued: bool = False) -> Box:
+        """Highlight box (padding 16px 20px, border 3px) - splittes mellem paragraffer."""
+        inner_width = self.content_width - 43
+        parts = [(p.html, self._text_height(p, BODY, inner_width)) for p in paragraphs]
+        height = 32 + sum(height for _, height in parts) + (CONTINUED_MARKER if continued else 0)
+        if continued:
+            html = '<div class="highlight-box highlight-box-continued">' + ''.join(h for h, _ in parts) + '</div>'
+        else:
+            html = node.html
+        return Box(node, html, height, 0 if continued else 24, 24, kind='highlight', parts=parts)
+
+    def _code_box(self, node: Node, text: str, continued: bool, whole: bool = False) -> Box:
+        """Kodeblok (8pt monospace, pre-wrap) - splittes ved kildelinjer."""
+        lines = text.split('\n')
+        heights = self._code_line_heights(text, self.content_width - 43)
+        if whole:
+            html = node.html
+        else:
+            css_class = 'code-block code-block-continued' if continued else 'code-block'
+            html = f'<div class="{css_class}"><pre><code>{html_lib.escape(text)}</code></pre></div>'
+        height = (24 + CONTINUED_MARKER if continued else 32) + sum(heights)
+        return Box(node, html, height, 0 if continued else 16, 16, kind='code',
+                   parts=list(zip(lines, heights)))
+
+    def _instruction_section(self, node: Node, classes: tuple) -> Box:
+        """Instruktionssektion (header + kode), holdes samlet som i CSS'en."""
+        inner_width = self.content_width - 43
+        height = 32 if 'instruction-first' in classes and 'instruction-last' in classes else \
+            28 if 'instruction-first' in classes or 'instruction-last' in classes else 24
+        header = node.find('h4')
+        if header is not None:
+            height += self._text_height(header, SECTION_HEADER, inner_width) + 8
+        code = node.find('code')
+        if code is not None:
+            height += sum(self._code_line_heights(code.text(), inner_width))
+        margin_top = 16 if 'instruction-first' in classes else 0
+        margin_bottom = 16 if 'instruction-last' in classes else 0
+        # Som isHeadingElement(): en sektion med header men uden kode hører til det næste
+        return Box(node, node.html, height, margin_top, margin_bottom,
+                   keep_with_next=header is not None and code is None)
+
+    def _table_part(self, node: Node) -> TablePart:
+        """Mål tabellens kolonner og rækker (auto table layout, 100% bredde)."""
+        thead = next((c for c in node.children if isinstance(c, Node) and c.tag == 'thead'), None)
+        tbody = next((c for c in node.children if isinstance(c, Node) and c.tag == 'tbody'), None)
+        head_rows = thead.find_all('tr') if thead is not None else []
+        body_rows = tbody.find_all('tr') if tbody is not None else [
+            tr for tr in node.find_all('tr') if tr not in head_rows]
+
+        # Celler som (segmenter, kolonne, colspan, rowspan, th) - kolonner
+        # dækket af en rowspan fra en tidligere række springes over
+        rows = []
+        covered = {}  # kolonne -> antal rækker den stadig er dækket
+        for tr in head_rows + body_rows:
+            cells = []
+            column = 0
+            started = {}
+            for cell in tr.children:
+                if isinstance(cell, Node) and cell.tag in ('th', 'td'):
+                    while covered.get(column):
+                        column += 1
+                    colspan = _span(cell.attrs.get('colspan'))
+                    rowspan = _span(cell.attrs.get('rowspan'))
+                    weight = 500 if cell.tag == 'th' else 300
+                    cells.append((self._segments(cell, weight), column, colspan, rowspan, cell.tag == 'th'))
+                    if rowspan > 1:
+                        for spanned in range(column, column + colspan):
+                            started[spanned] = rowspan
+                    column += colspan
+            covered = {c: n - 1 for c, n in covered.items() if n > 1}
+            covered.update(started)
+            rows.append(cells)
+
+        widths = self._column_widths(rows)
+        measured = []
+        for cells in rows:
+            height = 0.0
+            for segments, column, colspan, rowspan, is_header in cells:
+                if rowspan > 1:
+                    continue  # Fordeles over de rækker den dækker
+                cell_width = sum(widths[column:column + colspan]) - 16
+                lines = self._line_count(segments, TABLE_CELL, max(cell_width, 1.0))
+                padding = 22 if is_header else 17
+                height = max(height, lines * TABLE_CELL.line_height + padding)
+            measured.append(height or TABLE_CELL.line_height + 17)
+
+        head_height = sum(measured[:len(head_rows)])
+        head_html = thead.html if thead is not None else ''
+        body = [(tr.html, height, 'data-merged' in tr.attrs)
+                for tr, height in zip(body_rows, measured[len(head_rows):])]
+        attrs = node.source[node.start + len('<table'):node.source.index('>', node.start)]
+        return TablePart(attrs, head_html, head_height, body)
+
+    def _column_widths(self, rows: list) -> list:
+        """Kolonnebredder som browserens auto layout: min/max-content fordelt på bredden."""
+        columns = max((column + colspan for cells in rows for _, column, colspan, _, _ in cells), default=0)
+        if not columns:
+            return []
+        minimum = [16.0] * columns
+        maximum = [16.0] * columns
+        for cells in rows:
+            for segments, column, colspan, _, _ in cells:
+                if colspan != 1:
+                    continue
+                longest = 0.0
+                total = 0.0
+                for segment in segments:
+                    if segment is None:
+                        continue
+                    text, weight, italic = segment
+                    for token in text.split():
+                        longest = max(longest, self.metrics.width(token, TABLE_CELL, weight, italic))
+                    total += self.metrics.width(' '.join(text.split()) + ' ', TABLE_CELL, weight, italic)
+                minimum[column] = max(minimum[column], longest + 16)
+                maximum[column] = max(maximum[column], total + 16)
+
+        width = self.content_width
+        if sum(maximum) <= width:
+            scale = width / sum(maximum)
+            return [w * scale for w in maximum]
+        if sum(minimum) >= width:
+            return minimum
+        spare = width - sum(minimum)
+        flexible = sum(maximum) - sum(minimum)
+        return [lo + spare * (hi - lo) / flexible for lo, hi in zip(minimum, maximum)]
+
+    def _table_box(self, part: TablePart, node: Node, whole: bool = False) -> Box:
+        """Box for en tabel (whole: den uændrede kilde-HTML) eller en del af den."""
+        height = part.head_height + sum(height for _, height, _ in part.rows)
+        if part.continued:
+            height += CONTINUED_MARKER
+        html = node.html if whole else self._table_html(part)
+        return Box(node, html, height, 0 if part.continued else 24, 24, kind='table', parts=part)
+
+    @staticmethod
+    def _table_html(part: TablePart) -> str:
+        attrs = part.attrs
+        if part.continued:
+            attrs = ' class="table-continued"'
+        body = ''
+        if part.rows:
+            body = '<tbody>\n' + '\n'.join(html for html, _, _ in part.rows) + '\n</tbody>\n'
+        return f'<table{attrs}>\n{part.head_html}\n{body}</table>' if part.head_html else \
+            f'<table{attrs}>\n{body}</table>'
+
+    # === Split ===
+
+    def _split(self, box: Box, available: float, page_empty: bool):
+        """Split box så første del fylder højst available. Returnerer (første, rest) eller None."""
+        if box.kind == 'table':
+            return self._split_table(box, available, page_empty)
+        if box.kind == 'code':
+            return self._split_code(box, available)
+        if box.kind == 'highlight':
+            return self._split_highlight(box, available)
+        return None
+
+    def _split_table(self, box: Box, available: float, page_empty: bool):
+        part = box.parts
+        used = part.head_height + (CONTINUED_MARKER if part.continued else 0)
+        split = 0
+        for _, height, _ in part.rows:
+            if used + height > available:
+                break
+            used += height
+            split += 1
+        # Aldrig midt i en flettet celle
+        while 0 < split < len(part.rows) and part.rows[split][2]:
+            split -= 1
+        if split < (1 if page_empty else MIN_TABLE_ROWS) or split >= len(part.rows):
+            return None
+
+        first = TablePart(part.attrs, part.head_html, part.head_height, part.rows[:split], part.continued)
+        rest = TablePart(part.attrs, part.head_html, part.head_height, part.rows[split:], True)
+        return self._table_box(first, box.node), self._table_box(rest, box.node)
+
+    def _split_code(self, box: Box, available: float):
+        lines = box.parts
+        continued = 'code-block-continued' in box.html[:60]
+        used = (24 + CONTINUED_MARKER) if continued else 32
+        split = 0
+        for _, height in lines:
+            if used + height > available:
+                break
+            used += height
+            split += 1
+        if split < MIN_CODE_LINES or split >= len(lines):
+            return None
+
+        first_text = '\n'.join(line for line, _ in lines[:split])
+        rest_text = '\n'.join(line for line, _ in lines[split:])
+        return (self._code_box(box.node, first_text, continued),
+                self._code_box(box.node, rest_text, continued=True))
+
+    def _split_highlight(self, box: Box, available: float):
+        parts = box.parts
+        continued = 'highlight-box-continued' in box.html[:80]
+        used = 32 + (CONTINUED_MARKER if continued else 0)
+        split = 0
+        for _, height in parts:
+            if used + height > available:
+                break
+            used += height
+            split += 1
+        if split == 0 or split >= len(parts):
+            return None
+
+        first_class = 'highlight-box highlight-box-continued' if continued else 'highlight-box'
+        first = Box(box.node, f'<div class="{first_class}">' + ''.join(h for h, _ in parts[:split]) + '</div>',
+                    used, box.margin_top, 24, kind='highlight', parts=parts[:split])
+        rest_parts = parts[split:]
+        rest = Box(box.node, '<div class="highlight-box highlight-box-continued">' +
+                   ''.join(h for h, _ in rest_parts) + '</div>',
+                   32 + CONTINUED_MARKER + sum(h for _, h in rest_parts), 0, 24,
+                   kind='highlight', parts=rest_parts)
+        return first, rest
+
+    # === Sideopdeling ===
+
+    def boxes(self, fragments) -> list:
+        """Mål alle top-level elementer i fragmenterne."""
+        boxes = []
+        for fragment in fragments:
+            for node in parse_fragment(fragment):
+                boxes.append(self.measure(node))
+        return boxes
+
+    def layout(self, boxes: list) -> list:
+        """Fordel boxes på sider. Returnerer en liste af sider (lister af Box)."""
+        pages = []
+        page = []
+        used = 0.0
+        last_margin = 0.0
+        queue = deque(boxes)
+
+        while queue:
+            box = queue.popleft()
+            if box.page_break:
+                if page:
+                    pages.append(page)
+                    page, used, last_margin = [], 0.0, 0.0
+                continue
+
+            # Lodrette margener mellem søskende kollapser til den største
+            gap = max(last_margin, box.margin_top) if page else box.margin_top
+            if used + gap + box.height <= self.content_height:
+                page.append(box)
+                used += gap + box.height
+                last_margin = box.margin_bottom
+                continue
+
+            available = self.content_height - used - gap
+            split = None
+            if not page or available > MIN_SPLIT_SPACE:
+                split = self._split(box, available, page_empty=not page)
+            if split is not None:
+                first, rest = split
+                page.append(first)
+                pages.append(page)
+                page, used, last_margin = [], 0.0, 0.0
+                queue.appendleft(rest)
+                continue
+
+            if not page:
+                # Højere end en hel side og kan ikke splittes - står alene
+                page.append(box)
+                used = self.content_height
+                continue
+
+            # Overskrifter i bunden af siden følger med det indhold de står over
+            carry = []
+            while page and page[-1].keep_with_next:
+                carry.insert(0, page.pop())
+            if not page:
+                page, carry = carry, []
+            pages.append(page)
+            page, used, last_margin = [], 0.0, 0.0
+            queue.appendleft(box)
+            for carried in reversed(carry):
+                queue.appendleft(carried)
+
+        if page:
+            pages.append(page)
+        return pages
+
+    def paginate(self, fragments) -> list:
+        """Mål, fordel og nummerér: sider som lister af HTML-elementer.
+
+        TOC-linjer (p.toc-entry) får sidetallet for den overskrift deres link
+        peger på, som generateTocPageNumbers() i browser-scriptet.
+        """
+        pages = self.layout(self.boxes(fragments))
+        fill_toc_numbers(pages)
+        return [[box.html for box in page] for page in pages]
+
+
+def _span(value) -> int:
+    """colspan/rowspan attribut som heltal (mindst 1)."""
+    try:
+        return max(1, int(value or 1))
+    except ValueError:
+        return 1
+
+
+def fill_toc_numbers(pages: list):
+    """Tilføj <span class="toc-page-number"> til TOC-linjerne på siderne.
+
+    Linjerne linker til overskrifternes id (<a href="#id">), så hvert opslag
+    er ét dict-opslag - også når samme overskrift går igen i flere kapitler.
+    Målet er oftest en h1-h3, men en overskrift der vises som call-out, har
+    id'et på sin highlight-box.
+    """
+    heading_pages = {}
+    entries = []
+    for number, page in enumerate(pages, 1):
+        for box in page:
+            if box.node is None:
+                continue
+            if box.node.tag == 'p' and 'toc-entry' in box.node.classes:
+                entries.append(box)
+            elif 'id' in box.node.attrs:
+                heading_pages[box.node.attrs['id']] = number
+
+    for box in entries:
+        link = box.node.find('a')
+        href = (link.attrs.get('href') or '') if link is not None else ''
+        number = heading_pages.get(href[1:]) if href.startswith('#') else None
+        if number is not None and box.html.endswith('</p>'):
+            box.html = f'{box.html[:-4]}<span class="toc-page-number">{number}</span></p>'
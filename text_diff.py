@@ -0,0 +1,191 @@
+"""
+Backstage Tekst-diff
+====================
+Finder hvor tekst fra Word-dokumentet mangler i HTML-outputtet.
+
+Bruges af quality_check: begge sider gøres til heltals-arrays (ét id pr.
+unikt ord), og ordfølgerne aligneres med ankre - ord-sekvenser af længde k
+hvis rullende hash kun forekommer én gang på hver side. Ankrene i længste
+fælles rækkefølge deler teksten op i huller, som aligneres igen med kortere
+ankre, til sidst ord for ord som multisæt. Det hele er numpy-operationer
+over hele huller ad gangen, så også 500-siders dokumenter tager under et
+sekund, hvor difflib over ordlister er ubrugelig.
+"""
+
+from bisect import bisect_left
+from itertools import chain
+
+import numpy as np
+
+ANCHOR_LENGTH = 8  # ord pr. anker i første gennemløb - halveres i hullerne
+SMALL_GAP = 16  # huller hvor begge sider er højst så mange ord, sammenlignes som multisæt
+HASH_BASE = np.uint64(1000003)
+
+
+class TokenDiff:
+    """Resultatet af compare_tokens().
+
+    Felter:
+        missing: Bool-array over kildens ord - True hvor ordet ikke blev
+                 fundet på sin plads i outputtet
+        surplus: Bool-array over kildens ord - True for forekomster ud over
+                 antallet i outputtet (multisæt-forskellen, uafhængig af
+                 rækkefølge; et ords sidste forekomster markeres)
+    """
+    __slots__ = ('missing', 'surplus')
+
+    def __init__(self, missing: np.ndarray, surplus: np.ndarray):
+        self.missing = missing
+        self.surplus = surplus
+
+    def spans(self) -> list:
+        """[(start, slut)] for sammenhængende manglende ord i kilden."""
+        if not self.missing.any():
+            return []
+        edges = np.diff(np.concatenate(([0], self.missing.view(np.int8), [0])))
+        return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+
+def compare_tokens(source: list, output: list, anchor_length: int = ANCHOR_LENGTH) -> TokenDiff:
+    """Alignér kildens ord med outputtets og find dem der mangler.
+
+    Outputtet må indeholde ekstra tekst (forside, sidetal, labels) - det er
+    kun kildens ord der markeres. Tekst der er flyttet, markeres også som
+    manglende på sin oprindelige plads; brug surplus til at skelne.
+    """
+    # Ét heltal pr. unikt ord (kollisionsfri - selve ordene sammenlignes aldrig igen)
+    vocabulary = {token: index for index, token in enumerate(dict.fromkeys(chain(source, output)))}
+    source_ids = np.fromiter(map(vocabulary.__getitem__, source), dtype=np.int64, count=len(source))
+    output_ids = np.fromiter(map(vocabulary.__getitem__, output), dtype=np.int64, count=len(output))
+
+    missing = np.zeros(len(source_ids), dtype=bool)
+    pending = [(0, len(source_ids), 0, len(output_ids), anchor_length)]
+    while pending:
+        a, b, c, d, k = pending.pop()
+        if a == b:
+            continue
+        if c == d:
+            missing[a:b] = True
+            continue
+        src = source_ids[a:b]
+        dst = output_ids[c:d]
+        if len(src) <= SMALL_GAP and len(dst) <= SMALL_GAP:
+            # Små huller (overskriftsnumre, punkttegn) - multisættet er præcist nok
+            missing[a:b] = _surplus(src, dst)
+            continue
+        while k > 1 and (len(src) < k or len(dst) < k):
+            k //= 2
+        segments = _anchor_segments(src, dst, k)
+        if not segments:
+            if k > 1:
+                pending.append((a, b, c, d, k // 2))
+            else:
+                missing[a:b] = _surplus(src, dst)
+            continue
+
+        # Hullerne mellem ankrene aligneres igen med samme k (nye ankre kan være unikke dér)
+        src_pos, dst_pos = 0, 0
+        for start, target, length in segments:
+            pending.append((a + src_pos, a + start, c + dst_pos, c + target, k))
+            src_pos, dst_pos = start + length, target + length
+        pending.append((a + src_pos, b, c + dst_pos, d, k))
+
+    return TokenDiff(missing, _surplus(source_ids, output_ids))
+
+
+def _kgram_hashes(ids: np.ndarray, k: int) -> np.ndarray:
+    """Rullende hash af alle k ord lange sekvenser (uint64, overløb er modulo 2^64)."""
+    count = len(ids) - k + 1
+    values = ids.astype(np.uint64)
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(k):
+        hashes = hashes * HASH_BASE + values[offset:offset + count]
+    return hashes
+
+
+def _unique_kgrams(hashes: np.ndarray):
+    values, first, counts = np.unique(hashes, return_index=True, return_counts=True)
+    once = counts == 1
+    return values[once], first[once]
+
+
+def _anchor_segments(src: np.ndarray, dst: np.ndarray, k: int) -> list:
+    """[(kilde-start, output-start, længde)] i stigende orden på begge sider, uden overlap."""
+    src_values, src_first = _unique_kgrams(_kgram_hashes(src, k))
+    dst_values, dst_first = _unique_kgrams(_kgram_hashes(dst, k))
+    _, src_index, dst_index = np.intersect1d(src_values, dst_values, assume_unique=True,
+                                             return_indices=True)
+    if not len(src_index):
+        return []
+    src_pos = src_first[src_index]
+    dst_pos = dst_first[dst_index]
+    order = np.argsort(src_pos)
+    src_pos = src_pos[order]
+    dst_pos = dst_pos[order]
+
+    # Hash-kollisioner: behold kun ankre hvor ordene faktisk er ens
+    windows = np.arange(k)
+    same = (src[src_pos[:, None] + windows] == dst[dst_pos[:, None] + windows]).all(axis=1)
+    src_pos = src_pos[same]
+    dst_pos = dst_pos[same]
+    if not len(src_pos):
+        return []
+
+    # Nabo-ankre (i+1, j+1) er én sammenhængende match
+    breaks = np.flatnonzero((np.diff(src_pos) != 1) | (np.diff(dst_pos) != 1)) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(src_pos)])) - 1
+    runs = list(zip(src_pos[starts].tolist(), dst_pos[starts].tolist(),
+                    (src_pos[ends] - src_pos[starts] + k).tolist()))
+
+    # Kun matches i samme rækkefølge på begge sider - flyttet tekst bliver et hul
+    segments = []
+    src_end = dst_end = 0
+    for start, target, length in _increasing(runs):
+        shift = max(src_end - start, dst_end - target, 0)
+        if shift >= length:
+            continue
+        start, target, length = start + shift, target + shift, length - shift
+        segments.append((start, target, length))
+        src_end, dst_end = start + length, target + length
+    return segments
+
+
+def _increasing(runs: list) -> list:
+    """Længste delfølge af runs (sorteret på kilde-start) med stigende output-start."""
+    tails = []  # output-start for sidste run i den bedste delfølge af hver længde
+    tail_index = []
+    previous = [-1] * len(runs)
+    for index, (_, target, _) in enumerate(runs):
+        length = bisect_left(tails, target)
+        if length == len(tails):
+            tails.append(target)
+            tail_index.append(index)
+        else:
+            tails[length] = target
+            tail_index[length] = index
+        previous[index] = tail_index[length - 1] if length else -1
+
+    chosen = []
+    index = tail_index[-1] if tail_index else -1
+    while index >= 0:
+        chosen.append(runs[index])
+        index = previous[index]
+    return chosen[::-1]
+
+
+def _surplus(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """Bool-array over src: forekomster af et ord ud over antallet i dst.
+
+    Ordets tidligste forekomster regnes for fundet, de sidste for manglende.
+    """
+    order = np.argsort(src, kind='stable')
+    ordered = src[order]
+    first = np.concatenate(([0], np.flatnonzero(np.diff(ordered)) + 1))
+    occurrence = np.arange(len(ordered)) - np.repeat(first, np.diff(np.append(first, len(ordered))))
+    dst_sorted = np.sort(dst)
+    available = (np.searchsorted(dst_sorted, ordered, side='right')
+                 - np.searchsorted(dst_sorted, ordered, side='left'))
+    surplus = np.empty(len(src), dtype=bool)
+    surplus[order] = occurrence >= available
+    return surplus